@@ -0,0 +1,252 @@
+"""
+Benchmark de passage à l'échelle du pipeline sur des logs synthétiques.
+
+Génère un jeu (generate_logs.py) dans un répertoire de travail, puis
+exécute les étapes du pipeline (parse, vectorize, analyze) chacune dans
+un processus séparé, les chemins /data/... des scripts redirigés vers ce
+répertoire. Par étape: lignes/s (lignes générées / durée), pic de RSS du
+processus et octets écrits (fichiers créés ou modifiés).
+
+Les résultats sont écrits en JSON avec le commit courant (--output), et
+comparés à ceux d'un autre commit avec --compare:
+
+  python benchmarks/bench_scale.py --scale 0.1 --output avant.json
+  git checkout ma-branche
+  python benchmarks/bench_scale.py --scale 0.1 --output apres.json --compare avant.json
+
+Le cache d'artefacts est désactivé (ARTIFACT_CACHE=0), --env KEY=VALUE
+passe d'autres options aux étapes (PARSER_WORKERS=4, ...).
+
+Usage: python benchmarks/bench_scale.py [--dataset hdfs] [--scale 0.1] [--stages parse,vectorize]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PARSER_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..', 'parser'))
+sys.path.insert(0, BENCH_DIR)
+
+from generate_logs import generate, parse_mix
+
+# Modules des étapes, par jeu (analyze_openstack lit la matrice HDFS: exclu)
+STAGES = {
+    'hdfs': {
+        'parse': 'hdfs.parse_hdfs',
+        'vectorize': 'hdfs.vectorize_hdfs',
+        'analyze': 'hdfs.analyze_hdfs',
+    },
+    'openstack': {
+        'parse': 'openstack.parse_openstack',
+        'vectorize': 'openstack.vectorize_openstack',
+    },
+}
+
+
+def rediriger(path, data_root):
+    """'/data/...' -> data_root/..., autres chemins inchangés."""
+    if isinstance(path, str) and path.startswith('/data/'):
+        return os.path.join(data_root, path[len('/data/'):])
+    return path
+
+
+def executer_etape(module_name, data_root):
+    """
+    Exécute main() d'un script du pipeline (processus enfant), ses
+    constantes /data/... redirigées vers data_root.
+    """
+    import importlib
+
+    sys.path.insert(0, PARSER_DIR)
+    # drain.ini est cherché dans le répertoire courant
+    os.chdir(PARSER_DIR)
+
+    # Répertoires créés à l'import des scripts
+    makedirs = os.makedirs
+    os.makedirs = lambda path, *args, **kwargs: makedirs(rediriger(path, data_root),
+                                                        *args, **kwargs)
+
+    module = importlib.import_module(module_name)
+    for name, value in list(vars(module).items()):
+        if name.isupper() and isinstance(value, str) and value.startswith('/data/'):
+            setattr(module, name, rediriger(value, data_root))
+    module.main()
+
+
+def instantane(root):
+    """{chemin: (inode, mtime, taille)} des fichiers sous root."""
+    files = {}
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+            stat = os.stat(path)
+            files[path] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def octets_ecrits(before, after):
+    """Taille des fichiers créés ou modifiés (un fichier déplacé n'est pas réécrit)."""
+    previous = set(before.values())
+    return sum(key[2] for key in after.values() if key not in previous)
+
+
+def mesurer_etape(dataset, stage, data_root, env, log_path):
+    """Lance une étape dans un processus enfant. Returns: (durée s, pic RSS Mo, octets)."""
+    module_name = STAGES[dataset][stage]
+    before = instantane(data_root)
+
+    with open(log_path, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--run-stage', module_name,
+             '--data-root', data_root],
+            stdout=log, stderr=subprocess.STDOUT, env=env
+        )
+        # wait4: ressources du seul processus enfant (ru_maxrss en Ko sous Linux)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{dataset}/{stage} a échoué (code {process.returncode}), "
+                           f"voir {log_path}")
+
+    peak_rss_mb = usage.ru_maxrss / 1024 if sys.platform != 'darwin' else usage.ru_maxrss / 2**20
+    return elapsed, peak_rss_mb, octets_ecrits(before, instantane(data_root))
+
+
+def commit_courant():
+    """Commit HEAD (suffixe -dirty si l'arbre est modifié), None hors git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               cwd=BENCH_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def comparer(results, baseline):
+    """Rapport des étapes communes: lignes/s et pic de RSS, nouveau / référence."""
+    reference = {(r['dataset'], r['stage']): r for r in baseline['results']}
+    print(f"\n Comparaison avec {baseline.get('commit')} ({baseline.get('date')})")
+    print(f"  {'étape':<22}{'lignes/s':>26}{'pic RSS (Mo)':>26}")
+    for result in results:
+        old = reference.get((result['dataset'], result['stage']))
+        if old is None:
+            continue
+        print(f"  {result['dataset'] + '/' + result['stage']:<22}"
+              f"{old['lines_per_sec']:>10,.0f} -> {result['lines_per_sec']:>9,.0f} "
+              f"x{result['lines_per_sec'] / old['lines_per_sec']:<4.2f}"
+              f"{old['peak_rss_mb']:>10,.0f} -> {result['peak_rss_mb']:>7,.0f} "
+              f"x{result['peak_rss_mb'] / old['peak_rss_mb']:<4.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--dataset', choices=['hdfs', 'openstack', 'both'], default='hdfs')
+    parser.add_argument('--scale', type=float, default=0.1,
+                        help="multiple de la taille du jeu Loghub (1 = HDFS_v1)")
+    parser.add_argument('--lines', type=int, default=None)
+    parser.add_argument('--sessions', type=int, default=None)
+    parser.add_argument('--anomaly-ratio', type=float, default=None)
+    parser.add_argument('--unparsed-rate', type=float, default=0.0)
+    parser.add_argument('--mix', default='')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', default='parse,vectorize,analyze')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE')
+    parser.add_argument('--workdir', default=None, help="défaut: répertoire temporaire")
+    parser.add_argument('--keep', action='store_true', help="conserver le répertoire de travail")
+    parser.add_argument('--output', default=None, help="résultats JSON")
+    parser.add_argument('--compare', default=None, help="résultats JSON de référence")
+    # Processus enfant: exécution d'une étape
+    parser.add_argument('--run-stage', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--data-root', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        executer_etape(args.run_stage, args.data_root)
+        return
+
+    env = dict(os.environ, ARTIFACT_CACHE='0', MPLBACKEND='Agg')
+    env.update(item.split('=', 1) for item in args.env)
+
+    datasets = ['hdfs', 'openstack'] if args.dataset == 'both' else [args.dataset]
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_scale_')
+    data_root = os.path.join(workdir, 'data')
+    options = {'unparsed_rate': args.unparsed_rate, 'mix': parse_mix(args.mix),
+               'seed': args.seed}
+    if args.anomaly_ratio is not None:
+        options['anomaly_ratio'] = args.anomaly_ratio
+
+    results = []
+    completed = False
+    try:
+        for dataset in datasets:
+            shutil.rmtree(os.path.join(data_root, dataset), ignore_errors=True)
+            raw_dir = os.path.join(data_root, dataset, 'raw')
+
+            start = time.perf_counter()
+            files = generate(dataset, raw_dir, args.scale, args.lines, args.sessions, **options)
+            num_lines = sum(files.values())
+            raw_bytes = sum(os.path.getsize(os.path.join(raw_dir, name)) for name in files)
+            print(f"\n{dataset}: {num_lines:,} lignes générées ({raw_bytes / 1e6:,.1f} Mo) "
+                  f"en {time.perf_counter() - start:.1f} s")
+
+            for stage in stages:
+                if stage not in STAGES[dataset]:
+                    print(f"  {stage:<10} non disponible pour {dataset}")
+                    continue
+                log_path = os.path.join(workdir, f"{dataset}_{stage}.log")
+                elapsed, peak_rss_mb, written = mesurer_etape(dataset, stage, data_root,
+                                                              env, log_path)
+                results.append({
+                    'dataset': dataset,
+                    'stage': stage,
+                    'lines': num_lines,
+                    'input_bytes': raw_bytes,
+                    'seconds': elapsed,
+                    'lines_per_sec': num_lines / elapsed,
+                    'peak_rss_mb': peak_rss_mb,
+                    'bytes_written': written
+                })
+                print(f"  {stage:<10} {elapsed:8.2f} s  {num_lines / elapsed:>12,.0f} lignes/s  "
+                      f"pic RSS {peak_rss_mb:>8,.0f} Mo  écrit {written / 1e6:>9,.1f} Mo")
+        completed = True
+    finally:
+        # Conservé en cas d'échec: journaux des étapes
+        if args.keep or args.workdir or not completed:
+            print(f"\n Répertoire de travail: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': commit_courant(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'args': {key: value for key, value in vars(args).items()
+                 if key not in ('run_stage', 'data_root')},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f" Résultats: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            comparer(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Générateur de charge pour la détection en continu (stream_detector).
+
+Un fichier de log HDFS synthétique est alimenté pendant que le détecteur
+le suit (FileTailer + StreamingDetector, dans un thread):
+- latence: bursts de --burst lignes toutes les --interval s, délai entre
+  l'écriture d'un burst et son comptage par le détecteur (lecture du
+  fichier incluse)
+- débit: --lines lignes ajoutées d'un coup, lignes/s traitées
+
+L'état Drain3 est appris sur un préfixe des mêmes logs et le modèle est une
+régression logistique entraînée sur des comptages aléatoires (le scoring
+est inclus, pas la qualité de détection).
+
+Usage: python benchmarks/bench_stream.py [--lines 500000] [--burst 200] [--bursts 50]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parser')
+sys.path.insert(0, PARSER_DIR)
+sys.path.insert(0, os.path.join(PARSER_DIR, 'hdfs'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stream_detector import FileTailer, StreamingDetector
+from hdfs_processor import HDFSLogProcessor
+from generate_logs import LogGenerator
+
+
+def generer_lignes(num_lines, num_blocks=5000, seed=0):
+    """Lignes HDFS synthétiques (generate_logs.py), blocs entrelacés."""
+    generator = LogGenerator('hdfs', seed=seed)
+    return [line + '\n' for lines, _ in generator.iter_blocks(num_lines, num_blocks)
+            for line in lines]
+
+
+def creer_detecteur(config_file, learn_lines):
+    """Processeur avec un état Drain3 appris, puis détecteur figé."""
+    processor = HDFSLogProcessor(config_file=config_file)
+    processor.init_template_miner()
+    for line in learn_lines:
+        processor._assign_template(processor.parse_line(line))
+
+    num_features = len(processor.template_miner.drain.clusters)
+    rng = np.random.default_rng(0)
+    counts = rng.poisson(2, size=(200, num_features))
+    model = LogisticRegression(max_iter=200).fit(counts, np.arange(200) % 2)
+
+    return StreamingDetector(processor, 'BlockId', model, session_timeout=5.0,
+                             score_interval=0.5)
+
+
+def attendre(detector, target, timeout=60.0):
+    """Attend que le détecteur ait compté target lignes."""
+    deadline = time.perf_counter() + timeout
+    while detector.num_lines < target:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{detector.num_lines:,}/{target:,} lignes traitées")
+        time.sleep(0.0005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, default=500000)
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--bursts', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.1)
+    parser.add_argument('--poll-interval', type=float, default=0.01)
+    parser.add_argument('--config', default=os.path.join(PARSER_DIR, 'drain.ini'))
+    args = parser.parse_args()
+
+    lines = generer_lignes(args.lines + args.burst * args.bursts)
+    detector = creer_detecteur(args.config, lines[:20000])
+    print(f"{len(detector.feature_names)} templates figés, poll toutes les "
+          f"{args.poll_interval * 1000:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_path = os.path.join(tmp_dir, 'HDFS.log')
+        open(log_path, 'w').close()
+
+        stop_event = threading.Event()
+        thread = threading.Thread(target=detector.run,
+                                  args=([FileTailer(log_path, from_start=True)],
+                                        args.poll_interval, stop_event))
+        thread.start()
+
+        try:
+            with open(log_path, 'a') as f:
+                # Latence par burst
+                latencies = []
+                written = 0
+                for k in range(args.bursts):
+                    burst = lines[args.lines + k * args.burst:args.lines + (k + 1) * args.burst]
+                    start = time.perf_counter()
+                    f.writelines(burst)
+                    f.flush()
+                    written += len(burst)
+                    attendre(detector, written)
+                    latencies.append(time.perf_counter() - start)
+                    time.sleep(args.interval)
+
+                # Débit soutenu
+                start = time.perf_counter()
+                f.writelines(lines[:args.lines])
+                f.flush()
+                attendre(detector, written + args.lines)
+                elapsed = time.perf_counter() - start
+        finally:
+            stop_event.set()
+            thread.join()
+
+    latencies = np.array(latencies) * 1000
+    stats = detector.get_stats()
+    print(f"  Latence burst de {args.burst} lignes: p50 {np.percentile(latencies, 50):.1f} ms, "
+          f"p99 {np.percentile(latencies, 99):.1f} ms, max {latencies.max():.1f} ms")
+    print(f"  Débit: {args.lines:,} lignes en {elapsed:.2f} s  "
+          f"{args.lines / elapsed:>12,.0f} lignes/s")
+    print(f"  {stats['closed_sessions']:,} sessions scorées, "
+          f"{stats['unknown_events']:,} événements inconnus, {stats['alerts']:,} alertes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark de l'agrégation par session des vectoriseurs.
+
+Compare, sur des chunks synthétiques (BlockId, EventId):
+- groupby: boucle historique groupby + value_counts + Counter.update
+- numpy: SessionEventCounter (factorize + bincount)
+- tracker: SessionTracker, sessions inactives depuis --max-gap lignes
+  déversées sur disque (tableau dense borné par les sessions ouvertes)
+
+Usage: python benchmarks/bench_vectorize.py [--rows 2000000] [--sessions 100000] [--max-gap 200000]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parser'))
+
+from session_counts import SessionEventCounter, SessionTracker
+
+
+def generer_chunks(num_rows, num_sessions, num_events, chunk_size, seed=0):
+    """Chunks (BlockId, EventId) comme ceux lus depuis HDFS_structured."""
+    rng = np.random.default_rng(seed)
+    block_ids = np.array([f"blk_{i}" for i in range(num_sessions)], dtype=object)
+    event_ids = np.array([f"E{i}" for i in range(1, num_events + 1)], dtype=object)
+
+    chunks = []
+    for start in range(0, num_rows, chunk_size):
+        size = min(chunk_size, num_rows - start)
+        # Sessions proches dans le temps, comme dans les vrais logs
+        sessions = (start * num_sessions // num_rows) + rng.integers(0, num_sessions // 10 + 1, size)
+        chunks.append(pd.DataFrame({
+            'BlockId': block_ids[np.minimum(sessions, num_sessions - 1)],
+            'EventId': event_ids[rng.zipf(1.5, size) % num_events]
+        }))
+    return chunks, event_ids.tolist()
+
+
+def agreger_groupby(chunks):
+    block_events = defaultdict(Counter)
+    for chunk in chunks:
+        for block_id, group in chunk.groupby('BlockId'):
+            event_counts = group['EventId'].value_counts()
+            block_events[block_id].update(event_counts.to_dict())
+    return block_events
+
+
+def agreger_numpy(chunks, event_ids):
+    block_events = SessionEventCounter(event_ids)
+    for chunk in chunks:
+        block_events.add(chunk['BlockId'].to_numpy(), chunk['EventId'].to_numpy())
+    return block_events
+
+
+def agreger_tracker(chunks, event_ids, max_gap):
+    block_events = SessionTracker(event_ids, max_gap=max_gap)
+    for chunk in chunks:
+        block_events.add(chunk['BlockId'].to_numpy(), chunk['EventId'].to_numpy())
+    return block_events
+
+
+def taille_mo(counter):
+    """Mémoire du tableau dense des comptages, en Mo."""
+    return counter.counts.nbytes / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--events', type=int, default=47)
+    parser.add_argument('--chunk-size', type=int, default=500000)
+    parser.add_argument('--max-gap', type=int, default=200000)
+    args = parser.parse_args()
+
+    chunks, event_ids = generer_chunks(args.rows, args.sessions, args.events, args.chunk_size)
+    print(f"{args.rows:,} lignes, {args.sessions:,} sessions, {args.events} événements, "
+          f"chunks de {args.chunk_size:,}")
+
+    start = time.perf_counter()
+    reference = agreger_groupby(chunks)
+    elapsed_groupby = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = agreger_numpy(chunks, event_ids)
+    elapsed_numpy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tracked = agreger_tracker(chunks, event_ids, args.max_gap)
+    tracked_matrix, tracked_ids = tracked.to_csr(event_ids)
+    elapsed_tracker = time.perf_counter() - start
+
+    # Vérifier que les moteurs donnent les mêmes comptages
+    assert len(result) == len(reference)
+    for block_id, counts in reference.items():
+        assert result[block_id] == dict(counts), block_id
+    matrix, session_ids = result.to_csr(event_ids)
+    assert tracked_ids == session_ids and (tracked_matrix != matrix).nnz == 0
+
+    print(f"  groupby: {elapsed_groupby:8.2f} s  {args.rows / elapsed_groupby:>12,.0f} lignes/s")
+    print(f"  numpy:   {elapsed_numpy:8.2f} s  {args.rows / elapsed_numpy:>12,.0f} lignes/s")
+    print(f"  tracker: {elapsed_tracker:8.2f} s  {args.rows / elapsed_tracker:>12,.0f} lignes/s"
+          f"  (to_csr inclus)")
+    print(f"  Accélération: x{elapsed_groupby / elapsed_numpy:.1f}")
+    print(f"  Mémoire des comptages: numpy {taille_mo(result):.1f} Mo, tracker "
+          f"{taille_mo(tracked):.1f} Mo ({tracked.peak_open:,} sessions ouvertes au plus, "
+          f"{tracked.num_spilled:,} déversées, {tracked.spilled_bytes / 1e6:.1f} Mo sur disque)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Vérifie que tous les lecteurs découpent les lignes comme la lecture texte.
+
+Génère un log HDFS synthétique avec des fins de ligne mélangées ('\\n',
+'\\r\\n', '\\r' isolé, lignes vides) et quelques caractères non-ASCII, le
+parse en séquentiel (référence, newlines universels), puis avec chaque
+lecteur (mmap, plage d'octets du mode incrémental, shards des workers,
+apprendre puis apparier) et compare le fichier structuré, les templates et
+le nombre de lignes lues. Code de sortie 1 si un lecteur diffère.
+
+Usage: python benchmarks/check_readers.py [--lines 80000] [--workers 2]
+"""
+import os
+import io
+import sys
+import shutil
+import filecmp
+import argparse
+import tempfile
+import contextlib
+
+import numpy as np
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parser')
+sys.path.insert(0, PARSER_DIR)
+sys.path.insert(0, os.path.join(PARSER_DIR, 'hdfs'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from hdfs_processor import HDFSLogProcessor
+from generate_logs import LogGenerator
+
+# Fins de ligne tirées pour chaque ligne
+LINE_ENDS = ('\n', '\r\n', '\r', '\r\r', '\n\r\n')
+LINE_END_WEIGHTS = (0.85, 0.06, 0.05, 0.02, 0.02)
+
+
+def ecrire_log(path, num_lines, seed=0):
+    """Log HDFS synthétique avec des fins de ligne mélangées."""
+    generator = LogGenerator('hdfs', seed=seed)
+    rng = np.random.default_rng(seed)
+    lines = [line for lines, _ in generator.iter_blocks(num_lines) for line in lines]
+    ends = rng.choice(len(LINE_ENDS), size=len(lines), p=LINE_END_WEIGHTS)
+    accents = rng.random(len(lines)) < 0.01
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for line, end, accent in zip(lines, ends.tolist(), accents.tolist()):
+            f.write(line + (' réplique' if accent else '') + LINE_ENDS[end])
+    return len(lines)
+
+
+def parser_log(path, output_path, config_file, **options):
+    """Parse path avec les options du lecteur, sorties: templates, lignes lues."""
+    processor = HDFSLogProcessor(config_file=config_file)
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.parse_and_save_streaming(path, output_path, **options)
+    templates = processor.create_templates_dataframe()
+    return templates, processor.lines_read
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, default=80000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--config', default=os.path.join(PARSER_DIR, 'drain.ini'))
+    parser.add_argument('--workdir', default=None, help="défaut: répertoire temporaire")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='check_readers_')
+    os.makedirs(workdir, exist_ok=True)
+    log_path = os.path.join(workdir, 'HDFS.log')
+    num_lines = ecrire_log(log_path, args.lines, seed=args.seed)
+    size = os.path.getsize(log_path)
+    print(f"hdfs: {num_lines:,} lignes générées dans {log_path}")
+
+    parallel = dict(num_workers=args.workers, shard_size=1 << 20)
+    modes = {
+        'mmap': dict(reader='mmap'),
+        'plage': dict(start_offset=0, end_offset=size),
+        'workers': parallel,
+        'workers_mmap': dict(parallel, reader='mmap'),
+        'apprentissage': dict(parallel, learn_lines=5000),
+    }
+
+    reference_path = os.path.join(workdir, 'sequentiel.csv')
+    reference = parser_log(log_path, reference_path, args.config, batch_size=7000)
+    print(f"  {'sequentiel':<14} {reference[1]:,} lignes lues, {len(reference[0])} templates")
+
+    differences = []
+    for mode, options in modes.items():
+        output_path = os.path.join(workdir, f"{mode}.csv")
+        templates, lines_read = parser_log(log_path, output_path, args.config,
+                                           batch_size=7000, **options)
+        identical = (filecmp.cmp(reference_path, output_path, shallow=False)
+                     and templates.equals(reference[0]) and lines_read == reference[1])
+        if not identical:
+            differences.append(mode)
+        print(f"  {mode:<14} {lines_read:,} lignes lues, {len(templates)} templates: "
+              f"{'identique' if identical else 'DIFFÉRENT'}")
+
+    if differences:
+        print(f"\n {len(differences)} lecteur(s) différent(s), sorties dans {workdir}")
+        sys.exit(1)
+
+    print(f"\n Sorties identiques ({len(modes)} lecteurs)")
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
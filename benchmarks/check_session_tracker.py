@@ -0,0 +1,100 @@
+"""
+Vérifie que la mémoire de SessionTracker reste bornée par les sessions ouvertes.
+
+Des chunks (BlockId, EventId) sont générés au fil de l'eau: une fenêtre
+de sessions actives avance dans le flux et une petite part des lignes
+revient sur des sessions déjà déversées. L'agrégation est faite pour
+--rows puis --scale fois plus de lignes (même nombre de sessions ouvertes,
+--scale fois plus de sessions au total); le pic d'allocations
+(tracemalloc) pendant l'agrégation ne doit pas suivre le nombre total de
+sessions. La matrice obtenue est comparée à celle de SessionEventCounter.
+Code de sortie 1 si la mémoire croît ou si les matrices diffèrent.
+
+Usage: python benchmarks/check_session_tracker.py [--rows 1000000] [--scale 4] [--max-gap 20000]
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parser'))
+
+from session_counts import SessionEventCounter, SessionTracker
+
+# Pic toléré au plus grand volume, relatif au petit (mêmes sessions ouvertes)
+MAX_GROWTH = 1.5
+
+
+def generer_chunks(num_rows, open_sessions, num_events, chunk_size, late_rate, seed=0):
+    """Chunks (BlockId, EventId, positions), sessions ouvertes en fenêtre glissante."""
+    rng = np.random.default_rng(seed)
+    event_ids = np.array([f"E{i}" for i in range(1, num_events + 1)], dtype=object)
+
+    for start in range(0, num_rows, chunk_size):
+        size = min(chunk_size, num_rows - start)
+        positions = np.arange(start + 1, start + size + 1)
+        # Une nouvelle session toutes les 10 lignes, active sur open_sessions * 10 lignes
+        first = np.maximum(positions // 10 - open_sessions, 0)
+        sessions = first + rng.integers(0, open_sessions, size)
+        late = rng.random(size) < late_rate
+        sessions[late] = rng.integers(0, np.maximum(first[late], 1))
+        yield (np.array([f"blk_{session}" for session in sessions.tolist()], dtype=object),
+               event_ids[rng.zipf(1.5, size) % num_events], positions)
+
+
+def agreger(counter, chunks):
+    """Agrège les chunks, pic des allocations pendant l'agrégation (octets)."""
+    tracemalloc.start()
+    for sessions, events, positions in chunks:
+        if isinstance(counter, SessionTracker):
+            counter.add(sessions, events, positions)
+        else:
+            counter.add(sessions, events)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--open-sessions', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=47)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--late-rate', type=float, default=0.001,
+                        help="part des lignes sur une session déjà déversée")
+    parser.add_argument('--max-gap', type=int, default=20000)
+    args = parser.parse_args()
+
+    event_ids = [f"E{i}" for i in range(1, args.events + 1)]
+    options = (args.open_sessions, args.events, args.chunk_size, args.late_rate)
+
+    peaks = {}
+    for num_rows in (args.rows, args.rows * args.scale):
+        tracker = SessionTracker(event_ids, max_gap=args.max_gap)
+        peaks[num_rows] = agreger(tracker, generer_chunks(num_rows, *options))
+        print(f"  {num_rows:>12,} lignes: pic {peaks[num_rows] / 1e6:7.1f} Mo, "
+              f"{tracker.peak_open:,} sessions ouvertes au plus, {tracker.num_spilled:,} "
+              f"déversées ({tracker.spilled_bytes / 1e6:.1f} Mo sur disque)")
+
+    reference = SessionEventCounter(event_ids)
+    peak_reference = agreger(reference, generer_chunks(num_rows, *options))
+    print(f"  SessionEventCounter, {num_rows:,} lignes: pic {peak_reference / 1e6:.1f} Mo, "
+          f"{len(reference):,} sessions")
+
+    matrix, session_ids = tracker.to_csr(event_ids)
+    expected, expected_ids = reference.to_csr(event_ids)
+    identical = session_ids == expected_ids and (matrix != expected).nnz == 0
+    growth = peaks[args.rows * args.scale] / peaks[args.rows]
+
+    print(f"\n Pic x{growth:.2f} pour x{args.scale} lignes (toléré x{MAX_GROWTH}), "
+          f"matrices {'identiques' if identical else 'DIFFÉRENTES'}")
+    if growth > MAX_GROWTH or not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
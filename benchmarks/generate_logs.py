@@ -0,0 +1,513 @@
+"""
+Générateur de logs HDFS et OpenStack synthétiques (format Loghub).
+
+Les lignes respectent HDFSLogProcessor.LOG_PATTERN et
+OpenStackLogProcessor.LOG_PATTERN. Chaque session (BlockId, InstanceId)
+émet une suite d'événements tirés d'un mélange de templates pondéré
+(--mix nom=poids), les sessions d'un même bloc s'entrelacent dans le
+temps comme dans les vrais logs. Une fraction des sessions est anormale
+(templates d'erreur mêlés au cycle normal) et une fraction des lignes
+est non parsable (traces de pile, hors LOG_PATTERN).
+
+Sorties, dans --output (à déposer dans /data/*/raw):
+- hdfs: HDFS.log + anomaly_label.csv (BlockId,Label)
+- openstack: openstack_normal1.log, openstack_normal2.log (sessions
+  normales), openstack_abnormal.log (sessions anormales, étiquetées
+  Anomaly par vectorize_openstack.py) + anomaly_labels.txt
+
+Taille: --scale en multiples de HDFS_v1 (11 175 629 lignes) ou du jeu
+OpenStack de Loghub (207 820 lignes), ou --lines.
+
+Usage: python benchmarks/generate_logs.py hdfs --scale 1 --output /data/hdfs/raw
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+
+import numpy as np
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parser')
+
+# Tailles des jeux Loghub de référence
+HDFS_V1_LINES = 11175629
+HDFS_V1_BLOCKS = 575061
+HDFS_V1_ANOMALY_RATIO = 16838 / 575061
+OPENSTACK_LINES = 207820
+
+# Sessions générées ensemble (entrelacées dans le temps)
+SESSIONS_PER_BLOCK = 2000
+
+# Fichiers d'origine OpenStack (sans ':', que Filename de LOG_PATTERN refuse)
+OPENSTACK_API_FILE = 'nova-api.log.1.2017-05-16_13-53-08'
+OPENSTACK_COMPUTE_FILE = 'nova-compute.log.1.2017-05-16_13-55-31'
+
+
+# Templates: nom -> (rôle, composant, niveau, format, poids par défaut)
+# rôle: start (premier événement de chaque session), normal, anomaly
+# (sessions anormales) ou background (ligne sans session)
+HDFS_TEMPLATES = {
+    'allocate': ('start', 'dfs.FSNamesystem', 'INFO',
+                 'BLOCK* NameSystem.allocateBlock: /user/root/rand/_temporary/'
+                 '_task_200811092030_0001_m_{n:06d}_0/part-{n:05d}. {session}', 1.0),
+    'receiving': ('normal', 'dfs.DataNode$DataXceiver', 'INFO',
+                  'Receiving block {session} src: /{ip}:{port} dest: /{ip2}:50010', 3.0),
+    'received': ('normal', 'dfs.DataNode$PacketResponder', 'INFO',
+                 'Received block {session} of size {size} from /{ip}', 3.0),
+    'responder': ('normal', 'dfs.DataNode$PacketResponder', 'INFO',
+                  'PacketResponder {k} for block {session} terminating', 3.0),
+    'stored': ('normal', 'dfs.FSNamesystem', 'INFO',
+               'BLOCK* NameSystem.addStoredBlock: blockMap updated: {ip}:50010 '
+               'is added to {session} size {size}', 3.0),
+    'served': ('normal', 'dfs.DataNode', 'INFO',
+               '{ip}:50010 Served block {session} to /{ip2}', 1.5),
+    'verified': ('normal', 'dfs.DataBlockScanner', 'INFO',
+                 'Verification succeeded for {session}', 0.2),
+    'invalidset': ('normal', 'dfs.FSNamesystem', 'INFO',
+                   'BLOCK* NameSystem.delete: {session} is added to invalidSet of {ip}:50010',
+                   1.0),
+    'deleting': ('normal', 'dfs.FSDataset', 'INFO',
+                 'Deleting block {session} file /mnt/hadoop/dfs/data/current/subdir{k}/'
+                 '{session}', 1.0),
+    'ask_delete': ('normal', 'dfs.FSNamesystem', 'INFO',
+                   'BLOCK* ask {ip}:50010 to delete  {session}', 0.3),
+    'serve_exception': ('anomaly', 'dfs.DataNode', 'WARN',
+                        '{ip}:50010:Got exception while serving {session} to /{ip2}:', 1.0),
+    'receive_exception': ('anomaly', 'dfs.DataNode$DataXceiver', 'INFO',
+                          'Exception in receiveBlock for block {session} '
+                          'java.io.IOException: Connection reset by peer', 1.0),
+    'write_exception': ('anomaly', 'dfs.DataNode$DataXceiver', 'INFO',
+                        'writeBlock {session} received exception java.io.IOException: '
+                        'Could not read from stream', 1.0),
+    'redundant': ('anomaly', 'dfs.FSNamesystem', 'WARN',
+                  'BLOCK* NameSystem.addStoredBlock: Redundant addStoredBlock request '
+                  'received for {session} on {ip}:50010 size {size}', 0.5),
+    'empty_packet': ('anomaly', 'dfs.DataNode$PacketResponder', 'INFO',
+                     'Receiving empty packet for block {session}', 0.5),
+}
+
+HDFS_UNPARSED = [
+    '\tat org.apache.hadoop.dfs.DataNode$DataXceiver.run(DataNode.java:{n})',
+    'java.io.IOException: Connection reset by peer',
+    '\tat sun.nio.ch.FileDispatcher.read0(Native Method)',
+]
+
+OPENSTACK_TEMPLATES = {
+    'claim': ('start', 'nova.compute.claims', 'INFO',
+              '[instance: {session}] Attempting claim: memory 2048 MB, disk 20 GB, vcpus 1 CPU',
+              1.0),
+    'claimed': ('normal', 'nova.compute.claims', 'INFO',
+                '[instance: {session}] Claim successful', 1.0),
+    'image': ('normal', 'nova.virt.libvirt.driver', 'INFO',
+              '[instance: {session}] Creating image', 1.0),
+    'started': ('normal', 'nova.compute.manager', 'INFO',
+                '[instance: {session}] VM Started (Lifecycle Event)', 1.0),
+    'paused': ('normal', 'nova.compute.manager', 'INFO',
+               '[instance: {session}] VM Paused (Lifecycle Event)', 1.0),
+    'resumed': ('normal', 'nova.compute.manager', 'INFO',
+                '[instance: {session}] VM Resumed (Lifecycle Event)', 1.0),
+    'pending': ('normal', 'nova.compute.manager', 'INFO',
+                '[instance: {session}] During sync_power_state the instance has a pending '
+                'task (spawning). Skip.', 1.0),
+    'spawned': ('normal', 'nova.compute.manager', 'INFO',
+                '[instance: {session}] Took {seconds} seconds to spawn the instance on the '
+                'hypervisor.', 1.0),
+    'built': ('normal', 'nova.compute.manager', 'INFO',
+              '[instance: {session}] Took {seconds} seconds to build instance.', 1.0),
+    'terminating': ('normal', 'nova.compute.manager', 'INFO',
+                    '[instance: {session}] Terminating instance', 1.0),
+    'stopped': ('normal', 'nova.compute.manager', 'INFO',
+                '[instance: {session}] VM Stopped (Lifecycle Event)', 1.0),
+    'destroyed': ('normal', 'nova.virt.libvirt.driver', 'INFO',
+                  '[instance: {session}] Took {seconds} seconds to destroy the instance on '
+                  'the hypervisor.', 1.0),
+    'deleting': ('normal', 'nova.virt.libvirt.driver', 'INFO',
+                 '[instance: {session}] Deleting instance files '
+                 '/var/lib/nova/instances/{session}_del', 1.0),
+    'deleted': ('normal', 'nova.virt.libvirt.driver', 'INFO',
+                '[instance: {session}] Deletion of /var/lib/nova/instances/{session}_del '
+                'complete', 1.0),
+    'spawn_failed': ('anomaly', 'nova.compute.manager', 'ERROR',
+                     '[instance: {session}] Instance failed to spawn', 1.0),
+    'destroy_error': ('anomaly', 'nova.virt.libvirt.driver', 'WARNING',
+                      '[instance: {session}] Error from libvirt during destroy. Code=38 '
+                      'Error=Failed to terminate process {pid}', 1.0),
+    'api_server': ('background', 'nova.osapi_compute.wsgi.server', 'INFO',
+                   '{ip} "GET /v2/{tenant}/servers/detail HTTP/1.1" status: 200 len: {size} '
+                   'time: {seconds}', 6.0),
+    'metadata_server': ('background', 'nova.metadata.wsgi.server', 'INFO',
+                        '{ip},10.11.10.1 "GET /openstack/2013-10-17/meta_data.json HTTP/1.1" '
+                        'status: 200 len: 967 time: {seconds}', 1.0),
+    'image_cache': ('background', 'nova.virt.libvirt.imagecache', 'INFO',
+                    'image 0673dd71-34c5-4fbb-86c4-40623fbe45b4 at (/var/lib/nova/instances/'
+                    '_base/a489c868f0c37da93b76227c91bb03908ac0e742): checking', 1.0),
+    'resource_view': ('background', 'nova.compute.resource_tracker', 'INFO',
+                      'Final resource view: name=cp-1.slowvm1.tcloud-pg0.utah.cloudlab.us '
+                      'phys_ram=64172MB used_ram={size}MB phys_disk=15GB used_disk=20GB '
+                      'total_vcpus=16 used_vcpus=1 pci_stats=[]', 1.0),
+}
+
+OPENSTACK_UNPARSED = [
+    'Traceback (most recent call last):',
+    '  File "/usr/lib/python2.7/dist-packages/nova/compute/manager.py", line {n}, '
+    'in _build_resources',
+    '    yield resources',
+]
+
+
+class DatasetSpec:
+    """Templates, en-tête de ligne et identifiants de session d'un jeu."""
+
+    def __init__(self, name, templates, unparsed, lines_per_session, background_rate):
+        self.name = name
+        self.templates = templates
+        self.unparsed = unparsed
+        self.lines_per_session = lines_per_session
+        self.background_rate = background_rate
+
+
+DATASETS = {
+    'hdfs': DatasetSpec('hdfs', HDFS_TEMPLATES, HDFS_UNPARSED,
+                        lines_per_session=HDFS_V1_LINES / HDFS_V1_BLOCKS, background_rate=0.0),
+    'openstack': DatasetSpec('openstack', OPENSTACK_TEMPLATES, OPENSTACK_UNPARSED,
+                             lines_per_session=20, background_rate=0.6),
+}
+
+
+def parse_mix(mix):
+    """'nom=poids,nom=poids' -> {nom: poids}."""
+    weights = {}
+    for item in filter(None, (mix or '').split(',')):
+        name, _, weight = item.partition('=')
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+class LogGenerator:
+    """Lignes synthétiques d'un jeu, par blocs de sessions entrelacées."""
+
+    def __init__(self, dataset, anomaly_ratio=HDFS_V1_ANOMALY_RATIO, unparsed_rate=0.0,
+                 mix=None, lines_per_session=None, seed=0, start=None):
+        """
+        Args:
+            dataset: 'hdfs' ou 'openstack'
+            anomaly_ratio: Fraction des sessions anormales
+            unparsed_rate: Fraction des lignes non parsables
+            mix: Poids des templates ({nom: poids}), remplace les défauts
+            lines_per_session: Longueur moyenne d'une session (défaut du jeu)
+            seed: Graine (sorties reproductibles)
+            start: Horodatage de la première ligne
+        """
+        self.spec = DATASETS[dataset]
+        self.anomaly_ratio = anomaly_ratio
+        self.unparsed_rate = unparsed_rate
+        self.lines_per_session = lines_per_session or self.spec.lines_per_session
+        self.rng = np.random.default_rng(seed)
+
+        mix = mix or {}
+        unknown = set(mix) - set(self.spec.templates)
+        if unknown:
+            raise ValueError(f"Templates inconnus pour {dataset}: {sorted(unknown)}")
+
+        self.names = list(self.spec.templates)
+        self.formats = [self.spec.templates[name][3] for name in self.names]
+        self.headers = [(self.spec.templates[name][1], self.spec.templates[name][2])
+                        for name in self.names]
+        self.pools = {}
+        for role in ('start', 'normal', 'anomaly', 'background'):
+            indices = [i for i, name in enumerate(self.names)
+                       if self.spec.templates[name][0] == role]
+            weights = np.array([mix.get(self.names[i], self.spec.templates[self.names[i]][4])
+                                for i in indices], dtype=float)
+            if len(indices) and weights.sum() > 0:
+                self.pools[role] = (np.array(indices), weights / weights.sum())
+
+        self.ips = [f"10.250.{i // 256}.{i % 256}" for i in range(1, 4000)]
+        self.request_ids = [self.rng.bytes(16).hex() for _ in range(1000)]
+        self.clock = start or (datetime.datetime(2008, 11, 9, 20, 35, 18)
+                               if dataset == 'hdfs'
+                               else datetime.datetime(2017, 5, 16, 0, 0, 0))
+        self.lines_per_second = 80 if dataset == 'hdfs' else 40
+        self.num_lines = 0
+        self._stamp = (None, '')
+
+    def _session_ids(self, count):
+        if self.spec.name == 'hdfs':
+            values = self.rng.integers(-2**63, 2**63 - 1, size=count, dtype=np.int64)
+            return [f"blk_{value}" for value in values.tolist()]
+        data = self.rng.bytes(16 * count).hex()
+        return [f"{v[:8]}-{v[8:12]}-4{v[13:16]}-a{v[17:20]}-{v[20:32]}"
+                for v in (data[i:i + 32] for i in range(0, len(data), 32))]
+
+    def _draw(self, role, size):
+        indices, weights = self.pools[role]
+        return indices[self.rng.choice(len(indices), size=size, p=weights)]
+
+    def _block_events(self, count, lines_per_session):
+        """
+        Événements de count sessions, regroupés par session.
+
+        Returns:
+            (session de chaque événement, événements, sessions anormales)
+        """
+        rng = self.rng
+        lengths = np.maximum(1, rng.poisson(lines_per_session, size=count))
+        anomalous = rng.random(count) < self.anomaly_ratio
+        sessions = np.repeat(np.arange(count), lengths)
+        starts = np.cumsum(lengths) - lengths
+
+        role = 'normal' if 'normal' in self.pools else 'start'
+        events = self._draw(role, len(sessions))
+        if 'start' in self.pools:
+            events[starts] = self._draw('start', count)
+
+        if 'anomaly' in self.pools and anomalous.any():
+            # Sessions anormales: ~30% d'événements d'erreur, au moins un,
+            # jamais le premier d'une session de plus d'un événement
+            replaced = anomalous[sessions] & (rng.random(len(sessions)) < 0.3)
+            forced = starts + np.where(lengths > 1,
+                                       1 + rng.integers(0, np.maximum(lengths - 1, 1)), 0)
+            replaced[forced[anomalous]] = True
+            replaced[starts[lengths > 1]] = False
+            events[replaced] = self._draw('anomaly', int(replaced.sum()))
+        return sessions, events, anomalous
+
+    def iter_blocks(self, num_lines, num_sessions=None):
+        """
+        Yields:
+            (lignes, {session: 'Normal'|'Anomaly'}) par bloc de sessions,
+            num_lines lignes au total (sans '\\n')
+        """
+        # Part des lignes qui appartiennent à une session
+        session_share = (1 - self.unparsed_rate) * (1 - self.spec.background_rate)
+        lines_per_session = self.lines_per_session
+        if num_sessions:
+            lines_per_session = max(1.0, num_lines * session_share / num_sessions)
+        produced = 0
+
+        while produced < num_lines:
+            needed = int(np.ceil((num_lines - produced) * session_share / lines_per_session))
+            count = min(SESSIONS_PER_BLOCK, max(needed, 1))
+
+            session_ids = self._session_ids(count)
+            sessions, events, anomalous = self._block_events(count, lines_per_session)
+            labels = {session_id: 'Anomaly' if flag else 'Normal'
+                      for session_id, flag in zip(session_ids, anomalous.tolist())}
+
+            # Session active sur un intervalle du bloc, événements ordonnés
+            offsets = self.rng.random(len(sessions))
+            offsets = offsets[np.lexsort((offsets, sessions))]
+            times = (self.rng.random(count)[sessions] +
+                     offsets * self.rng.uniform(0.01, 0.2, size=count)[sessions])
+
+            # Lignes sans session et lignes non parsables, réparties dans le bloc
+            num_session_lines = len(events)
+            num_other = int(round(num_session_lines * self.spec.background_rate /
+                                  (1 - self.spec.background_rate)))
+            num_unparsed = int(round((num_session_lines + num_other) * self.unparsed_rate /
+                                     (1 - self.unparsed_rate)))
+            if 'background' in self.pools and num_other:
+                sessions = np.concatenate([sessions, np.full(num_other, -1)])
+                events = np.concatenate([events, self._draw('background', num_other)])
+                times = np.concatenate([times, self.rng.random(num_other)])
+            if num_unparsed:
+                sessions = np.concatenate([sessions, np.full(num_unparsed, -2)])
+                events = np.concatenate([events, np.zeros(num_unparsed, dtype=events.dtype)])
+                times = np.concatenate([times, self.rng.random(num_unparsed)])
+
+            # Dernier bloc coupé à num_lines: seules les sessions présentes
+            # sont étiquetées
+            order = np.argsort(times, kind='stable')[:num_lines - produced]
+            present = np.unique(sessions[order])
+            labels = {session_ids[i]: labels[session_ids[i]] for i in present[present >= 0]}
+
+            lines = self._format(order, sessions, events, session_ids)
+            produced += len(lines)
+            yield lines, labels
+
+    def _format(self, order, sessions, events, session_ids):
+        size = len(order)
+        rng = self.rng
+        # Paramètres tirés en bloc, listes Python pour la boucle
+        ips = rng.integers(0, len(self.ips), size=size).tolist()
+        ips2 = rng.integers(0, len(self.ips), size=size).tolist()
+        numbers = rng.integers(0, 2**26, size=size).tolist()
+        small = rng.integers(0, 3, size=size).tolist()
+        pids = rng.integers(1, 40000, size=size).tolist()
+        requests = rng.integers(0, len(self.request_ids), size=size).tolist()
+        seconds = rng.uniform(0.1, 30.0, size=size).tolist()
+        line_sessions = sessions[order].tolist()
+        line_events = events[order].tolist()
+
+        lines = []
+        for position in range(size):
+            session = line_sessions[position]
+            number = numbers[position]
+            if session == -2:
+                template = self.spec.unparsed[position % len(self.spec.unparsed)]
+                lines.append(template.format(n=number % 3000))
+                continue
+
+            event = line_events[position]
+            component, level = self.headers[event]
+            content = self.formats[event].format(
+                session=session_ids[session] if session >= 0 else '',
+                ip=self.ips[ips[position]], ip2=self.ips[ips2[position]],
+                port=40000 + number % 20000, size=number, n=number % 1000,
+                k=small[position], pid=pids[position], seconds=f"{seconds[position]:.2f}",
+                tenant='54fadb412c4e40cdbaed9335e4c35a9e'
+            )
+            lines.append(self._header(self.num_lines + position, pids[position], level,
+                                      component, self.request_ids[requests[position]]) +
+                         content)
+
+        self.num_lines += size
+        return lines
+
+    def _timestamp(self, line_number):
+        """Horodatage à la seconde (mis en cache) de la ligne."""
+        second = line_number // self.lines_per_second
+        if self._stamp[0] != second:
+            timestamp = self.clock + datetime.timedelta(seconds=int(second))
+            text = (f"{timestamp:%y%m%d %H%M%S}" if self.spec.name == 'hdfs'
+                    else f"{timestamp:%Y-%m-%d %H:%M:%S}")
+            self._stamp = (second, text)
+        return self._stamp[1]
+
+    def _header(self, line_number, pid, level, component, request_id):
+        stamp = self._timestamp(line_number)
+        if self.spec.name == 'hdfs':
+            return f"{stamp} {pid} {level} {component}: "
+
+        millis = (line_number % self.lines_per_second) * 1000 // self.lines_per_second
+        file_name = (OPENSTACK_API_FILE if component.endswith('wsgi.server')
+                     else OPENSTACK_COMPUTE_FILE)
+        return (f"{file_name} {stamp}.{millis:03d} {pid} {level} {component} "
+                f"[req-{request_id[:8]}-{request_id[8:12]}-{request_id[12:16]}-"
+                f"{request_id[16:20]}-{request_id[20:]} 113d3a99c3da401fbd62cc2caa5b96d2 "
+                f"54fadb412c4e40cdbaed9335e4c35a9e - - -] ")
+
+
+def write_lines(generator, path, num_lines, num_sessions=None):
+    """Écrit num_lines lignes dans path. Returns: {session: label}."""
+    labels = {}
+    with open(path, 'w') as f:
+        for lines, block_labels in generator.iter_blocks(num_lines, num_sessions):
+            f.write('\n'.join(lines))
+            f.write('\n')
+            labels.update(block_labels)
+    return labels
+
+
+def generate_hdfs(output_dir, num_lines, num_sessions=None, **options):
+    """HDFS.log + anomaly_label.csv. Returns: {fichier: lignes}."""
+    os.makedirs(output_dir, exist_ok=True)
+    generator = LogGenerator('hdfs', **options)
+    labels = write_lines(generator, os.path.join(output_dir, 'HDFS.log'),
+                         num_lines, num_sessions)
+
+    with open(os.path.join(output_dir, 'anomaly_label.csv'), 'w') as f:
+        f.write('BlockId,Label\n')
+        f.writelines(f"{session},{label}\n" for session, label in labels.items())
+    return {'HDFS.log': num_lines}
+
+
+def generate_openstack(output_dir, num_lines, num_sessions=None,
+                       anomaly_ratio=0.02, **options):
+    """
+    openstack_normal1/normal2/abnormal.log + anomaly_labels.txt: les
+    sessions anormales (anomaly_ratio) sont dans openstack_abnormal.log.
+
+    Returns:
+        {fichier: lignes}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    seed = options.pop('seed', 0)
+
+    # Répartition des lignes de Loghub (normal1, normal2, abnormal)
+    abnormal_lines = max(1, round(num_lines * anomaly_ratio))
+    normal1_lines = round((num_lines - abnormal_lines) * 0.28)
+    files = [('openstack_normal1.log', normal1_lines, 0.0),
+             ('openstack_normal2.log', num_lines - abnormal_lines - normal1_lines, 0.0),
+             ('openstack_abnormal.log', abnormal_lines, 1.0)]
+
+    anomalies = []
+    for offset, (file_name, file_lines, file_ratio) in enumerate(files):
+        generator = LogGenerator('openstack', anomaly_ratio=file_ratio, seed=seed + offset,
+                                 **options)
+        file_sessions = (round(num_sessions * file_lines / num_lines)
+                         if num_sessions else None)
+        labels = write_lines(generator, os.path.join(output_dir, file_name),
+                             file_lines, file_sessions)
+        anomalies.extend(session for session, label in labels.items() if label == 'Anomaly')
+
+    with open(os.path.join(output_dir, 'anomaly_labels.txt'), 'w') as f:
+        f.write("The following VM instances have injected anomalies as observed in "
+                "openstack_abnormal.log.\n\n")
+        f.writelines(f"{session}\n" for session in anomalies)
+    return {file_name: file_lines for file_name, file_lines, _ in files}
+
+
+def generate(dataset, output_dir, scale=None, num_lines=None, num_sessions=None, **options):
+    """Génère un jeu (hdfs, openstack) dans output_dir. Returns: {fichier: lignes}."""
+    if num_lines is None:
+        num_lines = round((scale or 1.0) * (HDFS_V1_LINES if dataset == 'hdfs'
+                                             else OPENSTACK_LINES))
+    if dataset == 'hdfs':
+        return generate_hdfs(output_dir, num_lines, num_sessions, **options)
+    return generate_openstack(output_dir, num_lines, num_sessions, **options)
+
+
+def check_lines(dataset, path, limit=100000):
+    """Fraction des premières lignes qui respectent LOG_PATTERN du processeur."""
+    sys.path.insert(0, PARSER_DIR)
+    if dataset == 'hdfs':
+        from hdfs.hdfs_processor import HDFSLogProcessor as processor_class
+    else:
+        from openstack.openstack_processor import OpenStackLogProcessor as processor_class
+
+    matched = total = 0
+    with open(path) as f:
+        for line in f:
+            total += 1
+            matched += processor_class.LOG_PATTERN.match(line.rstrip('\n')) is not None
+            if total >= limit:
+                break
+    return matched / total if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--scale', type=float, default=None,
+                        help="multiple de la taille du jeu Loghub (défaut 1)")
+    parser.add_argument('--lines', type=int, default=None)
+    parser.add_argument('--sessions', type=int, default=None)
+    parser.add_argument('--anomaly-ratio', type=float, default=None)
+    parser.add_argument('--unparsed-rate', type=float, default=0.0)
+    parser.add_argument('--mix', default='', help="poids des templates: nom=poids,...")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    options = {'unparsed_rate': args.unparsed_rate, 'mix': parse_mix(args.mix),
+               'seed': args.seed}
+    if args.anomaly_ratio is not None:
+        options['anomaly_ratio'] = args.anomaly_ratio
+
+    start = time.perf_counter()
+    files = generate(args.dataset, args.output, args.scale, args.lines, args.sessions,
+                     **options)
+    elapsed = time.perf_counter() - start
+
+    total = sum(files.values())
+    for file_name, file_lines in files.items():
+        path = os.path.join(args.output, file_name)
+        print(f"  {path}: {file_lines:,} lignes, {os.path.getsize(path) / 1e6:,.1f} Mo, "
+              f"{check_lines(args.dataset, path):.1%} conformes à LOG_PATTERN")
+    print(f"  {total:,} lignes en {elapsed:.1f} s ({total / elapsed:,.0f} lignes/s)")
+
+
+if __name__ == "__main__":
+    main()
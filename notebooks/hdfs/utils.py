@@ -18,11 +18,23 @@ ANALYSIS_DIR = DATA_DIR / 'analysis'
 for d in [PROCESSED_DIR, MODELS_DIR, ANALYSIS_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
-def load_data():
-    """Charger données vectorisées"""
+def load_data(sparse=False):
+    """Charger données vectorisées (sparse=True: matrice CSR, colonnes creuses)"""
+    if sparse:
+        return load_sparse_data()
     df = pd.read_csv(VECTORIZED_DIR / 'HDFS_event_occurrence_matrix.csv')
     return df
 
+def load_sparse_data():
+    """Charger la matrice CSR (.npz) sans la densifier"""
+    from scipy import sparse as sp
+    prefix = VECTORIZED_DIR / 'HDFS_event_occurrence_matrix'
+    matrix = sp.load_npz(f'{prefix}.npz')
+    df_rows = pd.read_csv(f'{prefix}_rows.csv')
+    event_ids = pd.read_csv(f'{prefix}_columns.csv')['EventId'].tolist()
+    df_events = pd.DataFrame.sparse.from_spmatrix(matrix, columns=event_ids)
+    return pd.concat([df_rows, df_events], axis=1)
+
 def get_event_columns(df):
     """recuperer colonnes evenements"""
     return [col for col in df.columns if col.startswith('E')]
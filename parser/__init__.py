@@ -12,6 +12,13 @@ Modules:
 __version__ = '1.0.0'
 __author__ = 'TP2 Machine Learning'
 
+import os
+import sys
+
+# Modules du package importés à plat (from fingerprint import ...), comme
+# dans les scripts: python -m parser.pipeline depuis la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 from .cache_manager import CacheManager
 #from .log_processor import LogProcessor
 
@@ -0,0 +1,167 @@
+"""
+Sinks d'agrégation branchés sur LogProcessor.parse_and_save_streaming.
+
+Un sink reçoit les mêmes batchs que le writer du fichier structuré
+(méthodes write(batch) et close(), batch: RowBatch lu en colonnes). SessionCountSink compte les EventId
+par session (BlockId pour HDFS, InstanceId pour OpenStack) pendant le
+parsing, ce qui évite de relire le fichier structuré pour vectoriser.
+ParsingStatsCollector calcule les statistiques de parsing au passage.
+
+En mode incrémental, les deux sinks sauvegardent leur état dans le
+dossier state/ et le rechargent avant de parser la suite du fichier.
+"""
+import json
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from sparse_matrix import build_csr_matrix, save_sparse_matrix, load_sparse_matrix
+
+
+class SessionCountSink:
+    """Comptage des EventId par session, alimenté batch par batch."""
+
+    def __init__(self, session_column):
+        """
+        Args:
+            session_column: Colonne identifiant la session (BlockId, InstanceId)
+        """
+        self.session_column = session_column
+        self.session_events = defaultdict(Counter)
+        self.session_labels = {}
+        self.label = None
+        self.total_lines = 0
+
+    def set_label(self, label):
+        """Label par défaut des sessions vues pour la première fois."""
+        self.label = label
+
+    def write(self, batch):
+        session_events = self.session_events
+
+        for session_id, event_id in zip(batch.column(self.session_column), batch.event_ids):
+            if session_id:
+                session_events[session_id][event_id] += 1
+                if self.label is not None and session_id not in self.session_labels:
+                    self.session_labels[session_id] = self.label
+
+        self.total_lines += len(batch)
+
+    def close(self):
+        pass
+
+    def save_state(self, state_dir, base_name, event_ids):
+        """Sauvegarde les comptages (CSR + sessions/labels) pour le mode incrémental."""
+        matrix, session_ids = build_csr_matrix(self.session_events, event_ids)
+        df_rows = pd.DataFrame({self.session_column: session_ids})
+        if self.session_labels:
+            df_rows['Label'] = [self.session_labels.get(s) for s in session_ids]
+        save_sparse_matrix(state_dir, base_name, matrix, df_rows, event_ids)
+
+    def load_state(self, state_dir, base_name):
+        """Recharge les comptages sauvegardés par save_state."""
+        matrix, df_rows, event_ids = load_sparse_matrix(state_dir, base_name)
+        session_ids = df_rows[self.session_column].astype(str).tolist()
+
+        for row, session_id in enumerate(session_ids):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            counts = self.session_events[session_id]
+            for col, count in zip(matrix.indices[start:end], matrix.data[start:end]):
+                counts[event_ids[col]] += int(count)
+
+        if 'Label' in df_rows:
+            for session_id, label in zip(session_ids, df_rows['Label']):
+                if pd.notna(label):
+                    self.session_labels.setdefault(session_id, label)
+
+
+class ParsingStatsCollector:
+    """
+    Statistiques de parsing collectées au fil des batchs: lignes, lignes non
+    parsées, histogrammes par niveau et composant, sessions. Évite une
+    seconde lecture complète du fichier structuré.
+    """
+
+    def __init__(self, session_column):
+        """
+        Args:
+            session_column: Colonne identifiant la session (BlockId, InstanceId)
+        """
+        self.session_column = session_column
+        self.num_lines = 0
+        self.num_unparsed = 0
+        self.num_session_lines = 0
+        self.sessions = set()
+        self.levels = Counter()
+        self.components = Counter()
+
+    def write(self, batch):
+        columns = zip(batch.column('Level'), batch.column('Component'),
+                      batch.column(self.session_column))
+
+        for level, component, session_id in columns:
+            if level:
+                self.levels[level] += 1
+                self.components[component] += 1
+            else:
+                # Les lignes non parsées n'ont ni niveau ni composant
+                self.num_unparsed += 1
+
+            if session_id:
+                self.num_session_lines += 1
+                self.sessions.add(session_id)
+
+        self.num_lines += len(batch)
+
+    def close(self):
+        pass
+
+    def get_summary(self):
+        """Résumé sérialisable en JSON (métadonnées du cache)."""
+        return {
+            'num_lines': self.num_lines,
+            'num_unparsed': self.num_unparsed,
+            'session_column': self.session_column,
+            'num_session_lines': self.num_session_lines,
+            'num_sessions': len(self.sessions),
+            'levels': dict(self.levels.most_common()),
+            'components': dict(self.components.most_common())
+        }
+
+    def save_state(self, state_path):
+        """Sauvegarde les compteurs et les sessions vues (mode incrémental)."""
+        state = self.get_summary()
+        state['sessions'] = sorted(self.sessions)
+        with open(state_path, 'w') as f:
+            json.dump(state, f)
+
+    def load_state(self, state_path):
+        """Reprend les compteurs sauvegardés par save_state."""
+        with open(state_path) as f:
+            state = json.load(f)
+
+        self.num_lines += state['num_lines']
+        self.num_unparsed += state['num_unparsed']
+        self.num_session_lines += state['num_session_lines']
+        self.sessions.update(state['sessions'])
+        self.levels.update(state['levels'])
+        self.components.update(state['components'])
+
+
+def print_parsing_stats(summary, top=5):
+    """Affiche un résumé produit par ParsingStatsCollector.get_summary()."""
+    num_lines = summary['num_lines']
+    unparsed_pct = summary['num_unparsed'] / num_lines * 100 if num_lines else 0.0
+    session_column = summary['session_column']
+
+    print(f"  - Lignes non parsées: {summary['num_unparsed']:,} ({unparsed_pct:.2f}%)")
+    print(f"  - Lignes avec {session_column}: {summary['num_session_lines']:,}")
+    print(f"  - {session_column}s uniques: {summary['num_sessions']:,}")
+
+    print(f"  - Niveaux:")
+    for level, count in summary['levels'].items():
+        print(f"      {level:<10} {count:>12,}")
+
+    print(f"  - Top {top} composants:")
+    for component, count in list(summary['components'].items())[:top]:
+        print(f"      {component:<40} {count:>12,}")
@@ -0,0 +1,167 @@
+"""
+Cache d'artefacts adressé par contenu pour les étapes après le parsing
+(vectorisation, analyse).
+
+La clé d'une étape est le hash de ses fichiers d'entrée (sorties du
+parsing, labels, drain.ini, code de l'étape) et de sa configuration. Les
+sorties sont copiées dans <state_dir>/artifacts/<clé>/. Sur un hit, les
+sorties déjà en place (même taille/mtime/inode) sont gardées telles
+quelles, sinon elles sont restaurées depuis le cache.
+
+Les hashes d'entrée sont mémorisés dans l'index avec leur empreinte stat:
+un fichier inchangé n'est pas relu. Au-delà de max_bytes, les artefacts
+les moins récemment utilisés sont supprimés.
+"""
+import os
+import json
+import time
+import shutil
+
+from fingerprint import HASH_ALGORITHM, new_hasher, stat_fingerprint, full_hash
+
+
+# Taille maximale du cache d'artefacts (par répertoire d'état)
+MAX_CACHE_BYTES = int(os.environ.get('ARTIFACT_CACHE_MB', '2048')) * 1024 * 1024
+
+
+class ArtifactCache:
+    """Cache des sorties d'étapes, indexé par le hash de leurs entrées."""
+
+    def __init__(self, state_dir, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = os.path.join(state_dir, 'artifacts')
+        self.index_file = os.path.join(self.cache_dir, 'index.json')
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load_index(self):
+        """Charge l'index (hashes d'entrée et artefacts)."""
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print(" ⚠️ Index du cache d'artefacts illisible, cache ignoré")
+        return {'hashes': {}, 'artifacts': {}}
+
+    def save_index(self, index):
+        """Sauvegarde l'index (écriture atomique)."""
+        tmp_path = self.index_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_file)
+
+    def _input_hash(self, index, path):
+        """Hash d'un fichier d'entrée, relu seulement si son stat a changé."""
+        if not os.path.exists(path):
+            return 'absent'
+
+        key = os.path.abspath(path)
+        fingerprint = stat_fingerprint(path)
+        memo = index['hashes'].get(key)
+        if (memo is not None and memo['stat'] == fingerprint
+                and memo['algorithm'] == HASH_ALGORITHM):
+            return memo['hash']
+
+        file_hash = full_hash(path)
+        index['hashes'][key] = {'stat': fingerprint, 'algorithm': HASH_ALGORITHM,
+                                'hash': file_hash}
+        return file_hash
+
+    def compute_key(self, stage, input_paths, config=None):
+        """
+        Clé d'une exécution d'étape.
+
+        Args:
+            stage: Nom de l'étape (ex: 'vectorize_hdfs')
+            input_paths: Fichiers lus par l'étape, code inclus (un fichier
+                absent fait partie de la clé)
+            config: dict JSON-sérialisable des options influant sur la sortie
+        """
+        index = self.load_index()
+        hasher = new_hasher()
+        hasher.update(stage.encode())
+
+        for path in input_paths:
+            hasher.update(os.path.basename(path).encode())
+            hasher.update(self._input_hash(index, path).encode())
+        hasher.update(json.dumps(config or {}, sort_keys=True).encode())
+
+        self.save_index(index)
+        return f"{stage}-{hasher.hexdigest()}"
+
+    def restore(self, key):
+        """
+        Remet en place les sorties d'une clé déjà calculée.
+
+        Returns:
+            Liste des chemins de sortie si hit, None sinon
+        """
+        index = self.load_index()
+        artifact = index['artifacts'].get(key)
+        if artifact is None:
+            return None
+
+        artifact_dir = os.path.join(self.cache_dir, key)
+        outputs = artifact['outputs']
+
+        # Copies du cache manquantes (suppression manuelle): miss
+        for output in outputs:
+            if not os.path.exists(os.path.join(artifact_dir, output['name'])):
+                del index['artifacts'][key]
+                self.save_index(index)
+                return None
+
+        for output in outputs:
+            path = output['path']
+            if os.path.exists(path) and stat_fingerprint(path) == output['stat']:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copy2(os.path.join(artifact_dir, output['name']), path)
+            output['stat'] = stat_fingerprint(path)
+
+        artifact['last_used'] = time.time()
+        self.save_index(index)
+        return [output['path'] for output in outputs]
+
+    def store(self, key, output_paths):
+        """Copie les sorties d'une étape dans le cache, puis éviction LRU."""
+        index = self.load_index()
+        artifact_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(artifact_dir, exist_ok=True)
+
+        outputs = []
+        total_size = 0
+        for path in output_paths:
+            name = os.path.basename(path)
+            shutil.copy2(path, os.path.join(artifact_dir, name))
+            outputs.append({'path': os.path.abspath(path), 'name': name,
+                            'stat': stat_fingerprint(path)})
+            total_size += os.path.getsize(path)
+
+        index['artifacts'][key] = {
+            'outputs': outputs,
+            'size': total_size,
+            'last_used': time.time()
+        }
+        self._evict(index, keep=key)
+        self.save_index(index)
+
+    def _evict(self, index, keep=None):
+        """Supprime les artefacts les plus anciens au-delà de max_bytes."""
+        artifacts = index['artifacts']
+        total_size = sum(artifact['size'] for artifact in artifacts.values())
+
+        for key in sorted(artifacts, key=lambda k: artifacts[k]['last_used']):
+            if total_size <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total_size -= artifacts[key]['size']
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            del artifacts[key]
+            print(f"   Cache d'artefacts: {key} évincé")
+
+    def clear(self):
+        """Vide le cache d'artefacts."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
@@ -1,8 +1,11 @@
 import os
 import json
-import hashlib
 from datetime import datetime
 
+from fingerprint import (HASH_ALGORITHM, stat_fingerprint, sampled_hash, full_hash, stream_hash,
+                         new_hasher, update_hash)
+from compressed_input import is_compressed, find_log_source, member_info, open_log_source
+
 
 class CacheManager:
     
@@ -15,20 +18,45 @@ class CacheManager:
         """
         self.state_dir = state_dir
         self.metadata_file = os.path.join(state_dir, 'parsing_metadata.json')
+        # État Drain3 du mode incrémental, à côté des métadonnées
+        self.template_state_file = os.path.join(state_dir, 'drain3_state.json')
         os.makedirs(state_dir, exist_ok=True)
+        # Hashes déjà calculés pendant ce run: (chemin, membre, limit, algo) -> (stat, hash)
+        self._hash_memo = {}
+        # Hash en cours du préfixe déjà parsé (mode incrémental): chemin -> (offset, hasher)
+        self._prefix_hashers = {}
     
-    def get_file_hash(self, file_path):
+    def get_file_hash(self, file_path, limit=None, algorithm=HASH_ALGORITHM, member=None):
         """
-        Calcule le hash MD5 d'un fichier.
+        Calcule le hash d'un fichier (ou de ses limit premiers octets).
+        
+        Pour un fichier compressé ou un membre d'archive, c'est le hash du
+        contenu décompressé (limit ignoré).
+        
+        Le résultat est mémorisé pour le run tant que taille, mtime et inode
+        du fichier ne changent pas: check_cache puis update_cache ne lisent
+        le fichier qu'une fois.
         """
         if not os.path.exists(file_path):
             return None
         
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        key = (os.path.abspath(file_path), member, limit, algorithm)
+        fingerprint = stat_fingerprint(file_path)
+        memo = self._hash_memo.get(key)
+        if memo is not None and memo[0] == fingerprint:
+            return memo[1]
+        
+        if member is not None or is_compressed(file_path):
+            file_hash = stream_hash(open_log_source(file_path, member), algorithm)
+        else:
+            file_hash = full_hash(file_path, limit=limit, algorithm=algorithm)
+        self._hash_memo[key] = (fingerprint, file_hash)
+        return file_hash
+    
+    def remember_file_hash(self, file_path, file_hash, algorithm=HASH_ALGORITHM, member=None):
+        """Enregistre un hash complet calculé ailleurs (ex: pendant le parsing)."""
+        key = (os.path.abspath(file_path), member, None, algorithm)
+        self._hash_memo[key] = (stat_fingerprint(file_path), file_hash)
     
     def load_metadata(self):
         """Charge les métadonnées du cache"""
@@ -51,24 +79,46 @@ class CacheManager:
     def check_cache(self, log_file_name, input_dir, output_dir):
         """
         Vérifie si le parsing est nécessaire.
+        
+        Le log peut aussi être lu depuis une archive de /raw/ (.gz, .zst,
+        membre de .zip/.tar.gz): l'empreinte est alors celle du membre.
         """
-        input_path = os.path.join(input_dir, log_file_name)
+        input_path, member = find_log_source(input_dir, log_file_name)
         metadata = self.load_metadata()
         
         #  Fichier absent dans /raw/
-        if not os.path.exists(input_path):
+        if input_path is None:
             if log_file_name in metadata:
                 return False, "✓ Fichier déjà parsé (archivé), résultats en cache"
             else:
                 return True, "⚠️ Aucun fichier à parser dans /raw/"
         
-        #  Fichier présent → vérifier hash
-        current_hash = self.get_file_hash(input_path)
-        
+        #  Fichier présent → vérifier l'empreinte, du moins cher au plus cher
         if log_file_name in metadata:
-            cached_hash = metadata[log_file_name].get('file_hash')
+            entry = metadata[log_file_name]
+            
+            #  1. taille/mtime/inode identiques: même fichier, sans lecture
+            if (entry.get('file_stat') == stat_fingerprint(input_path)
+                    and entry.get('member') == member):
+                return False, " Fichier identique déjà parsé (taille/mtime/inode), skip"
+            
+            algorithm = entry.get('hash_algorithm', 'md5')
+            cached_info = entry.get('member_info')
+            if cached_info is not None:
+                #  2. membre d'archive: taille/mtime(/crc) sans décompression
+                if cached_info == member_info(input_path, member):
+                    return False, " Membre d'archive identique déjà parsé, skip"
+                return True, " Membre d'archive modifié, parsing nécessaire"
             
-            if cached_hash == current_hash:
+            #  2. blocs échantillonnés différents: fichier modifié
+            cached_sample = entry.get('sample_hash')
+            if (cached_sample and not is_compressed(input_path)
+                    and sampled_hash(input_path, algorithm) != cached_sample):
+                return True, " Nouveau fichier détecté (hash différent), parsing nécessaire"
+            
+            #  3. hash complet (contenu décompressé pour .gz/.zst)
+            if entry.get('file_hash') == self.get_file_hash(input_path, algorithm=algorithm,
+                                                             member=member):
                 #  Même fichier 
                 return False, " Fichier identique déjà parsé (hash identique), skip"
             else:
@@ -78,25 +128,150 @@ class CacheManager:
         #  Première fois
         return True, " Nouveau fichier, parsing nécessaire"
     
-    def update_cache(self, log_file_name, input_path, stats):
+    def check_incremental(self, log_file_name, input_dir):
+        """
+        Vérifie si un parsing incrémental (ajouts en fin de fichier) est
+        possible.
+        
+        Returns:
+            (mode, raison, entrée de cache) avec mode:
+            - 'skip': rien de nouveau
+            - 'delta': préfixe inchangé, parser à partir de byte_offset
+            - 'full': parsing complet nécessaire
+        """
+        input_path = os.path.join(input_dir, log_file_name)
+        entry = self.load_metadata().get(log_file_name)
+        
+        if not os.path.exists(input_path):
+            if entry is not None:
+                return 'skip', "✓ Fichier déjà parsé (archivé), résultats en cache", entry
+            return 'full', "⚠️ Aucun fichier à parser dans /raw/", None
+        
+        if entry is None or 'byte_offset' not in entry:
+            return 'full', " Pas d'état incrémental, parsing complet", None
+        
+        if not os.path.exists(self.template_state_file):
+            return 'full', " État Drain3 absent, parsing complet", None
+        
+        byte_offset = entry['byte_offset']
+        file_size = os.path.getsize(input_path)
+        
+        if file_size < byte_offset:
+            return 'full', " Fichier tronqué (rotation?), parsing complet", None
+        
+        # Le préfixe déjà parsé doit être inchangé (append-only)
+        algorithm = entry.get('hash_algorithm', 'md5')
+        hasher = update_hash(new_hasher(algorithm), input_path, 0, byte_offset)
+        if hasher.hexdigest() != entry.get('prefix_hash'):
+            return 'full', " Préfixe modifié (hash différent), parsing complet", None
+        # Hash continué sur la plage parsée ensuite (ancien algorithme: recalculé)
+        if algorithm == HASH_ALGORITHM:
+            self._prefix_hashers[os.path.abspath(input_path)] = (byte_offset, hasher)
+        
+        if file_size == byte_offset:
+            return 'skip', " Aucune nouvelle ligne depuis le dernier parsing, skip", entry
+        
+        return 'delta', (f" {file_size - byte_offset:,} nouveaux octets, "
+                         f"parsing incrémental"), entry
+    
+    def prefix_hasher(self, input_path, offset):
+        """
+        Hash en cours des offset premiers octets (copie, à continuer sur la
+        plage parsée), ou None s'il n'a pas été calculé par check_incremental.
+        """
+        if offset == 0:
+            return new_hasher()
+        known = self._prefix_hashers.get(os.path.abspath(input_path))
+        if known is None or known[0] != offset:
+            return None
+        return known[1].copy()
+    
+    def _prefix_hash(self, input_path, byte_offset):
+        """Hash des byte_offset premiers octets, en ne lisant que la suite du préfixe connu."""
+        known = self._prefix_hashers.get(os.path.abspath(input_path))
+        if known is not None and known[0] <= byte_offset:
+            return update_hash(known[1].copy(), input_path, known[0], byte_offset).hexdigest()
+        return self.get_file_hash(input_path, limit=byte_offset)
+    
+    def update_cache(self, log_file_name, input_path, stats, member=None):
         """
         Met à jour le cache après un parsing réussi.
         IMPORTANT: Appeler AVANT de move/archiver le fichier.
+        
+        En mode incrémental, stats contient aussi byte_offset (fin de la
+        dernière ligne parsée), raw_lines (lignes lues jusque-là) et
+        prefix_hash (hash de [0, byte_offset) continué pendant le parsing,
+        None si le mode de lecture ne le calcule pas: seule la plage parsée
+        est alors relue).
+        Le hash complet est celui mémorisé pendant check_cache ou le parsing
+        s'il existe (pas de seconde lecture du fichier).
+        
+        Pour une source compressée, input_path est l'archive et member le
+        membre parsé (None pour un .gz/.zst).
         """
         metadata = self.load_metadata()
+        compressed = is_compressed(input_path)
         
         # Calculer hash AVANT que le fichier soit déplacé
-        file_hash = self.get_file_hash(input_path)
+        byte_offset = stats.get('byte_offset')
+        if byte_offset is None:
+            file_hash = self.get_file_hash(input_path, member=member)
+        else:
+            prefix_hash = stats.get('prefix_hash') or self._prefix_hash(input_path, byte_offset)
+            # Fichier entièrement parsé: le hash du préfixe est celui du fichier
+            complete = byte_offset == os.path.getsize(input_path)
+            file_hash = prefix_hash if complete else None
+        
+        # Empreintes rapides seulement si le fichier entier a été parsé
+        parsed_whole_file = file_hash is not None
         
         metadata[log_file_name] = {
             'file_hash': file_hash,
+            'hash_algorithm': HASH_ALGORITHM,
+            'file_stat': stat_fingerprint(input_path) if parsed_whole_file else None,
+            'sample_hash': (sampled_hash(input_path)
+                            if parsed_whole_file and not compressed else None),
             'last_parsed': datetime.now().isoformat(),
             'num_lines': stats.get('num_lines', 0),
             'num_templates': stats.get('num_templates', 0)
         }
         
+        if compressed:
+            metadata[log_file_name].update({
+                'source': os.path.basename(input_path),
+                'member': member,
+                'member_info': member_info(input_path, member)
+            })
+        
+        if byte_offset is not None:
+            metadata[log_file_name].update({
+                'byte_offset': byte_offset,
+                'raw_lines': stats.get('raw_lines', 0),
+                'prefix_hash': prefix_hash
+            })
+        
+        # Statistiques détaillées collectées pendant le parsing
+        if stats.get('parsing_stats'):
+            metadata[log_file_name]['parsing_stats'] = stats['parsing_stats']
+        # Écriture en arrière-plan: attente du parseur (PARSER_WRITE_BUFFERS)
+        if stats.get('writer_stats'):
+            metadata[log_file_name]['writer_stats'] = stats['writer_stats']
+        
         self.save_metadata(metadata)
     
+    def save_job_info(self, section, job, info):
+        """Enregistre les informations d'un job dans les métadonnées, sous section."""
+        metadata = self.load_metadata()
+        metadata.setdefault(section, {})[job] = info
+        self.save_metadata(metadata)
+    
+    def save_metrics(self, job, summary):
+        """
+        Enregistre le résumé des métriques d'un job (PipelineMetrics.summary)
+        dans les métadonnées, sous 'pipeline_metrics'.
+        """
+        self.save_job_info('pipeline_metrics', job, summary)
+    
     def get_cache_info(self, log_file_name):
         """Récupère les informations de cache pour un fichier"""
         metadata = self.load_metadata()
@@ -108,6 +283,8 @@ class CacheManager:
             if os.path.exists(self.metadata_file):
                 os.remove(self.metadata_file)
                 print("✓ Cache vidé complètement")
+            if os.path.exists(self.template_state_file):
+                os.remove(self.template_state_file)
         else:
             metadata = self.load_metadata()
             if log_file_name in metadata:
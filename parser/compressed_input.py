@@ -0,0 +1,233 @@
+"""
+Lecture des logs directement depuis les archives Loghub, sans extraction.
+
+Formats supportés:
+- fichier compressé: <nom>.gz, <nom>.zst
+- membre d'archive: .zip, .tar, .tar.gz/.tgz, .tar.zst (ex: le membre
+  openstack_normal1.log de OpenStack.tar.gz)
+
+La décompression tourne dans un thread (zlib et zstandard relâchent le GIL)
+et alimente une file bornée: elle se superpose au parsing.
+"""
+import io
+import os
+import queue
+import tarfile
+import zipfile
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from fingerprint import stat_fingerprint
+
+
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.zst')
+ARCHIVE_SUFFIXES = ('.zip',) + TAR_SUFFIXES
+
+# Blocs décompressés en attente entre le thread et le parser
+CHUNK_SIZE = 1024 * 1024
+QUEUE_CHUNKS = 16
+
+# Membres des archives déjà listées: chemin -> (empreinte stat, membres)
+_members_memo = {}
+
+
+def is_compressed(path):
+    """True si le chemin est un fichier compressé ou une archive."""
+    return path.endswith(COMPRESSED_SUFFIXES + ARCHIVE_SUFFIXES)
+
+
+def _open_decompressed(path):
+    """Flux binaire décompressé (couche gz/zst externe) d'un fichier."""
+    if path.endswith(('.gz', '.tgz')):
+        import gzip
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError(f"zstandard requis pour lire {os.path.basename(path)}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+                                                          closefd=True)
+    return open(path, 'rb')
+
+
+def list_members(archive_path):
+    """
+    Membres (fichiers) d'une archive, indexés par nom de base.
+
+    Pour une archive tar compressée, le listing décompresse toute
+    l'archive: il est mémorisé tant que l'archive ne change pas.
+
+    Returns:
+        dict nom de base -> {'name', 'size', 'mtime'} (+ 'crc' pour zip)
+    """
+    key = os.path.abspath(archive_path)
+    fingerprint = stat_fingerprint(archive_path)
+    memo = _members_memo.get(key)
+    if memo is not None and memo[0] == fingerprint:
+        return memo[1]
+
+    members = {}
+    if archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    members[os.path.basename(info.filename)] = {
+                        'name': info.filename, 'size': info.file_size,
+                        'mtime': list(info.date_time), 'crc': info.CRC
+                    }
+    else:
+        with _open_decompressed(archive_path) as raw:
+            with tarfile.open(fileobj=raw, mode='r|') as archive:
+                for info in archive:
+                    if info.isfile():
+                        members[os.path.basename(info.name)] = {
+                            'name': info.name, 'size': info.size, 'mtime': info.mtime
+                        }
+
+    _members_memo[key] = (fingerprint, members)
+    return members
+
+
+def find_log_source(input_dir, log_file_name):
+    """
+    Localise un log dans input_dir: fichier brut, version compressée, ou
+    membre d'une archive.
+
+    Returns:
+        (chemin, membre) avec membre None hors archive, ou (None, None)
+    """
+    plain_path = os.path.join(input_dir, log_file_name)
+    if os.path.exists(plain_path):
+        return plain_path, None
+
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(plain_path + suffix):
+            return plain_path + suffix, None
+
+    if not os.path.isdir(input_dir):
+        return None, None
+
+    for name in sorted(os.listdir(input_dir)):
+        if not name.endswith(ARCHIVE_SUFFIXES):
+            continue
+        archive_path = os.path.join(input_dir, name)
+        member = list_members(archive_path).get(log_file_name)
+        if member is not None:
+            return archive_path, member['name']
+
+    return None, None
+
+
+def member_info(path, member):
+    """Métadonnées du membre (taille, mtime, crc) sans le décompresser."""
+    if member is None:
+        return None
+    return list_members(path).get(os.path.basename(member))
+
+
+def _open_source(path, member):
+    """Flux binaire (non bufferisé côté thread) du contenu décompressé."""
+    if member is None:
+        return _open_decompressed(path)
+
+    if path.endswith('.zip'):
+        archive = zipfile.ZipFile(path)
+        stream = archive.open(member)
+        return _ClosingStream(stream, archive)
+
+    raw = _open_decompressed(path)
+    archive = tarfile.open(fileobj=raw, mode='r|')
+    for info in archive:
+        if info.name == member:
+            return _ClosingStream(archive.extractfile(info), archive, raw)
+
+    archive.close()
+    raw.close()
+    raise FileNotFoundError(f"{member} absent de {os.path.basename(path)}")
+
+
+class _ClosingStream:
+    """Flux d'un membre qui ferme aussi l'archive (et son fichier)."""
+
+    def __init__(self, stream, *owners):
+        self.stream = stream
+        self.owners = owners
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def close(self):
+        self.stream.close()
+        for owner in self.owners:
+            owner.close()
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    Lecteur binaire dont la décompression tourne dans un thread: les blocs
+    décompressés passent par une file bornée à QUEUE_CHUNKS blocs.
+    """
+
+    def __init__(self, path, member=None):
+        self.source = _open_source(path, member)
+        self.chunks = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.pending = memoryview(b'')
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._decompress, daemon=True)
+        self.thread.start()
+
+    def _decompress(self):
+        try:
+            while not self.stopped.is_set():
+                chunk = self.source.read(CHUNK_SIZE)
+                self.chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            # Erreur transmise au lecteur
+            self.chunks.put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.pending:
+            chunk = self.chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if not chunk:
+                # Fin du flux: la remettre pour les lectures suivantes
+                self.chunks.put(chunk)
+                return 0
+            self.pending = memoryview(chunk)
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            # Débloquer le thread s'il attend une place dans la file
+            while self.thread.is_alive():
+                try:
+                    self.chunks.get_nowait()
+                except queue.Empty:
+                    self.thread.join(0.01)
+            self.source.close()
+        super().close()
+
+
+def open_log_source(path, member=None):
+    """
+    Flux binaire brut (readinto) sur le contenu d'un log: fichier ordinaire,
+    ou contenu décompressé en tâche de fond.
+    """
+    if member is None and not is_compressed(path):
+        return open(path, 'rb', buffering=0)
+    return ThreadedReader(path, member)
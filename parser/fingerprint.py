@@ -0,0 +1,132 @@
+"""
+Empreintes de fichiers pour le cache de parsing, par niveaux de coût:
+1. stat (taille, mtime, inode): aucune lecture
+2. hash échantillonné: quelques blocs répartis dans le fichier
+3. hash complet: lectures de 4 MB avec un hash rapide non cryptographique
+   (xxh3 si xxhash est installé, sinon blake2b)
+
+HashingReader permet de calculer le hash complet au fil de la lecture du
+parser, sans relire le fichier; update_hash continue le hash d'un préfixe
+(mode incrémental) sans relire le préfixe.
+"""
+import io
+import os
+import hashlib
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+HASH_ALGORITHM = 'xxh3_128' if xxhash is not None else 'blake2b'
+
+READ_SIZE = 4 * 1024 * 1024
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK_SIZE = 64 * 1024
+
+
+def new_hasher(algorithm=HASH_ALGORITHM):
+    """Crée un objet hash (update/hexdigest) pour l'algorithme demandé."""
+    if algorithm == 'xxh3_128':
+        return xxhash.xxh3_128()
+    if algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=16)
+    # md5: métadonnées écrites par les versions précédentes
+    return hashlib.new(algorithm)
+
+
+def stat_fingerprint(file_path):
+    """Empreinte sans lecture: taille, mtime (ns) et inode."""
+    st = os.stat(file_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'inode': st.st_ino}
+
+
+def full_hash(file_path, limit=None, algorithm=HASH_ALGORITHM):
+    """Hash de tout le fichier (ou de ses limit premiers octets)."""
+    return update_hash(new_hasher(algorithm), file_path, 0, limit).hexdigest()
+
+
+def update_hash(hasher, file_path, start=0, end=None):
+    """
+    Ajoute les octets [start, end) du fichier à hasher (end=None: jusqu'à la
+    fin). Returns: hasher, pour continuer le hash d'un préfixe.
+    """
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+    remaining = None if end is None else end - start
+
+    with open(file_path, 'rb', buffering=0) as f:
+        f.seek(start)
+        while remaining is None or remaining > 0:
+            size = f.readinto(view if remaining is None or remaining >= READ_SIZE
+                              else view[:remaining])
+            if not size:
+                break
+            hasher.update(view[:size])
+            if remaining is not None:
+                remaining -= size
+
+    return hasher
+
+
+def stream_hash(raw, algorithm=HASH_ALGORITHM):
+    """Hash d'un flux binaire brut (readinto) lu jusqu'au bout, puis fermé."""
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+
+    with raw:
+        while True:
+            size = raw.readinto(view)
+            if not size:
+                break
+            hasher.update(view[:size])
+
+    return hasher.hexdigest()
+
+
+def sampled_hash(file_path, algorithm=HASH_ALGORITHM):
+    """
+    Hash de SAMPLE_BLOCKS blocs répartis (premier et dernier inclus) et de
+    la taille. Une différence prouve une modification; une égalité doit être
+    confirmée par full_hash.
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size <= SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE:
+        return full_hash(file_path, algorithm=algorithm)
+
+    hasher = new_hasher(algorithm)
+    hasher.update(str(file_size).encode())
+    step = (file_size - SAMPLE_BLOCK_SIZE) / (SAMPLE_BLOCKS - 1)
+
+    with open(file_path, 'rb') as f:
+        for i in range(SAMPLE_BLOCKS):
+            f.seek(int(i * step))
+            hasher.update(f.read(SAMPLE_BLOCK_SIZE))
+
+    return hasher.hexdigest()
+
+
+class HashingReader(io.RawIOBase):
+    """Lecteur binaire qui met à jour un hash avec chaque octet lu."""
+
+    def __init__(self, raw, algorithm=HASH_ALGORITHM):
+        self.raw = raw
+        self.hasher = new_hasher(algorithm)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.raw.readinto(buffer)
+        if size:
+            self.hasher.update(memoryview(buffer)[:size])
+        return size
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
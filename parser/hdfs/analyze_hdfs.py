@@ -2,60 +2,145 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
+
+sys.path.insert(0, '/app/parser')
+
+from artifact_cache import ArtifactCache
+from cache_manager import CacheManager
+from metrics import PipelineMetrics
+from profiling import parse_profile_args, run_profiled
 
 # Config
 DATA_FILE = '/data/hdfs/vectorized/HDFS_event_occurrence_matrix.csv'
 OUTPUT_DIR = '/data/hdfs/analysis/'
+STATE_DIR = '/data/hdfs/state/'
+
+# Cache d'artefacts (1 pour activer): graphiques réutilisés si la matrice n'a pas changé
+ARTIFACT_CACHE = os.environ.get('ARTIFACT_CACHE', '0') == '1'
+
+# Métriques: temps par étape, fichier Prometheus analyze_hdfs.prom dans METRICS_DIR
+PIPELINE_METRICS = os.environ.get('PIPELINE_METRICS', '0') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '/data/hdfs/metrics/')
+
+# Profils (--profile): piles repliées et rapports des fonctions chaudes
+PROFILE_DIR = '/data/hdfs/analysis/profiles/'
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(STATE_DIR, exist_ok=True)
+
+
+def analyser(df, output_path, stage):
+    """
+    Statistiques et graphiques d'une matrice d'occurrences.
+    
+    Args:
+        stage: Délimiteur d'étapes ('plots', 'save'): metrics.time ou
+            profiler.stage
+    """
+    event_cols = [col for col in df.columns if col.startswith('E')]
+
+    # === STATISTIQUES ===
+    print("Distribution des labels:")
+    label_counts = df['Label'].value_counts()
+    print(label_counts)
+    print(f"\nTaux anomalie: {(df['Label']=='Anomaly').sum()/len(df)*100:.2f}%")
+
+
+    # === VISUALISATIONS ===
+    with stage('plots'):
+        sns.set_style('whitegrid')
+        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+
+        # Plot 1: Distribution labels
+        label_counts.plot(kind='bar', ax=axes[0,0], color=['green', 'red'])
+        axes[0,0].set_title('Distribution Normal vs Anomaly', fontsize=14, fontweight='bold')
+        axes[0,0].set_ylabel('Nombre de BlockIds')
+        axes[0,0].set_xlabel('Label')
+
+
+        # Plot 3: Top 15 événements
+        event_totals = df[event_cols].sum().sort_values(ascending=False).head(15)
+        event_totals.plot(kind='bar', ax=axes[1,0], color='steelblue')
+        axes[1,0].set_title('Top 15 événements les plus fréquents', fontsize=14, fontweight='bold')
+        axes[1,0].set_ylabel('Occurrences totales')
+        axes[1,0].set_xlabel('EventId')
+
+        # Plot 4: Comparaison événements Normal vs Anomaly (top 10)
+        comparison = df.groupby('Label')[event_cols].sum().T
+        top_events = comparison.sum(axis=1).sort_values(ascending=False).head(10).index
+        comparison.loc[top_events].plot(kind='bar', ax=axes[1,1], color=['green', 'red'])
+        axes[1,1].set_title('Top 10 événements: Normal vs Anomaly', fontsize=14, fontweight='bold')
+        axes[1,1].set_ylabel('Occurrences')
+        axes[1,1].set_xlabel('EventId')
+        axes[1,1].legend(title='Label')
+
+        plt.tight_layout()
+    with stage('save'):
+        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    print(f"\n✓ Graphiques sauvegardés: {output_path}")
+
+    # Distribution détaillée
+    print("\n\n=== TOP 10 ÉVÉNEMENTS PAR LABEL ===")
+    for label in df['Label'].unique():
+        print(f"\n{label}:")
+        subset = df[df['Label'] == label]
+        top = subset[event_cols].sum().sort_values(ascending=False).head(10)
+        for event, count in top.items():
+            pct = count / subset[event_cols].sum().sum() * 100
+            print(f"  {event}: {int(count):>8,} ({pct:>5.2f}%)")
+
+
+def main(df=None):
+    """
+    Statistiques et graphiques de la matrice d'occurrences.
+    
+    Args:
+        df: Matrice passée en mémoire par l'orchestrateur (pipeline.py),
+            sinon lue dans DATA_FILE
+    
+    Returns:
+        Chemin du graphique, None s'il est restauré depuis le cache
+    """
+    output_path = os.path.join(OUTPUT_DIR, 'analysis.png')
+    
+    # Graphiques déjà produits pour cette matrice: restauration sans recalcul
+    if ARTIFACT_CACHE:
+        artifact_cache = ArtifactCache(STATE_DIR)
+        cache_key = artifact_cache.compute_key('analyze_hdfs',
+                                               [DATA_FILE, os.path.abspath(__file__)])
+        if artifact_cache.restore(cache_key) is not None:
+            print(f"Matrice inchangée, graphiques restaurés depuis le cache ({cache_key})")
+            return None
+    
+    metrics = PipelineMetrics('analyze_hdfs', METRICS_DIR, enabled=PIPELINE_METRICS)
+    
+    # Charger données
+    if df is None:
+        with metrics.time('load'):
+            df = pd.read_csv(DATA_FILE)
+    metrics.set_gauge('sessions', len(df))
+    
+    analyser(df, output_path, metrics.time)
+    
+    if ARTIFACT_CACHE:
+        artifact_cache.store(cache_key, [output_path])
+    
+    metrics.publish(CacheManager(STATE_DIR))
+    return output_path
+
+
+def profiler_analyse(profiler, max_lines):
+    """Analyse d'un préfixe de la matrice sous profilage, graphique dans PROFILE_DIR."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with profiler.stage('load'):
+        df = pd.read_csv(DATA_FILE, nrows=max_lines)
+    analyser(df, os.path.join(PROFILE_DIR, 'analyze_hdfs.png'), profiler.stage)
+
 
-# Charger données
-df = pd.read_csv(DATA_FILE)
-event_cols = [col for col in df.columns if col.startswith('E')]
-
-# === STATISTIQUES ===
-print("Distribution des labels:")
-label_counts = df['Label'].value_counts()
-print(label_counts)
-print(f"\nTaux anomalie: {(df['Label']=='Anomaly').sum()/len(df)*100:.2f}%")
-
-
-# === VISUALISATIONS ===
-sns.set_style('whitegrid')
-fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-
-# Plot 1: Distribution labels
-label_counts.plot(kind='bar', ax=axes[0,0], color=['green', 'red'])
-axes[0,0].set_title('Distribution Normal vs Anomaly', fontsize=14, fontweight='bold')
-axes[0,0].set_ylabel('Nombre de BlockIds')
-axes[0,0].set_xlabel('Label')
-
-
-# Plot 3: Top 15 événements
-event_totals = df[event_cols].sum().sort_values(ascending=False).head(15)
-event_totals.plot(kind='bar', ax=axes[1,0], color='steelblue')
-axes[1,0].set_title('Top 15 événements les plus fréquents', fontsize=14, fontweight='bold')
-axes[1,0].set_ylabel('Occurrences totales')
-axes[1,0].set_xlabel('EventId')
-
-# Plot 4: Comparaison événements Normal vs Anomaly (top 10)
-comparison = df.groupby('Label')[event_cols].sum().T
-top_events = comparison.sum(axis=1).sort_values(ascending=False).head(10).index
-comparison.loc[top_events].plot(kind='bar', ax=axes[1,1], color=['green', 'red'])
-axes[1,1].set_title('Top 10 événements: Normal vs Anomaly', fontsize=14, fontweight='bold')
-axes[1,1].set_ylabel('Occurrences')
-axes[1,1].set_xlabel('EventId')
-axes[1,1].legend(title='Label')
-
-plt.tight_layout()
-plt.savefig(os.path.join(OUTPUT_DIR, 'analysis.png'), dpi=300, bbox_inches='tight')
-print(f"\n✓ Graphiques sauvegardés: {OUTPUT_DIR}analysis.png")
-
-# Distribution détaillée
-print("\n\n=== TOP 10 ÉVÉNEMENTS PAR LABEL ===")
-for label in df['Label'].unique():
-    print(f"\n{label}:")
-    subset = df[df['Label'] == label]
-    top = subset[event_cols].sum().sort_values(ascending=False).head(10)
-    for event, count in top.items():
-        pct = count / subset[event_cols].sum().sum() * 100
-        print(f"  {event}: {int(count):>8,} ({pct:>5.2f}%)")
\ No newline at end of file
+if __name__ == "__main__":
+    options = parse_profile_args()
+    if options.profile:
+        run_profiled('analyze_hdfs', profiler_analyse, options, PROFILE_DIR)
+    else:
+        main()
@@ -0,0 +1,94 @@
+"""
+Détection d'anomalies HDFS en continu: suit les logs en cours d'écriture,
+compte les événements par BlockId avec l'état Drain3 du parsing (figé) et
+score les blocs avec le modèle entraîné dans model_training.ipynb.
+"""
+import os
+import sys
+import traceback
+
+sys.path.insert(0, '/app/parser')
+
+import joblib
+
+from cache_manager import CacheManager
+from stream_detector import FileTailer, StreamingDetector, serve_http
+from hdfs.hdfs_processor import HDFSLogProcessor
+
+
+# Configuration
+STATE_DIR = '/data/hdfs/state/'
+MODELS_DIR = '/data/hdfs/models/'
+ALERTS_PATH = '/data/hdfs/alerts/HDFS_alerts.jsonl'
+
+# Fichiers suivis, séparés par des virgules
+DETECT_FILES = os.environ.get('DETECT_FILES', '/data/hdfs/live/HDFS.log').split(',')
+# Lire le contenu déjà présent au démarrage (sinon seulement les ajouts)
+DETECT_FROM_START = os.environ.get('DETECT_FROM_START', '0') == '1'
+
+# Modèle sauvegardé par model_training.ipynb (dans MODELS_DIR)
+DETECT_MODEL = os.environ.get('DETECT_MODEL', 'logistic_regression.pkl')
+# Probabilité d'anomalie à partir de laquelle une alerte est émise
+DETECT_THRESHOLD = float(os.environ.get('DETECT_THRESHOLD', '0.5'))
+# Inactivité (s) après laquelle un bloc est clos et scoré définitivement
+DETECT_SESSION_TIMEOUT = float(os.environ.get('DETECT_SESSION_TIMEOUT', '60'))
+# Période (s) du scoring des blocs actifs
+DETECT_SCORE_INTERVAL = float(os.environ.get('DETECT_SCORE_INTERVAL', '1'))
+
+# Endpoint HTTP (/sessions, /alerts, /stats)
+DETECT_HOST = os.environ.get('DETECT_HOST', '0.0.0.0')
+DETECT_PORT = int(os.environ.get('DETECT_PORT', '8000'))
+
+
+def main():
+    """Fonction principale."""
+    try:
+        print("="*80)
+        print("DÉTECTION HDFS EN CONTINU")
+        print("="*80)
+        
+        # État Drain3 sauvegardé par parse_hdfs.py
+        processor = HDFSLogProcessor(config_file='drain.ini')
+        cache_manager = CacheManager(STATE_DIR)
+        if not processor.load_template_state(cache_manager.template_state_file):
+            print(f" ERREUR: état Drain3 absent ({cache_manager.template_state_file}), "
+                  f"lancer d'abord parse_hdfs.py")
+            return
+        
+        model_path = os.path.join(MODELS_DIR, DETECT_MODEL)
+        if not os.path.exists(model_path):
+            print(f" ERREUR: modèle absent ({model_path}), lancer model_training.ipynb")
+            return
+        model = joblib.load(model_path)
+        
+        detector = StreamingDetector(processor, 'BlockId', model,
+                                     threshold=DETECT_THRESHOLD,
+                                     session_timeout=DETECT_SESSION_TIMEOUT,
+                                     score_interval=DETECT_SCORE_INTERVAL,
+                                     alert_path=ALERTS_PATH)
+        print(f" {len(processor.template_miner.drain.clusters)} templates, "
+              f"{len(detector.feature_names)} features ({DETECT_MODEL})")
+        
+        server = serve_http(detector, DETECT_HOST, DETECT_PORT)
+        print(f" HTTP: http://{DETECT_HOST}:{DETECT_PORT}/sessions, /alerts, /stats")
+        print(f" Alertes: {ALERTS_PATH}")
+        for path in DETECT_FILES:
+            print(f" Suivi: {path}")
+        
+        tailers = [FileTailer(path, from_start=DETECT_FROM_START) for path in DETECT_FILES]
+        try:
+            detector.run(tailers)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            print(f"\n Arrêt: {detector.get_stats()}")
+        
+    except Exception as e:
+        print(f"\n ERREUR: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
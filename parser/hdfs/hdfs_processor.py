@@ -6,6 +6,8 @@ import sys
 sys.path.insert(0, '/app/parser')
 
 from log_processor import LogProcessor
+from structured_io import iter_structured_chunks
+from aggregation_sink import print_parsing_stats
 
 
 class HDFSLogProcessor(LogProcessor):
@@ -17,38 +19,33 @@ class HDFSLogProcessor(LogProcessor):
     
     BLOCK_ID_PATTERN = re.compile(r'(blk_-?\d+)')
     
+    # Masque de drain.ini dont la première valeur remplacée est le BlockId
+    BLOCK_MASK = 'BLOCK'
+    
     def get_log_pattern(self):
         return self.LOG_PATTERN
     
-    def extract_fields(self, line, match):
-        date, time, pid, level, component, content = match.groups()
-        
-        block_match = self.BLOCK_ID_PATTERN.search(content)
-        block_id = block_match.group(1) if block_match else None
+    def fields_from_groups(self, groups):
+        date, time, pid, level, component, content = groups
+        block_id = self.block_id_of(content)
         
-        return {
-            'Date': date,
-            'Time': time,
-            'Pid': pid,
-            'Level': level,
-            'Component': component,
-            'Content': content,
-            'BlockId': block_id
-        }
+        # Niveau et composant répétés: une seule chaîne par valeur dans les batchs
+        return (date, time, pid, sys.intern(level), sys.intern(component), content, block_id)
     
-    def create_unparsed_entry(self, line, line_id):
-        block_match = self.BLOCK_ID_PATTERN.search(line)
-        block_id = block_match.group(1) if block_match else None
-        
-        return {
-            'Date': '',
-            'Time': '',
-            'Pid': '',
-            'Level': '',
-            'Component': '',
-            'Content': line,
-            'BlockId': block_id
-        }
+    def unparsed_fields(self, line):
+        return ('', '', '', '', '', line, self.block_id_of(line))
+    
+    def block_id_of(self, content):
+        """
+        BlockId capturé par le masque <BLOCK> pendant le masquage du contenu
+        (un seul passage de la regex). Sans masker (miner pas encore créé),
+        recherche directe.
+        """
+        masked_content, block_id = self.mask_and_capture(content, self.BLOCK_MASK)
+        if masked_content is None:
+            block_match = self.BLOCK_ID_PATTERN.search(content)
+            block_id = block_match.group(1) if block_match else None
+        return block_id
     
     def get_column_order(self):
         """Ordre des colonnes pour HDFS."""
@@ -57,25 +54,33 @@ class HDFSLogProcessor(LogProcessor):
             'Content', 'BlockId', 'EventId', 'EventTemplate'
         ]
     
-    def get_statistics_with_blockids(self, total_lines, df_templates, structured_path):
-        """Statistiques HDFS avec BlockIDs (sans charger tout le CSV)."""
+    def get_statistics_with_blockids(self, total_lines, df_templates, structured_path,
+                                     stats_collector=None):
+        """
+        Statistiques HDFS avec BlockIDs (sans charger tout le CSV).
+        
+        Si stats_collector (ParsingStatsCollector) est fourni, les
+        statistiques viennent du parsing et le fichier n'est pas relu.
+        """
         
         # Stats de base
         self.get_statistics(total_lines, df_templates)
         
+        if stats_collector is not None:
+            print()
+            print_parsing_stats(stats_collector.get_summary())
+            return
+        
         # Compter les BlockIDs en streaming
         print(f"\n   Calcul des statistiques BlockID...")
         
         block_count = 0
         unique_blocks = set()
         
-        import csv
-        with open(structured_path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['BlockId']:
-                    block_count += 1
-                    unique_blocks.add(row['BlockId'])
+        for chunk in iter_structured_chunks(structured_path, columns=['BlockId']):
+            block_ids = chunk['BlockId'].dropna()
+            block_count += len(block_ids)
+            unique_blocks.update(block_ids)
         
         print(f"  - BlockIDs trouvés: {block_count:,}")
         print(f"  - BlockIDs uniques: {len(unique_blocks):,}")
\ No newline at end of file
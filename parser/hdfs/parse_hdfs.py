@@ -3,14 +3,23 @@ Script de parsing HDFS en mode streaming (économe en mémoire).
 """
 import os
 import sys
+import glob
 import traceback
 import shutil
+import tempfile
 import datetime
 
 sys.path.insert(0, '/app/parser')
 
 from cache_manager import CacheManager
+from metrics import PipelineMetrics
+from memory_governor import create_governor
+from structured_io import structured_file_name
+from aggregation_sink import SessionCountSink, ParsingStatsCollector, print_parsing_stats
+from log_processor import find_complete_end
+from compressed_input import find_log_source, is_compressed
 from hdfs.hdfs_processor import HDFSLogProcessor
+from profiling import parse_profile_args, run_profiled
 
 
 # Configuration
@@ -20,12 +29,70 @@ STATE_DIR = '/data/hdfs/state/'
 ARCHIVE_DIR = '/data/hdfs/archive/'
 LOG_FILE_NAME = 'HDFS.log'
 
+# Nombre de processus pour l'extraction regex (1 = séquentiel)
+NUM_WORKERS = int(os.environ.get('PARSER_WORKERS', '1'))
+
+# Mode "apprendre puis apparier": taille du préfixe d'apprentissage Drain3
+# (0 = désactivé, toutes les lignes passent par add_log_message)
+LEARN_LINES = int(os.environ.get('PARSER_LEARN_LINES', '0'))
+
+# Lecteur de lignes: text (ligne à ligne) ou mmap (batchs d'offsets sur le mmap)
+READER = os.environ.get('PARSER_READER', 'text')
+
+# Taille du cache contenu masqué -> template devant Drain3 (0 = désactivé)
+TEMPLATE_CACHE_SIZE = int(os.environ.get('PARSER_TEMPLATE_CACHE', '0'))
+
+# Format des logs structurés: csv, parquet ou arrow
+STRUCTURED_FORMAT = os.environ.get('STRUCTURED_FORMAT', 'csv')
+
+# Mode fusionné: matrice d'occurrences construite pendant le parsing
+FUSED_MATRIX = os.environ.get('PARSER_FUSED_MATRIX', '0') == '1'
+# Écriture des logs structurés (désactivable si seule la matrice est utile)
+WRITE_STRUCTURED = os.environ.get('PARSER_WRITE_STRUCTURED', '1') == '1'
+
+# Écriture des logs structurés en arrière-plan avec ce nombre de batchs en
+# vol (>= 2, double buffering), pendant que le parsing continue (0 = synchrone)
+WRITE_BUFFERS = int(os.environ.get('PARSER_WRITE_BUFFERS', '0'))
+# thread, ou process (DataFrame et sérialisation CSV hors GIL, coût du pickle)
+WRITE_MODE = os.environ.get('PARSER_WRITE_MODE', 'thread')
+
+# Mode incrémental: fichier en append-only, seule la fin est parsée
+# (état Drain3 et compteurs sauvegardés dans STATE_DIR, pas d'archivage)
+INCREMENTAL = os.environ.get('PARSER_INCREMENTAL', '0') == '1'
+STATS_STATE_PATH = os.path.join(STATE_DIR, 'HDFS_parsing_stats.json')
+COUNTS_STATE_NAME = 'HDFS_session_counts'
+
+# Métriques: temps par étape et compteurs, fichier Prometheus parse_hdfs.prom
+# dans METRICS_DIR et résumé JSON dans les métadonnées du cache
+PIPELINE_METRICS = os.environ.get('PIPELINE_METRICS', '0') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '/data/hdfs/metrics/')
+
+# Gouverneur mémoire (1 pour activer): taille des batchs adaptée au RSS, flush
+# anticipé et délestage sous pression (budget en Mo, 0 = 75% de la limite du
+# conteneur)
+MEMORY_GOVERNOR = os.environ.get('MEMORY_GOVERNOR', '0') == '1'
+MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', '0'))
+
+# Profils (--profile): piles repliées et rapports des fonctions chaudes
+PROFILE_DIR = '/data/hdfs/analysis/profiles/'
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(STATE_DIR, exist_ok=True)
 os.makedirs(ARCHIVE_DIR, exist_ok=True)
 
-def main():
-    """Fonction principale."""
+def main(collect_sessions=False):
+    """
+    Fonction principale.
+    
+    Args:
+        collect_sessions: Compter les événements par BlockID pendant le
+            parsing pour la vectorisation en mémoire (pipeline.py), hors
+            mode incrémental
+    
+    Returns:
+        Artefacts pour les étapes suivantes ({'templates', 'session_events',
+        'matrix'}), None si le parsing est sauté
+    """
     
     try:
         print("="*80)
@@ -34,9 +101,33 @@ def main():
         
         # Cache
         cache_manager = CacheManager(STATE_DIR)
-        needs_parsing, reason = cache_manager.check_cache(
-            LOG_FILE_NAME, INPUT_DIR, OUTPUT_DIR
-        )
+        
+        # HDFS.log, HDFS.log.gz/.zst ou membre d'une archive (HDFS_v1.zip)
+        file_path, member = find_log_source(INPUT_DIR, LOG_FILE_NAME)
+        
+        incremental = INCREMENTAL
+        if incremental and WRITE_STRUCTURED and STRUCTURED_FORMAT != 'csv':
+            print(f"\n ⚠️ Mode incrémental non supporté en {STRUCTURED_FORMAT}, "
+                  f"parsing complet")
+            incremental = False
+        if incremental and file_path is not None and is_compressed(file_path):
+            print(f"\n ⚠️ Mode incrémental non supporté pour une source compressée, "
+                  f"parsing complet")
+            incremental = False
+        
+        mode, cache_entry = 'full', None
+        if incremental:
+            mode, reason, cache_entry = cache_manager.check_incremental(LOG_FILE_NAME, INPUT_DIR)
+            # Compteurs du parsing précédent nécessaires pour reprendre
+            counts_path = os.path.join(STATE_DIR, COUNTS_STATE_NAME + '.npz')
+            if mode == 'delta' and (not os.path.exists(STATS_STATE_PATH) or
+                                    (FUSED_MATRIX and not os.path.exists(counts_path))):
+                mode, reason = 'full', " État des compteurs absent, parsing complet"
+            needs_parsing = mode != 'skip'
+        else:
+            needs_parsing, reason = cache_manager.check_cache(
+                LOG_FILE_NAME, INPUT_DIR, OUTPUT_DIR
+            )
         
         if not needs_parsing:
             print(f"\n {reason}")
@@ -48,76 +139,241 @@ def main():
                 print(f"\n Statistiques:")
                 print(f"  - Lignes: {info['num_lines']:,}")
                 print(f"  - Templates: {info['num_templates']}")
+                if 'parsing_stats' in info:
+                    print_parsing_stats(info['parsing_stats'])
             
             print(f"\n Pour forcer: rm {STATE_DIR}/parsing_metadata.json")
             print("="*80)
-            return
+            return None
         
         print(f"\n {reason}")
         print(f" Fichier: {LOG_FILE_NAME}\n")
         
-        file_path = os.path.join(INPUT_DIR, LOG_FILE_NAME)
-        
-        if not os.path.exists(file_path):
-            print(f" ERREUR: {file_path} introuvable")
+        if file_path is None:
+            print(f" ERREUR: {LOG_FILE_NAME} introuvable dans {INPUT_DIR}")
             print(f"   Contenu: {os.listdir(INPUT_DIR) if os.path.exists(INPUT_DIR) else 'N/A'}")
-            return
+            return None
         
-        # Taille du fichier
+        # Taille du fichier (de l'archive pour une source compressée)
         size_mb = os.path.getsize(file_path) / 1024 / 1024
         print(f" Taille: {size_mb:.2f} MB")
+        if is_compressed(file_path):
+            print(f" Source compressée: {os.path.basename(file_path)}"
+                  f"{' -> ' + member if member else ''}")
         
         # Initialiser le processeur
-        processor = HDFSLogProcessor(config_file='drain.ini')
+        processor = HDFSLogProcessor(config_file='drain.ini',
+                                     template_cache_size=TEMPLATE_CACHE_SIZE)
+        metrics = PipelineMetrics('parse_hdfs', METRICS_DIR, enabled=PIPELINE_METRICS)
+        governor = create_governor(100000, MEMORY_BUDGET_MB, enabled=MEMORY_GOVERNOR)
+        if governor is not None:
+            governor.add_reliever('template_cache', processor.release_memory)
         
         # Chemins de sortie
-        structured_path = os.path.join(OUTPUT_DIR, 'HDFS_structured.csv')
+        structured_name = structured_file_name('HDFS_structured', STRUCTURED_FORMAT)
+        structured_path = os.path.join(OUTPUT_DIR, structured_name)
         templates_path = os.path.join(OUTPUT_DIR, 'HDFS_templates.csv')
         
+        # Comptage par BlockID pendant le parsing (mode fusionné, ou comptages
+        # passés en mémoire à la vectorisation par l'orchestrateur)
+        block_sink = (SessionCountSink('BlockId')
+                      if FUSED_MATRIX or (collect_sessions and not incremental) else None)
+        stats_collector = ParsingStatsCollector('BlockId')
+        sinks = [stats_collector] + ([block_sink] if block_sink else [])
+        
+        # Mode incrémental: plage à parser et reprise de l'état précédent
+        start_offset, start_line_id, end_offset = 0, 0, None
+        if incremental:
+            end_offset = find_complete_end(file_path)
+        if mode == 'delta':
+            start_offset = cache_entry['byte_offset']
+            start_line_id = cache_entry['raw_lines']
+            if end_offset <= start_offset:
+                print(f"\n Pas de nouvelle ligne complète, skip")
+                return None
+            
+            processor.load_template_state(cache_manager.template_state_file)
+            stats_collector.load_state(STATS_STATE_PATH)
+            if block_sink is not None:
+                block_sink.load_state(STATE_DIR, COUNTS_STATE_NAME)
+            print(f" Reprise: {len(processor.template_miner.drain.clusters)} templates, "
+                  f"{start_line_id:,} lignes déjà parsées")
+        
         # PARSING EN STREAMING (économe en mémoire)
-        print(f"\n Mode streaming activé (sauvegarde par batch de 100k)\n")
+        print(f"\n Mode streaming activé (sauvegarde par batch de 100k"
+              f"{', adapté à la mémoire' if governor else ''})\n")
         
-        total_lines = processor.parse_and_save_streaming(
+        # Hash du préfixe continué sur la plage parsée (pas de relecture)
+        prefix_hasher = (cache_manager.prefix_hasher(file_path, start_offset)
+                         if incremental else None)
+        
+        processor.parse_and_save_streaming(
             file_path=file_path,
-            output_path=structured_path,
+            output_path=structured_path if WRITE_STRUCTURED else None,
             batch_size=100000,      # Sauvegarder tous les 100k
-            progress_interval=50000  # Afficher tous les 50k
+            progress_interval=50000, # Afficher tous les 50k
+            num_workers=NUM_WORKERS,
+            learn_lines=LEARN_LINES,
+            output_format=STRUCTURED_FORMAT,
+            sinks=sinks,
+            start_offset=start_offset,
+            end_offset=end_offset,
+            start_line_id=start_line_id,
+            append=mode == 'delta',
+            member=member,
+            reader=READER,
+            metrics=metrics,
+            governor=governor,
+            write_buffers=WRITE_BUFFERS,
+            write_mode=WRITE_MODE,
+            prefix_hasher=prefix_hasher
         )
+        # Total cumulé (lignes du parsing précédent incluses en mode delta)
+        total_lines = stats_collector.num_lines
         
         # Créer le fichier templates
         print(f"\n Sauvegarde des templates...")
-        df_templates = processor.create_templates_dataframe()
-        df_templates.to_csv(templates_path, index=False)
+        with metrics.time('templates'):
+            df_templates = processor.create_templates_dataframe()
+            df_templates.to_csv(templates_path, index=False)
         
-        print(f" HDFS_structured.csv")
+        if WRITE_STRUCTURED:
+            print(f" {structured_name}")
         print(f" HDFS_templates.csv")
         
-        # Statistiques
-        processor.get_statistics_with_blockids(total_lines, df_templates, structured_path)
+        # Statistiques (collectées pendant le parsing, sans relire le fichier)
+        with metrics.time('statistics'):
+            processor.get_statistics_with_blockids(total_lines, df_templates, structured_path,
+                                                   stats_collector=stats_collector)
+        
+        # Matrice d'occurrences sans relire le fichier structuré
+        df_matrix = None
+        if FUSED_MATRIX:
+            from hdfs.vectorize_hdfs import construire_et_sauvegarder_matrice
+            
+            print(f"\n Matrice d'occurrences (mode fusionné): "
+                  f"{len(block_sink.session_events):,} BlockIDs")
+            with metrics.time('matrix'):
+                _, df_matrix = construire_et_sauvegarder_matrice(
+                    block_sink.session_events, df_templates['EventId'].tolist())
         
         # Cache
-        stats = {'num_lines': total_lines, 'num_templates': len(df_templates)}
-        cache_manager.update_cache(LOG_FILE_NAME, file_path, stats)
-
-        # Archiver le fichier source après un parsing reussi
-        archive_name = f"HDFS_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
-        archive_path = os.path.join(ARCHIVE_DIR, archive_name)
-        try:
-            shutil.move(file_path, archive_path)
-            print(f"\n  Fichier archive: {archive_path}")
-        except Exception:
-            print(f"\n echec de l'archivage:\n{traceback.format_exc()}")
+        stats = {
+            'num_lines': total_lines,
+            'num_templates': len(df_templates),
+            'parsing_stats': stats_collector.get_summary()
+        }
+        if processor.writer_stats is not None:
+            stats['writer_stats'] = processor.writer_stats
+        
+        if incremental:
+            # État pour le prochain parsing incrémental (le fichier reste dans /raw/)
+            processor.save_template_state(cache_manager.template_state_file)
+            stats_collector.save_state(STATS_STATE_PATH)
+            if block_sink is not None:
+                block_sink.save_state(STATE_DIR, COUNTS_STATE_NAME,
+                                      df_templates['EventId'].tolist())
+            stats['byte_offset'] = processor.end_offset
+            stats['raw_lines'] = processor.lines_read
+            stats['prefix_hash'] = processor.prefix_hash
+            cache_manager.update_cache(LOG_FILE_NAME, file_path, stats)
+            print(f"\n  Position sauvegardée: octet {processor.end_offset:,}, "
+                  f"ligne {processor.lines_read:,}")
+        else:
+            # Hash calculé pendant la lecture: pas de seconde passe sur le fichier
+            if processor.file_hash is not None:
+                cache_manager.remember_file_hash(file_path, processor.file_hash,
+                                                 member=member)
+            cache_manager.update_cache(LOG_FILE_NAME, file_path, stats, member=member)
+            # État Drain3 pour la détection en continu (detect_hdfs.py)
+            processor.save_template_state(cache_manager.template_state_file)
+            
+            # Archiver le fichier source après un parsing reussi (une archive
+            # multi-fichiers reste dans /raw/, son empreinte évite le reparsing)
+            if member is None:
+                suffix = os.path.splitext(file_path)[1] if is_compressed(file_path) else ''
+                archive_name = (f"HDFS_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+                                f".log{suffix}")
+                archive_path = os.path.join(ARCHIVE_DIR, archive_name)
+                try:
+                    shutil.move(file_path, archive_path)
+                    print(f"\n  Fichier archive: {archive_path}")
+                except Exception:
+                    print(f"\n echec de l'archivage:\n{traceback.format_exc()}")
+        
+        if governor is not None:
+            cache_manager.save_job_info('memory_governor', 'parse_hdfs', governor.summary())
+            print(f"\n   ✓ Batchs: {governor.smallest:,} à {governor.largest:,} lignes, "
+                  f"{governor.early_flushes} flushs anticipés, "
+                  f"pic RSS {governor.peak_rss / 2**20:,.0f} Mo")
+        
+        if metrics.enabled:
+            metrics.publish(cache_manager)
+            print(f"\n   ✓ Métriques: {metrics.textfile}")
         
         print(f"\n   ✓ Cache mis à jour")
         print("\n" + "="*80)
         print("Parsing HDFS terminé avec succès!")
         print("="*80)
         
+        # Artefacts passés en mémoire aux étapes suivantes (pipeline.py)
+        return {
+            'templates': df_templates,
+            'session_events': block_sink.session_events if block_sink is not None else None,
+            'matrix': df_matrix
+        }
+        
     except Exception as e:
         print(f"\n Erreur :")
         print(traceback.format_exc())
         raise
 
 
+def profiler_parsing(profiler, max_lines):
+    """
+    Parse un préfixe du log sous profilage: sorties dans un dossier
+    temporaire, cache et archivage inchangés. Le log déjà archivé est
+    utilisé s'il n'est plus dans /raw/.
+    """
+    file_path, member = find_log_source(INPUT_DIR, LOG_FILE_NAME)
+    if file_path is None:
+        archives = sorted(glob.glob(os.path.join(ARCHIVE_DIR, 'HDFS_*.log*')))
+        file_path = archives[-1] if archives else None
+    if file_path is None:
+        print(f" ERREUR: {LOG_FILE_NAME} introuvable dans {INPUT_DIR} ni {ARCHIVE_DIR}")
+        return
+    print(f" Fichier: {file_path}{' -> ' + member if member else ''}")
+    
+    processor = HDFSLogProcessor(config_file='drain.ini',
+                                 template_cache_size=TEMPLATE_CACHE_SIZE)
+    sinks = [ParsingStatsCollector('BlockId')]
+    if FUSED_MATRIX:
+        sinks.append(SessionCountSink('BlockId'))
+    
+    with tempfile.TemporaryDirectory(prefix='profile_') as tmp_dir:
+        structured_path = os.path.join(tmp_dir, structured_file_name('HDFS_structured',
+                                                                     STRUCTURED_FORMAT))
+        processor.parse_and_save_streaming(
+            file_path=file_path,
+            output_path=structured_path if WRITE_STRUCTURED else None,
+            batch_size=100000,
+            progress_interval=50000,
+            num_workers=NUM_WORKERS,
+            learn_lines=LEARN_LINES,
+            output_format=STRUCTURED_FORMAT,
+            sinks=sinks,
+            member=member,
+            reader=READER,
+            max_lines=max_lines,
+            profiler=profiler
+        )
+        with profiler.stage('templates'):
+            processor.create_templates_dataframe()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    options = parse_profile_args()
+    if options.profile:
+        run_profiled('parse_hdfs', profiler_parsing, options, PROFILE_DIR)
+    else:
+        main()
\ No newline at end of file
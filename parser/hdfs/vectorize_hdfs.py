@@ -1,20 +1,80 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 from collections import Counter, defaultdict
 
+sys.path.insert(0, '/app/parser')
+
+from structured_io import iter_structured_chunks, resolve_structured_path
+from sparse_matrix import (build_csr_matrix, save_sparse_matrix, print_sparse_statistics,
+                           sparse_matrix_paths)
+from session_counts import SessionEventCounter, SessionTracker
+from time_windows import TimeWindowCounter, hdfs_seconds
+from artifact_cache import ArtifactCache
+from cache_manager import CacheManager
+from metrics import PipelineMetrics
+from memory_governor import create_governor
+from profiling import parse_profile_args, run_profiled
+
 
 # Configuration
 PARSED_DIR = '/data/hdfs/parsed/'
 OUTPUT_DIR = '/data/hdfs/vectorized/'
 LABELS_FILE = '/data/hdfs/raw/anomaly_label.csv'
+STATE_DIR = '/data/hdfs/state/'
+PARSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Format de la matrice: dense (CSV), sparse (CSR .npz) ou both
+MATRIX_FORMAT = os.environ.get('MATRIX_FORMAT', 'dense')
+
+# Agrégation par chunk: numpy (factorize + bincount) ou groupby (historique)
+VECTORIZE_ENGINE = os.environ.get('VECTORIZE_ENGINE', 'numpy')
+
+# Sessions sans événement depuis ce nombre de lignes déversées sur disque
+# (mémoire bornée par les sessions ouvertes, matrice identique), 0 = jamais
+# (défaut): tout reste en mémoire
+SESSION_MAX_GAP = int(os.environ.get('SESSION_MAX_GAP', '0'))
+
+# Fenêtres de la matrice: session (BlockId), time (fenêtres de temps sur
+# Date/Time, toutes les lignes) ou both
+VECTORIZE_WINDOW = os.environ.get('VECTORIZE_WINDOW', 'session')
+
+# Fenêtres de temps (secondes): durée, avance entre deux fenêtres (0 = durée,
+# fenêtres fixes) et retard toléré des lignes désordonnées
+WINDOW_SECONDS = int(os.environ.get('WINDOW_SECONDS', '60'))
+WINDOW_STEP_SECONDS = int(os.environ.get('WINDOW_STEP_SECONDS', '0'))
+WINDOW_LATENESS_SECONDS = int(os.environ.get('WINDOW_LATENESS_SECONDS', '60'))
+
+# Cache d'artefacts (1 pour activer): matrice réutilisée si entrées, code et config inchangés
+ARTIFACT_CACHE = os.environ.get('ARTIFACT_CACHE', '0') == '1'
+
+# Gouverneur mémoire (1 pour activer): taille des chunks adaptée au RSS et
+# déversement des sessions sous pression (budget en Mo, 0 = 75% de la limite
+# du conteneur)
+MEMORY_GOVERNOR = os.environ.get('MEMORY_GOVERNOR', '0') == '1'
+MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', '0'))
+
+# Métriques: temps par étape, fichier Prometheus vectorize_hdfs.prom dans METRICS_DIR
+PIPELINE_METRICS = os.environ.get('PIPELINE_METRICS', '0') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '/data/hdfs/metrics/')
+
+# Profils (--profile): piles repliées et rapports des fonctions chaudes
+PROFILE_DIR = '/data/hdfs/analysis/profiles/'
+
+# Code dont dépend la matrice (fait partie de la clé du cache)
+CODE_FILES = ['hdfs/vectorize_hdfs.py', 'structured_io.py', 'sparse_matrix.py',
+              'session_counts.py', 'time_windows.py']
+
+TIME_WINDOW_FILE = 'HDFS_time_window_matrix.csv'
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(STATE_DIR, exist_ok=True)
 
 
 def charger_donnees():
     
-    structured_path = os.path.join(PARSED_DIR, 'HDFS_structured.csv')
+    structured_path = resolve_structured_path(PARSED_DIR, 'HDFS_structured')
     templates_path = os.path.join(PARSED_DIR, 'HDFS_templates.csv')
     
     if not os.path.exists(structured_path):
@@ -27,40 +87,157 @@ def charger_donnees():
     return structured_path, df_templates
 
 
-def vectoriser_par_blockid_streaming(structured_path, all_event_ids):
-    
-    # Dictionnaire pour stocker les comptages
-    block_events = defaultdict(Counter)
+def compter_chunk_groupby(chunk_with_blocks, block_events):
+    """Agrégation historique: un groupby + value_counts par BlockID."""
+    for block_id, group in chunk_with_blocks.groupby('BlockId'):
+        event_counts = group['EventId'].value_counts()
+        block_events[block_id].update(event_counts.to_dict())
+
+
+# Lignes lues par chunk (taille initiale avec le gouverneur mémoire)
+CHUNK_SIZE = 500000
+
+
+def vectoriser_par_blockid_streaming(structured_path, all_event_ids, engine=None,
+                                     metrics=None, max_lines=None, profiler=None,
+                                     governor=None):
+    
+    engine = engine or VECTORIZE_ENGINE
+    
+    # Comptages: tableau numpy extensible, ou dictionnaire de Counters
+    if engine == 'numpy':
+        event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
+        if SESSION_MAX_GAP > 0:
+            block_events = SessionTracker(event_ids_sorted, max_gap=SESSION_MAX_GAP)
+        else:
+            block_events = SessionEventCounter(event_ids_sorted)
+    else:
+        block_events = defaultdict(Counter)
+    if governor is not None and isinstance(block_events, SessionTracker):
+        governor.add_reliever('evict_sessions', block_events.release_memory)
     
     # Lire le CSV en chunks pour économiser la mémoire
-    chunk_size = 500000
     total_lines = 0
     
-    for chunk in pd.read_csv(structured_path, chunksize=chunk_size):
+    chunks = iter_structured_chunks(structured_path, columns=['BlockId', 'EventId'],
+                                    chunksize=CHUNK_SIZE, governor=governor)
+    if metrics is not None:
+        chunks = metrics.timed_iter('read', chunks)
+    if profiler is not None:
+        chunks = profiler.wrap_iter('read', chunks)
+    
+    for chunk in chunks:
         # Filtrer les lignes avec BlockID
         chunk_with_blocks = chunk[chunk['BlockId'].notna()]
         
-        # Grouper par BlockID et compter les événements
-        for block_id, group in chunk_with_blocks.groupby('BlockId'):
-            event_counts = group['EventId'].value_counts()
-            block_events[block_id].update(event_counts.to_dict())
+        # Compter les événements par BlockID
+        if isinstance(block_events, SessionTracker):
+            # Position: numéro de ligne dans le fichier structuré
+            positions = total_lines + np.flatnonzero(chunk['BlockId'].notna().to_numpy()) + 1
+            block_events.add(chunk_with_blocks['BlockId'].to_numpy(),
+                             chunk_with_blocks['EventId'].to_numpy(), positions)
+        elif engine == 'numpy':
+            block_events.add(chunk_with_blocks['BlockId'].to_numpy(),
+                             chunk_with_blocks['EventId'].to_numpy())
+        else:
+            compter_chunk_groupby(chunk_with_blocks, block_events)
         
         total_lines += len(chunk)
+        if governor is not None:
+            governor.update()
         
-        if total_lines % 1000000 == 0:
+        if total_lines // 1000000 > (total_lines - len(chunk)) // 1000000:
             print(f"  Traité {total_lines:,} lignes...", flush=True)
+        if max_lines is not None and total_lines >= max_lines:
+            break
     
     print(f"   ✓ {total_lines:,} lignes traitées")
+    if metrics is not None:
+        metrics.inc('lines', total_lines)
     print(f"   ✓ {len(block_events):,} BlockIDs uniques trouvés")
+    if isinstance(block_events, SessionTracker):
+        print(f"   ✓ {block_events.peak_open:,} BlockIDs ouverts au plus, "
+              f"{block_events.num_spilled:,} déversés")
     
     return block_events
 
 
+def vectoriser_par_fenetre_temporelle(structured_path, all_event_ids, output_path=None,
+                                      metrics=None, max_lines=None, profiler=None,
+                                      governor=None):
+    """
+    Comptages par fenêtre de temps (Date/Time) de toutes les lignes, avec ou
+    sans BlockId. Les fenêtres complètes sont écrites en flux dans
+    output_path (None: calculées sans sauvegarde, profilage).
+    
+    Returns:
+        Résumé du TimeWindowCounter (fenêtres, lignes en retard...)
+    """
+    
+    event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
+    windows = TimeWindowCounter(event_ids_sorted, WINDOW_SECONDS, WINDOW_STEP_SECONDS,
+                                WINDOW_LATENESS_SECONDS)
+    print(f"\n Fenêtres de temps: {windows.window} s, pas de {windows.step} s, "
+          f"retard toléré {windows.lateness} s")
+    
+    chunks = iter_structured_chunks(structured_path, columns=['Date', 'Time', 'EventId'],
+                                    chunksize=CHUNK_SIZE, governor=governor)
+    if metrics is not None:
+        chunks = metrics.timed_iter('read', chunks)
+    if profiler is not None:
+        chunks = profiler.wrap_iter('read', chunks)
+    
+    # Fichier temporaire remplacé à la fin: pas de matrice partielle
+    tmp_path = output_path + '.tmp' if output_path is not None else None
+    output = open(tmp_path, 'w') if tmp_path is not None else None
+    total_lines = 0
+    try:
+        for chunk in chunks:
+            windows.add(hdfs_seconds(chunk['Date'], chunk['Time']), chunk['EventId'].to_numpy())
+            df_windows = windows.drain()
+            if output is not None:
+                df_windows.to_csv(output, header=output.tell() == 0, index=False)
+            
+            total_lines += len(chunk)
+            if governor is not None:
+                governor.update()
+            if max_lines is not None and total_lines >= max_lines:
+                break
+        
+        windows.flush()
+        df_windows = windows.drain()
+        if output is not None:
+            df_windows.to_csv(output, header=output.tell() == 0, index=False)
+    finally:
+        if output is not None:
+            output.close()
+    if tmp_path is not None:
+        os.replace(tmp_path, output_path)
+    
+    summary = windows.summary()
+    print(f"   ✓ {summary['windows']:,} fenêtres non vides, {summary['events']:,} lignes comptées")
+    print(f"   ✓ {summary['late_events']:,} lignes en retard ignorées, "
+          f"{summary['untimed_events']:,} sans date")
+    if metrics is not None:
+        metrics.set_gauge('time_windows', summary['windows'])
+        metrics.set_gauge('late_events', summary['late_events'])
+    if output_path is not None:
+        print(f"   ✓ {os.path.basename(output_path)}")
+    
+    return summary
+
+
 def creer_matrice(block_events, all_event_ids):
     
     # Trier les EventIds (E1, E2, E3, ...)
     event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
     
+    # Compteur vectorisé: matrice obtenue directement
+    if isinstance(block_events, SessionEventCounter):
+        df_matrix = block_events.to_dataframe(event_ids_sorted, 'BlockId')
+        print(f"  Matrice créée: {len(df_matrix):,} BlockIDs × {len(event_ids_sorted)} événements")
+        return df_matrix
+    
     # Créer la matrice
     rows = []
     
@@ -142,20 +319,37 @@ def statistiques_matrice(df_matrix):
         print(f"      {i:>2}. {event_id}: {int(count):>8,} ({pct:>5.2f}%)")
 
 
-def main():
-    """Fonction principale."""
+def sauvegarder_matrice_creuse(block_events, all_event_ids):
+    """Matrice CSR construite depuis les Counters, sans passer par le dense."""
     
-    # Charger les données
-    structured_path, df_templates = charger_donnees()
+    event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
+    matrix, block_ids = build_csr_matrix(block_events, event_ids_sorted)
     
-    if structured_path is None:
-        return
+    # Clés des lignes (+ labels)
+    df_rows = ajouter_labels(pd.DataFrame({'BlockId': block_ids}))
     
-    # Liste de tous les EventIds
-    all_event_ids = df_templates['EventId'].tolist()
+    print_sparse_statistics(matrix, event_ids_sorted, 'BlockID')
+    
+    output_path = save_sparse_matrix(OUTPUT_DIR, 'HDFS_event_occurrence_matrix',
+                                     matrix, df_rows, event_ids_sorted)
+    
+    print(f"   ✓ {os.path.basename(output_path)} (+ _rows.csv, _columns.csv)")
     
-    # Vectoriser par BlockID (streaming)
-    block_events = vectoriser_par_blockid_streaming(structured_path, all_event_ids)
+    return output_path
+
+
+def construire_et_sauvegarder_matrice(block_events, all_event_ids):
+    """
+    Matrice + labels + statistiques, puis sauvegarde (selon MATRIX_FORMAT).
+    
+    Returns:
+        (chemin de la matrice, DataFrame dense ou None en sparse)
+    """
+    
+    if MATRIX_FORMAT in ('sparse', 'both'):
+        output_path = sauvegarder_matrice_creuse(block_events, all_event_ids)
+        if MATRIX_FORMAT == 'sparse':
+            return output_path, None
     
     # Créer la matrice
     df_matrix = creer_matrice(block_events, all_event_ids)
@@ -172,6 +366,141 @@ def main():
     
     print(f"   ✓ {os.path.basename(output_path)}")
     
+    return output_path, df_matrix
+
+
+def fichiers_entree(structured_path):
+    """Entrées de la vectorisation (clé du cache d'artefacts)."""
+    return [
+        structured_path,
+        os.path.join(PARSED_DIR, 'HDFS_templates.csv'),
+        LABELS_FILE,
+        os.path.join(PARSER_DIR, 'drain.ini')
+    ] + [os.path.join(PARSER_DIR, name) for name in CODE_FILES]
+
+
+def fichiers_sortie():
+    """Fichiers écrits par la vectorisation (selon MATRIX_FORMAT et VECTORIZE_WINDOW)."""
+    outputs = []
+    if VECTORIZE_WINDOW != 'time':
+        if MATRIX_FORMAT in ('sparse', 'both'):
+            outputs.extend(sparse_matrix_paths(OUTPUT_DIR, 'HDFS_event_occurrence_matrix'))
+        if MATRIX_FORMAT != 'sparse':
+            outputs.append(os.path.join(OUTPUT_DIR, 'HDFS_event_occurrence_matrix.csv'))
+    if VECTORIZE_WINDOW != 'session':
+        outputs.append(os.path.join(OUTPUT_DIR, TIME_WINDOW_FILE))
+    return outputs
+
+
+def config_cache():
+    """Configuration dont dépendent les sorties (clé du cache d'artefacts)."""
+    config = {'matrix_format': MATRIX_FORMAT}
+    if VECTORIZE_WINDOW != 'session':
+        config.update(window=VECTORIZE_WINDOW, window_seconds=WINDOW_SECONDS,
+                      window_step_seconds=WINDOW_STEP_SECONDS,
+                      window_lateness_seconds=WINDOW_LATENESS_SECONDS)
+    return config
+
+
+def main(df_templates=None, block_events=None):
+    """
+    Fonction principale.
+    
+    Args:
+        df_templates: Templates passés en mémoire par l'orchestrateur
+            (pipeline.py), sinon lus dans PARSED_DIR
+        block_events: Comptages par BlockID du parsing (pipeline.py): le
+            fichier structuré n'est pas relu pour les sessions
+    
+    Returns:
+        {'matrix': DataFrame dense ou None}, None si la matrice est restaurée
+        depuis le cache ou sans données
+    """
+    
+    # Matrice déjà calculée pour ces entrées: restauration sans recalcul
+    structured_path = resolve_structured_path(PARSED_DIR, 'HDFS_structured')
+    cache_key = None
+    if ARTIFACT_CACHE and os.path.exists(structured_path):
+        artifact_cache = ArtifactCache(STATE_DIR)
+        cache_key = artifact_cache.compute_key('vectorize_hdfs', fichiers_entree(structured_path),
+                                               config_cache())
+        if artifact_cache.restore(cache_key) is not None:
+            print(f"\n Entrées inchangées, matrice restaurée depuis le cache ({cache_key})")
+            return None
+    
+    # Charger les données
+    if df_templates is None:
+        structured_path, df_templates = charger_donnees()
+        if structured_path is None:
+            return None
+    
+    # Liste de tous les EventIds
+    all_event_ids = df_templates['EventId'].tolist()
+    metrics = PipelineMetrics('vectorize_hdfs', METRICS_DIR, enabled=PIPELINE_METRICS)
+    governor = create_governor(CHUNK_SIZE, MEMORY_BUDGET_MB, enabled=MEMORY_GOVERNOR)
+    
+    df_matrix = None
+    if VECTORIZE_WINDOW != 'time':
+        # Vectoriser par BlockID (streaming), lecture des chunks incluse
+        if block_events is None:
+            with metrics.time('vectorize'):
+                block_events = vectoriser_par_blockid_streaming(structured_path, all_event_ids,
+                                                                metrics=metrics,
+                                                                governor=governor)
+        else:
+            print(f"\n Comptages du parsing en mémoire: {len(block_events):,} BlockIDs")
+        metrics.set_gauge('sessions', len(block_events))
+        
+        with metrics.time('matrix'):
+            _, df_matrix = construire_et_sauvegarder_matrice(block_events, all_event_ids)
+    
+    if VECTORIZE_WINDOW != 'session':
+        if not os.path.exists(structured_path):
+            print(f"\n Fichier structuré absent ({structured_path}), fenêtres de temps sautées")
+            return {'matrix': df_matrix}
+        with metrics.time('time_windows'):
+            summary = vectoriser_par_fenetre_temporelle(
+                structured_path, all_event_ids, os.path.join(OUTPUT_DIR, TIME_WINDOW_FILE),
+                metrics=metrics, governor=governor)
+        CacheManager(STATE_DIR).save_job_info('time_windows', 'vectorize_hdfs', summary)
+    
+    if governor is not None and governor.updates:
+        CacheManager(STATE_DIR).save_job_info('memory_governor', 'vectorize_hdfs',
+                                              governor.summary())
+    
+    if cache_key is not None:
+        artifact_cache.store(cache_key, fichiers_sortie())
+    
+    metrics.publish(CacheManager(STATE_DIR))
+    return {'matrix': df_matrix}
+    
+
+def profiler_vectorisation(profiler, max_lines):
+    """Vectorisation d'un préfixe sous profilage, matrice construite sans sauvegarde."""
+    structured_path, df_templates = charger_donnees()
+    if structured_path is None:
+        return
+    all_event_ids = df_templates['EventId'].tolist()
+    
+    if VECTORIZE_WINDOW != 'time':
+        with profiler.stage('groupby'):
+            block_events = vectoriser_par_blockid_streaming(structured_path, all_event_ids,
+                                                            max_lines=max_lines,
+                                                            profiler=profiler)
+        with profiler.stage('matrix'):
+            if MATRIX_FORMAT == 'sparse':
+                build_csr_matrix(block_events, sorted(all_event_ids, key=lambda x: int(x[1:])))
+            else:
+                creer_matrice(block_events, all_event_ids)
+    if VECTORIZE_WINDOW != 'session':
+        with profiler.stage('time_windows'):
+            vectoriser_par_fenetre_temporelle(structured_path, all_event_ids,
+                                              max_lines=max_lines, profiler=profiler)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    options = parse_profile_args()
+    if options.profile:
+        run_profiled('vectorize_hdfs', profiler_vectorisation, options, PROFILE_DIR)
+    else:
+        main()
\ No newline at end of file
@@ -2,19 +2,81 @@
 Module de base pour le parsing de logs avec streaming.
 Ne charge JAMAIS tout en mémoire.
 """
+import io
 import os
 import re
+import copy
+import time
+import itertools
+import multiprocessing
+from collections import deque
+
 import pandas as pd
 from abc import ABC, abstractmethod
 from drain3 import TemplateMiner
 from drain3.template_miner_config import TemplateMinerConfig
 
+from template_cache import TemplateCache
+from structured_io import create_batch_writer, BackgroundWriter
+from row_batch import RowBatch, field_columns_of
+from metrics import current_rss_bytes
+from fingerprint import HashingReader, READ_SIZE, new_hasher
+from compressed_input import is_compressed, open_log_source
+from mmap_reader import (compile_line_pattern, open_mmap, iter_line_batches, decode_batch,
+                         extract_batch)
+
+
+# Taille cible d'un shard pour le parsing parallèle (octets)
+SHARD_SIZE = 16 * 1024 * 1024
+
+# Fins de ligne de la lecture texte (_iter_entries, newlines universels):
+# '\r\n', '\n' et '\r' isolé. Tous les lecteurs découpent de la même façon.
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+RAW_LINE = re.compile(rb'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+')
+
+
+def split_text_lines(text):
+    """Lignes d'un texte, sans la ligne vide qui suit une fin de ligne finale."""
+    lines = LINE_BREAK.split(text) if '\r' in text else text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def iter_raw_lines(f, start, end):
+    """
+    Lignes brutes (octets, fin de ligne comprise) de la plage [start, end)
+    d'un fichier binaire, découpées comme la lecture texte.
+    """
+    f.seek(start)
+    offset = start
+    while offset < end:
+        chunk = f.readline(end - offset)
+        if not chunk:
+            break
+        offset += len(chunk)
+        if b'\r' in chunk:
+            yield from RAW_LINE.findall(chunk)
+        else:
+            yield chunk
+
 
 class LogProcessor(ABC):
     """Classe de base pour le parsing de logs avec mode streaming."""
     
-    def __init__(self, config_file='drain.ini'):
+    # Typage des colonnes pour les sorties parquet/arrow
+    INTEGER_COLUMNS = ('LineId', 'Pid')
+    DICTIONARY_COLUMNS = ('Level', 'Component', 'EventId', 'EventTemplate')
+    
+    def __init__(self, config_file='drain.ini', template_cache_size=0):
+        """
+        Args:
+            config_file: Configuration Drain3
+            template_cache_size: Taille du cache contenu masqué -> cluster
+                devant Drain3 (0 = désactivé)
+        """
         self.config_file = config_file
+        self.template_cache_size = template_cache_size
         if not os.path.isabs(self.config_file) and not os.path.exists(self.config_file):
             module_dir = os.path.dirname(__file__)
             candidate = os.path.join(module_dir, self.config_file)
@@ -23,6 +85,18 @@ class LogProcessor(ABC):
             else:
                 pass
         self.template_miner = None
+        self.template_cache = None
+        self.masker = None
+        # (contenu, contenu masqué) de la dernière ligne masquée à l'extraction
+        self._last_masked = None
+        self.num_matched = 0
+        # Champs des tuples de fields_from_groups (ordre de get_column_order())
+        self.field_columns = field_columns_of(self.get_column_order())
+        self.content_index = self.field_columns.index('Content')
+        # EventId par cluster (une chaîne partagée au lieu d'une par ligne)
+        self._event_ids = {}
+        # Lecteur de lignes: 'text' (historique) ou 'mmap' (batchs d'offsets)
+        self.reader = 'text'
         
     @abstractmethod
     def get_log_pattern(self):
@@ -30,100 +104,644 @@ class LogProcessor(ABC):
         pass
     
     @abstractmethod
-    def extract_fields(self, line, match):
-        """Extrait les champs d'une ligne parsée."""
+    def fields_from_groups(self, groups):
+        """
+        Champs d'une ligne à partir des groupes de la regex (déjà décodés).
+        
+        Returns:
+            tuple des valeurs, dans l'ordre de field_columns
+        """
         pass
     
     @abstractmethod
-    def create_unparsed_entry(self, line, line_id):
-        """Crée une entrée pour ligne non parsée."""
+    def unparsed_fields(self, line):
+        """Champs d'une ligne non parsée (tuple, ordre de field_columns)."""
         pass
     
+    def mask_content(self, content):
+        """
+        Masques de drain.ini appliqués au contenu avant Drain3 (dans les
+        workers en parsing parallèle). Le résultat sert au match du miner
+        figé, au cache de templates et à Drain3 sans remasquer.
+        
+        Returns:
+            Contenu masqué, ou None avant init_template_miner
+        """
+        if self.masker is None:
+            return None
+        last_masked = self._last_masked
+        if last_masked is not None and last_masked[0] is content:
+            return last_masked[1]
+        return self.masker.mask(content)
+    
+    def mask_and_capture(self, content, mask_name):
+        """
+        Masques de drain.ini appliqués au contenu comme mask_content, en
+        capturant la première valeur remplacée par le masque mask_name
+        (ex: 'BLOCK' -> BlockId) pendant la substitution: le processeur ne
+        recherche pas l'identifiant séparément. Le contenu masqué est repris
+        par l'appel à mask_content qui suit pour la même ligne.
+        
+        Returns:
+            (contenu masqué, valeur capturée ou None), ou (None, None) sans
+            masker ou si drain.ini n'a pas de masque mask_name
+        """
+        masker = self.masker
+        if masker is None or mask_name not in masker.mask_names:
+            return None, None
+        
+        captured = []
+        mask = masker.mask_prefix + mask_name + masker.mask_suffix
+        
+        def replace(match):
+            if not captured:
+                captured.append(match.group())
+            return mask
+        
+        masked_content = content
+        for instruction in masker.masking_instructions:
+            if instruction.mask_with == mask_name:
+                masked_content = instruction.regex.sub(replace, masked_content)
+            else:
+                masked_content = instruction.mask(masked_content, masker.mask_prefix,
+                                                  masker.mask_suffix)
+        
+        self._last_masked = (content, masked_content)
+        return masked_content, captured[0] if captured else None
+    
     @abstractmethod
     def get_column_order(self):
-        """Retourne l'ordre des colonnes pour le CSV."""
+        """
+        Retourne l'ordre des colonnes pour le CSV: LineId, les champs de
+        fields_from_groups, EventId et EventTemplate.
+        """
         pass
     
     def parse_and_save_streaming(self, file_path, output_path, 
-                                  batch_size=100000, progress_interval=50000):
+                                  batch_size=100000, progress_interval=50000,
+                                  num_workers=1, shard_size=SHARD_SIZE,
+                                  learn_lines=None, output_format='csv', sinks=(),
+                                  start_offset=0, end_offset=None, start_line_id=0,
+                                  append=False, member=None, reader='text', metrics=None,
+                                  max_lines=None, profiler=None, governor=None,
+                                  write_buffers=0, write_mode='thread', prefix_hasher=None):
         """
         Parse le fichier en streaming et sauvegarde par batch.
         NE CHARGE JAMAIS TOUT EN MÉMOIRE.
         
         Args:
             file_path: Fichier d'entrée
-            output_path: Fichier de sortie CSV
+            output_path: Fichier de sortie (CSV, Parquet ou Arrow IPC), ou
+                None pour ne pas écrire les logs structurés
             batch_size: Taille des batchs pour sauvegarde
             progress_interval: Intervalle d'affichage
+            num_workers: Nombre de processus pour l'extraction regex
+                (1 = mode séquentiel historique)
+            shard_size: Taille (octets) des shards en mode parallèle
+            learn_lines: Si défini, mode "apprendre puis apparier": Drain3
+                apprend sur ce préfixe, puis le reste du fichier est apparié
+                en lecture seule dans les workers
+            output_format: 'csv', 'parquet' ou 'arrow'
+            sinks: Consommateurs supplémentaires des batchs (RowBatch,
+                write/close), ex: SessionCountSink pour la matrice
+                d'occurrences
+            start_offset, end_offset: Plage d'octets à parser (début de
+                ligne / fin de ligne), pour le mode incrémental
+            start_line_id: Nombre de lignes avant start_offset (LineId)
+            append: Ajouter au fichier structuré existant (CSV uniquement)
+            member: Membre à lire si file_path est une archive (.zip, .tar.gz);
+                les sources compressées sont lues en séquentiel, décompressées
+                dans un thread
+            reader: 'text' (lecture ligne à ligne décodée) ou 'mmap' (fins de
+                ligne repérées sur les octets du mmap, décodage et regex par
+                bloc), aussi utilisé par les shards
+            metrics: PipelineMetrics: temps cumulés de l'extraction (lecture,
+                regex, masquage), de Drain3 et des flushs, compteurs de
+                lignes et de templates, exportés à chaque flush
+            max_lines: Ne parser que ce préfixe (lignes), ex: profilage
+            profiler: StageProfiler: étapes 'extract' (lecture, regex,
+                masquage), 'drain' et 'save_batch'
+            governor: MemoryGovernor: batch_size initial remplacé par la
+                taille du gouverneur, ajustée après chaque batch, et batch
+                écrit plus tôt si le RSS dépasse le budget
+            write_buffers: Si >= 2, logs structurés écrits dans un thread ou
+                un processus dédié avec ce nombre de batchs en vol, pendant
+                que le parsing continue (0 = écriture synchrone). Les sinks
+                restent appelés dans le parseur
+            write_mode: 'thread' ou 'process' (BackgroundWriter)
+            prefix_hasher: Hash en cours de [0, start_offset) (mode
+                incrémental), continué sur les octets lus par les lecteurs
+                séquentiels (text, mmap): prefix_hash = hash de [0, end_offset)
+                sans relire le préfixe. None pour les shards
         """
         print(f"📖 Parsing en mode streaming: {file_path}")
         
-        # Initialiser Drain3
-        config = TemplateMinerConfig()
-        config.load(self.config_file)
-        self.template_miner = TemplateMiner(config=config)
+        # Initialiser Drain3 (conservé entre fichiers: EventId globaux)
+        if self.template_miner is None:
+            self.init_template_miner()
+        
+        if start_offset or end_offset is not None:
+            print(f"   Plage: octets {start_offset:,} -> "
+                  f"{end_offset if end_offset is not None else 'fin'}, "
+                  f"à partir de la ligne {start_line_id + 1:,}")
         
-        pattern = self.get_log_pattern()
-        batch = []
+        # Position atteinte dans le fichier (mise à jour par les itérateurs)
+        self.end_offset = start_offset
+        self.lines_read = start_line_id
+        # Hash complet calculé pendant la lecture (mode séquentiel uniquement)
+        self.file_hash = None
+        self.prefix_hash = None
+        range_hasher = None
+        # Transmis aux workers avec le processeur
+        self.reader = reader
+        
+        # Pas d'accès par offset dans un flux décompressé: mode séquentiel
+        if member is not None or is_compressed(file_path):
+            if learn_lines or num_workers > 1 or start_offset or end_offset is not None:
+                print(f"   Source compressée: lecture séquentielle "
+                      f"(shards, apprentissage/appariement et plages désactivés)")
+            print(f"   Décompression en flux: {os.path.basename(file_path)}"
+                  f"{' -> ' + member if member else ''}")
+            entries = self._iter_entries(file_path, member)
+        elif learn_lines:
+            num_workers = max(num_workers, 1)
+            print(f"   Mode apprentissage/appariement: préfixe de {learn_lines:,} lignes, "
+                  f"{num_workers} workers")
+            entries = self._iter_entries_two_phase(file_path, learn_lines,
+                                                   num_workers, shard_size,
+                                                   start_offset, end_offset, start_line_id)
+        elif num_workers > 1:
+            print(f"   Mode parallèle: {num_workers} workers, "
+                  f"shards de {shard_size / 1024 / 1024:.0f} MB")
+            entries = self._iter_entries_parallel(file_path, num_workers, shard_size,
+                                                  start=start_offset, end=end_offset,
+                                                  line_offset=start_line_id)
+        elif reader == 'mmap':
+            range_hasher = prefix_hasher
+            entries = self._iter_entries_mmap(file_path, start_offset, end_offset,
+                                              start_line_id, hasher=range_hasher)
+        elif start_offset or end_offset is not None:
+            range_hasher = prefix_hasher
+            entries = self._iter_entries_range(file_path, start_offset, end_offset,
+                                               start_line_id, hasher=range_hasher)
+        else:
+            entries = self._iter_entries(file_path)
+        
+        if max_lines is not None:
+            entries = itertools.islice(entries, max_lines)
+        
+        # Instrumentation seulement si activée (boucle inchangée sinon)
+        if metrics is not None and not metrics.enabled:
+            metrics = None
+        
+        outputs = list(sinks)
+        background = None
+        self.writer_stats = None
+        if output_path is not None:
+            writer = create_batch_writer(output_path, self.get_column_order(), output_format,
+                                         integer_columns=self.INTEGER_COLUMNS,
+                                         dictionary_columns=self.DICTIONARY_COLUMNS,
+                                         append=append, metrics=metrics)
+            # Écriture en arrière-plan: attente du parseur dans writer_stats
+            if write_buffers >= 2:
+                writer = background = BackgroundWriter([writer], write_buffers, write_mode)
+            outputs.insert(0, writer)
+        
+        assign_template = self._assign_template
+        if profiler is not None:
+            entries = profiler.wrap_iter('extract', entries)
+            assign_template = profiler.wrap('drain', assign_template)
+            outputs = [_ProfiledOutput(output, profiler) for output in outputs]
+        
+        columns = self.get_column_order()
+        batch = RowBatch(columns, self.field_columns)
+        append_line_id, append_fields, append_event_id, append_template = batch.appenders()
+        batch_lines = 0
         total_lines = 0
-        first_batch = True
+        next_progress = progress_interval
+        self.num_matched = 0
         
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for line_id, line in enumerate(f, start=1):
-                line = line.strip()
-                if not line:
+        # Seuil de la boucle: taille du batch, ou prochain contrôle du RSS
+        if governor is not None:
+            batch_size = governor.size
+            next_check = governor.check_interval
+            limit = min(batch_size, next_check)
+        else:
+            limit = batch_size
+        
+        if metrics is not None:
+            # Extraction déduite par batch (durée de la boucle - Drain3):
+            # seul l'appel à Drain3 est chronométré ligne par ligne
+            clock = time.perf_counter_ns
+            num_templates = len(self.template_miner.drain.clusters)
+            drain_ns = 0
+            batch_start = clock()
+        
+        for line_id, fields, masked_content, cluster_id in entries:
+            # Parser avec Drain3 (toujours séquentiel, dans l'ordre des LineId,
+            # pour que l'attribution des EventId ne dépende pas du découpage)
+            if metrics is None:
+                event_id, template = assign_template(fields, masked_content, cluster_id)
+            else:
+                start = clock()
+                event_id, template = assign_template(fields, masked_content, cluster_id)
+                drain_ns += clock() - start
+            
+            append_line_id(line_id)
+            append_fields(fields)
+            append_event_id(event_id)
+            append_template(template)
+            batch_lines += 1
+            total_lines += 1
+            
+            # Sauvegarder le batch (plus tôt si le RSS dépasse le budget)
+            if batch_lines >= limit:
+                if batch_lines < batch_size and not governor.should_flush():
+                    next_check += governor.check_interval
+                    limit = min(batch_size, next_check)
                     continue
                 
-                # Parser la ligne
-                match = pattern.match(line)
-                
-                if match:
-                    log_entry = self.extract_fields(line, match)
-                    log_entry['LineId'] = line_id
+                if metrics is None:
+                    for output in outputs:
+                        output.write(batch)
                 else:
-                    log_entry = self.create_unparsed_entry(line, line_id)
-                
-                # Parser avec Drain3
-                result = self.template_miner.add_log_message(log_entry['Content'])
-                log_entry['EventId'] = f"E{result['cluster_id']}"
-                log_entry['EventTemplate'] = result['template_mined']
-                
-                batch.append(log_entry)
-                total_lines += 1
+                    metrics.add_time('drain', drain_ns)
+                    metrics.add_time('extract', clock() - batch_start - drain_ns)
+                    num_templates = self._flush_with_metrics(outputs, batch, metrics,
+                                                             num_templates)
+                    drain_ns = 0
+                    batch_start = clock()
+                # Nouveau batch: le précédent peut encore être en cours d'écriture
+                batch = RowBatch(columns, self.field_columns)
+                append_line_id, append_fields, append_event_id, append_template = \
+                    batch.appenders()
+                batch_lines = 0
                 
-                # Sauvegarder le batch
-                if len(batch) >= batch_size:
-                    self._save_batch(batch, output_path, first_batch)
-                    batch = []
-                    first_batch = False
-                
-                # Afficher progression
-                if line_id % progress_interval == 0:
-                    print(f"   Traité {line_id:,} lignes...", flush=True)
+                if governor is not None:
+                    batch_size = governor.update()
+                    next_check = governor.check_interval
+                    limit = min(batch_size, next_check)
+            
+            # Afficher progression
+            if line_id >= next_progress:
+                print(f"   Traité {line_id:,} lignes...", flush=True)
+                next_progress += progress_interval
         
         # Sauvegarder le dernier batch
-        if batch:
-            self._save_batch(batch, output_path, first_batch)
+        if batch_lines:
+            if metrics is None:
+                for output in outputs:
+                    output.write(batch)
+            else:
+                metrics.add_time('drain', drain_ns)
+                metrics.add_time('extract', clock() - batch_start - drain_ns)
+                self._flush_with_metrics(outputs, batch, metrics, num_templates)
+        for output in outputs:
+            output.close()
+        if background is not None:
+            self.writer_stats = background.get_stats()
+            if metrics is not None:
+                metrics.add_time('writer_wait', int(self.writer_stats['wait_seconds'] * 1e9))
+                metrics.add_time('writer_busy', int(self.writer_stats['write_seconds'] * 1e9))
+        if metrics is not None:
+            metrics.export()
+        # Octets hashés jusqu'à end_offset exactement (avant chaque yield)
+        if range_hasher is not None:
+            self.prefix_hash = range_hasher.hexdigest()
         
         print(f"   ✓ {total_lines:,} lignes parsées et sauvegardées")
+        if self.writer_stats is not None:
+            print(f"   ✓ Écriture en arrière-plan ({self.writer_stats['mode']}): "
+                  f"{self.writer_stats['write_seconds']:.1f} s "
+                  f"d'écriture, parseur en attente {self.writer_stats['wait_seconds']:.1f} s")
+        if learn_lines:
+            print(f"   ✓ {self.num_matched:,} lignes appariées en lecture seule, "
+                  f"{total_lines - self.num_matched:,} apprises par Drain3")
+        if self.template_cache is not None:
+            cache_stats = self.template_cache.get_stats()
+            print(f"   ✓ Cache templates: {cache_stats['hit_rate']*100:.1f}% de hits "
+                  f"({cache_stats['size']:,} entrées, {cache_stats['evictions']:,} évictions, "
+                  f"{cache_stats['invalidations']:,} invalidations)")
         
         return total_lines
     
-    def _save_batch(self, batch, output_path, is_first):
+    def _flush_with_metrics(self, outputs, batch, metrics, num_templates):
         """
-        Sauvegarde un batch dans le CSV.
+        Écrit un batch en mesurant chaque sortie et la latence du flush, puis
+        met à jour compteurs et jauges et réécrit le fichier .prom.
         
-        Args:
-            batch: Liste de dictionnaires
-            output_path: Chemin du CSV
-            is_first: True si c'est le premier batch (écrire header)
+        Returns:
+            Nombre de templates après le batch
+        """
+        start = time.perf_counter_ns()
+        for output in outputs:
+            output_start = time.perf_counter_ns()
+            output.write(batch)
+            metrics.add_time(f"write_{type(output).__name__}",
+                             time.perf_counter_ns() - output_start)
+        elapsed = time.perf_counter_ns() - start
+        metrics.add_time('flush', elapsed)
+        metrics.observe('flush_seconds', elapsed / 1e9)
+        
+        # Les lignes non parsées n'ont pas de niveau
+        metrics.inc('lines', len(batch))
+        metrics.inc('unparsed_lines', sum(1 for level in batch.column('Level') if not level))
+        templates = len(self.template_miner.drain.clusters)
+        metrics.inc('new_templates', templates - num_templates)
+        metrics.set_gauge('templates', templates)
+        metrics.set_gauge('rss_bytes', current_rss_bytes())
+        metrics.export()
+        return templates
+    
+    def release_memory(self):
+        """Délestage sous pression mémoire: vide le cache de templates."""
+        if self.template_cache is not None:
+            self.template_cache.clear()
+    
+    def init_template_miner(self):
+        """Crée un miner Drain3 vierge (et son cache de templates)."""
+        config = TemplateMinerConfig()
+        config.load(self.config_file)
+        self.template_miner = TemplateMiner(config=config)
+        self.masker = self.template_miner.masker
+        self._last_masked = None
+        
+        self.template_cache = None
+        if self.template_cache_size:
+            self.template_cache = TemplateCache(self.template_miner,
+                                                maxsize=self.template_cache_size)
+    
+    def save_template_state(self, state_path):
+        """Sauvegarde l'état Drain3 (arbre + clusters) pour le mode incrémental."""
+        from drain3.file_persistence import FilePersistence
+        
+        self.template_miner.persistence_handler = FilePersistence(state_path)
+        try:
+            self.template_miner.save_state("incremental")
+        finally:
+            self.template_miner.persistence_handler = None
+    
+    def load_template_state(self, state_path):
+        """
+        Recrée le miner à partir d'un état sauvegardé par save_template_state.
+        
+        Returns:
+            True si l'état a été restauré, False sinon (miner vierge)
         """
-        df = pd.DataFrame(batch)
-        df = df[self.get_column_order()]
+        from drain3.file_persistence import FilePersistence
+        
+        self.init_template_miner()
+        if not os.path.exists(state_path):
+            return False
         
-        # Append au CSV (header seulement si premier batch)
-        df.to_csv(output_path, mode='a' if not is_first else 'w', 
-                  header=is_first, index=False)
+        self.template_miner.persistence_handler = FilePersistence(state_path)
+        try:
+            self.template_miner.load_state()
+        finally:
+            self.template_miner.persistence_handler = None
+        
+        return True
+    
+    def _event_id(self, cluster_id):
+        event_id = self._event_ids.get(cluster_id)
+        if event_id is None:
+            event_id = self._event_ids[cluster_id] = f"E{cluster_id}"
+        return event_id
+    
+    def _assign_template(self, fields, masked_content=None, cluster_id=None):
+        """
+        EventId/EventTemplate d'une ligne (tuple de champs).
+        
+        Si un worker a déjà apparié la ligne à un cluster figé (cluster_id),
+        on reprend ce cluster dans le miner principal (taille et template
+        courants). Sinon, ou si le cluster a été évincé, passage par
+        add_log_message (apprentissage séquentiel), via le cache de
+        templates s'il est activé. Le contenu déjà masqué par un worker
+        (masked_content) n'est pas remasqué.
+        
+        Returns:
+            (EventId, EventTemplate)
+        """
+        if cluster_id is not None:
+            cluster = self.template_miner.drain.id_to_cluster.get(cluster_id)
+            if cluster is not None:
+                cluster.size += 1
+                self.num_matched += 1
+                return self._event_id(cluster_id), cluster.get_template()
+        
+        content = fields[self.content_index]
+        if masked_content is None:
+            masked_content = self.mask_content(content)
+        
+        if self.template_cache is not None:
+            cluster_id, template = self.template_cache.add_log_message(content, masked_content)
+        elif masked_content is not None:
+            cluster, _ = self.template_miner.drain.add_log_message(masked_content)
+            cluster_id, template = cluster.cluster_id, cluster.get_template()
+        else:
+            result = self.template_miner.add_log_message(content)
+            cluster_id, template = result['cluster_id'], result['template_mined']
+        return self._event_id(cluster_id), template
+    
+    def parse_line(self, line):
+        """
+        Parse une ligne brute (sans Drain3).
+        
+        Returns:
+            tuple des champs (ordre de field_columns), ou None si la ligne
+            est vide
+        """
+        line = line.strip()
+        if not line:
+            return None
+        
+        match = self.get_log_pattern().match(line)
+        
+        if match:
+            return self.fields_from_groups(match.groups())
+        return self.unparsed_fields(line)
+    
+    def _iter_entries(self, file_path, member=None):
+        """
+        Lit le fichier ligne par ligne et produit les lignes parsées:
+        (LineId, champs, contenu masqué, cluster), les deux derniers à None
+        hors workers.
+        
+        Les octets lus alimentent au passage le hash du fichier (file_hash),
+        repris par le CacheManager sans relire le fichier. Pour une source
+        compressée, ce sont les octets décompressés.
+        """
+        reader = HashingReader(open_log_source(file_path, member))
+        with io.TextIOWrapper(io.BufferedReader(reader, READ_SIZE),
+                              encoding='utf-8', errors='ignore') as f:
+            for line_id, line in enumerate(f, start=1):
+                self.lines_read = line_id
+                fields = self.parse_line(line)
+                if fields is not None:
+                    yield line_id, fields, None, None
+            
+            self.file_hash = reader.hexdigest()
+        
+        self.end_offset = os.path.getsize(file_path)
+    
+    def _iter_entries_range(self, file_path, start, end, line_offset, hasher=None):
+        """
+        Comme _iter_entries, sur la plage d'octets [start, end) lue en
+        binaire, pour connaître exactement l'offset atteint. Les lignes lues
+        alimentent hasher (hash du préfixe continué).
+        """
+        if end is None:
+            end = os.path.getsize(file_path)
+        
+        with open(file_path, 'rb') as f:
+            offset = start
+            line_id = line_offset
+            
+            for raw_line in iter_raw_lines(f, start, end):
+                offset += len(raw_line)
+                line_id += 1
+                self.end_offset, self.lines_read = offset, line_id
+                if hasher is not None:
+                    hasher.update(raw_line)
+                
+                fields = self.parse_line(raw_line.decode('utf-8', errors='ignore'))
+                if fields is not None:
+                    yield line_id, fields, None, None
+    
+    def _iter_entries_mmap(self, file_path, start=0, end=None, line_offset=0, hasher=None):
+        """
+        Comme _iter_entries_range, via mmap: les lignes sont traitées par
+        batchs d'offsets, chaque bloc est décodé en une fois et la regex est
+        appliquée sur les offsets du bloc. Les lignes atypiques passent par
+        parse_line.
+        
+        Sur le fichier entier, le hash (file_hash) est calculé sur les blocs
+        du mmap au fil de la lecture; sur une plage, les blocs alimentent
+        hasher (hash du préfixe continué).
+        """
+        pattern = compile_line_pattern(self.get_log_pattern())
+        whole_file = start == 0 and end is None
+        if hasher is None and whole_file:
+            hasher = new_hasher()
+        line_id = line_offset
+        
+        with open(file_path, 'rb') as f:
+            mm = open_mmap(f)
+            if mm is None:
+                self.file_hash = hasher.hexdigest() if whole_file else None
+                return
+            if end is None:
+                end = len(mm)
+            
+            try:
+                for starts, ends in iter_line_batches(mm, start, end):
+                    batch_end = min(int(ends[-1]) + 1, end)
+                    text, line_starts, line_ends = decode_batch(mm, starts, ends)
+                    fields = extract_batch(text, line_starts, line_ends, pattern)
+                    
+                    for line_start, line_end, groups in zip(line_starts, line_ends, fields):
+                        line_id += 1
+                        if groups is None:
+                            fields = self.parse_line(text[line_start:line_end])
+                            if fields is None:
+                                continue
+                        else:
+                            fields = self.fields_from_groups(groups)
+                        yield line_id, fields, None, None
+                    
+                    # Hash et offset avancés ensemble, après le batch
+                    if hasher is not None:
+                        with memoryview(mm)[int(starts[0]):batch_end] as block:
+                            hasher.update(block)
+                    self.end_offset, self.lines_read = batch_end, line_id
+            finally:
+                mm.close()
+        
+        if whole_file:
+            self.file_hash = hasher.hexdigest()
+    
+    def _iter_entries_two_phase(self, file_path, learn_lines, num_workers, shard_size,
+                                start=0, end=None, line_offset=0):
+        """
+        Phase 1: produit les learn_lines premières entrées (apprises par
+        Drain3 dans la boucle principale). Phase 2: fige une copie du miner
+        et apparie le reste du fichier en parallèle (Drain3 match, sans
+        modification de l'arbre). Les lignes non appariées reviennent sans
+        cluster et sont apprises séquentiellement, dans l'ordre.
+        """
+        if end is None:
+            end = os.path.getsize(file_path)
+        line_id = line_offset
+        offset = start
+        learned = 0
+        
+        with open(file_path, 'rb') as f:
+            for raw_line in iter_raw_lines(f, start, end):
+                line_id += 1
+                offset += len(raw_line)
+                self.end_offset, self.lines_read = offset, line_id
+                fields = self.parse_line(raw_line.decode('utf-8', errors='ignore'))
+                if fields is None:
+                    continue
+                
+                # La boucle principale traite la ligne avant de reprendre ici
+                yield line_id, fields, None, None
+                learned += 1
+                if learned >= learn_lines:
+                    break
+        
+        frozen_miner = copy.deepcopy(self.template_miner)
+        print(f"   Phase d'apprentissage terminée: {len(frozen_miner.drain.clusters)} "
+              f"templates figés après {line_id:,} lignes")
+        
+        yield from self._iter_entries_parallel(file_path, num_workers, shard_size,
+                                               start=offset, end=end, line_offset=line_id,
+                                               template_miner=frozen_miner)
+    
+    def _iter_entries_parallel(self, file_path, num_workers, shard_size,
+                               start=0, end=None, line_offset=0, template_miner=None):
+        """
+        Découpe le fichier en shards (frontières de lignes) et exécute
+        l'extraction regex dans un pool de processus.
+        
+        Les résultats sont consommés dans l'ordre des shards, avec au plus
+        2 * num_workers shards en vol pour borner la mémoire. Les LineId
+        sont recalculés globalement à partir du nombre de lignes par shard.
+        Si template_miner est fourni, les workers apparient aussi chaque
+        ligne en lecture seule.
+        """
+        shards = compute_shards(file_path, shard_size, start=start, end=end)
+        
+        with multiprocessing.Pool(num_workers, initializer=_init_shard_worker,
+                                  initargs=(self, template_miner)) as pool:
+            pending = deque()
+            shard_iter = iter(shards)
+            
+            for bounds in shard_iter:
+                pending.append((bounds[1], pool.apply_async(_parse_shard, (file_path, bounds))))
+                if len(pending) >= 2 * num_workers:
+                    break
+            
+            while pending:
+                shard_end, result = pending.popleft()
+                num_lines, shard_entries = result.get()
+                
+                bounds = next(shard_iter, None)
+                if bounds is not None:
+                    pending.append((bounds[1], pool.apply_async(_parse_shard, (file_path, bounds))))
+                
+                for line_id, fields, masked_content, cluster_id in shard_entries:
+                    yield line_id + line_offset, fields, masked_content, cluster_id
+                
+                line_offset += num_lines
+                self.end_offset, self.lines_read = shard_end, line_offset
+    
+    def __getstate__(self):
+        # Le miner Drain3 reste dans le processus principal
+        state = self.__dict__.copy()
+        state['template_miner'] = None
+        state['template_cache'] = None
+        return state
     
     def create_templates_dataframe(self):
         """Crée le DataFrame des templates."""
@@ -155,4 +773,115 @@ class LogProcessor(ABC):
             template = row['EventTemplate']
             if len(template) > 70:
                 template = template[:70] + "..."
-            print(f"   {row['EventId']}: {row['Occurrences']:>7,} fois - {template}")
\ No newline at end of file
+            print(f"   {row['EventId']}: {row['Occurrences']:>7,} fois - {template}")
+
+
+class _ProfiledOutput:
+    """Sortie de batchs dont les écritures sont attribuées à l'étape 'save_batch'."""
+
+    def __init__(self, output, profiler):
+        self.output = output
+        self.write = profiler.wrap('save_batch', output.write)
+        self.close = profiler.wrap('save_batch', output.close)
+
+
+def compute_shards(file_path, shard_size=SHARD_SIZE, start=0, end=None):
+    """
+    Découpe un fichier en plages d'octets alignées sur les fins de ligne,
+    de l'offset start (début de ligne) à end (fin de ligne, défaut: fin du
+    fichier).
+    """
+    file_size = os.path.getsize(file_path) if end is None else end
+    shards = []
+    
+    with open(file_path, 'rb') as f:
+        while start < file_size:
+            end = min(start + shard_size, file_size)
+            if end < file_size:
+                # Avancer jusqu'à la fin de la ligne courante
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            shards.append((start, end))
+            start = end
+    
+    return shards
+
+
+def find_complete_end(file_path):
+    """
+    Offset de fin de la dernière ligne complète (terminée par '\\n'):
+    une ligne en cours d'écriture n'est pas parsée en mode incrémental.
+    """
+    file_size = os.path.getsize(file_path)
+    
+    with open(file_path, 'rb') as f:
+        position = file_size
+        while position > 0:
+            block_start = max(position - 65536, 0)
+            f.seek(block_start)
+            block = f.read(position - block_start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                return block_start + newline + 1
+            position = block_start
+    
+    return 0
+
+
+_shard_processor = None
+_shard_miner = None
+
+
+def _init_shard_worker(processor, template_miner=None):
+    """Initialise le processeur (et le miner figé) dans chaque worker du pool."""
+    global _shard_processor, _shard_miner
+    _shard_processor = processor
+    _shard_miner = template_miner
+
+
+def _parse_shard(file_path, bounds):
+    """
+    Parse un shard (regex, champs et masquage). Drain3 n'intervient qu'en
+    lecture seule, si un miner figé a été transmis au worker.
+    
+    Returns:
+        (nombre de lignes du shard, [(LineId local au shard, champs,
+        contenu masqué, cluster apparié ou None)])
+    """
+    start, end = bounds
+    processor = _shard_processor
+    
+    if processor.reader == 'mmap':
+        # Lecture du shard par batchs d'offsets sur le mmap
+        parsed = ((line_id, fields) for line_id, fields, _, _
+                  in processor._iter_entries_mmap(file_path, start, end))
+    else:
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        
+        lines = split_text_lines(data.decode('utf-8', errors='ignore'))
+        parsed = ((line_id, fields)
+                  for line_id, fields in enumerate(map(processor.parse_line, lines), start=1)
+                  if fields is not None)
+    
+    # Chaque ligne est masquée juste après son extraction (contenu masqué
+    # par fields_from_groups repris par mask_content)
+    content_index = processor.content_index
+    entries = []
+    for line_id, fields in parsed:
+        content = fields[content_index]
+        masked_content = processor.mask_content(content)
+        cluster_id = None
+        if _shard_miner is not None:
+            if masked_content is not None:
+                cluster = _shard_miner.drain.match(masked_content, 'never')
+            else:
+                cluster = _shard_miner.match(content)
+            if cluster is not None:
+                cluster_id = cluster.cluster_id
+        entries.append((line_id, fields, masked_content, cluster_id))
+    
+    num_lines = processor.lines_read if processor.reader == 'mmap' else len(lines)
+    return num_lines, entries
@@ -0,0 +1,179 @@
+"""
+Taille adaptative des batchs (parsing) et des chunks (vectorisation) selon
+la mémoire.
+
+Le gouverneur échantillonne le RSS du processus et ajuste la taille vers un
+budget (fraction de la limite mémoire du conteneur, lue dans le cgroup):
+  - RSS sous low (50% du budget): taille augmentée de 25% (jusqu'à max_size)
+  - RSS au-dessus de high (85%): taille divisée par deux (jusqu'à min_size),
+    et flush anticipé du batch en cours (should_flush, appelé toutes les
+    check_interval lignes)
+  - RSS au-dessus de critical (95%) à la taille minimale: gc.collect() puis
+    délestage (callbacks enregistrés par le job: vider le cache de
+    templates, déverser les sessions inactives...) plutôt qu'un OOM kill
+
+Les tailles choisies et les événements sont résumés par summary(),
+enregistré dans les métadonnées du cache (section 'memory_governor').
+"""
+import gc
+import os
+
+from metrics import current_rss_bytes
+
+# Fraction de la limite mémoire utilisée comme budget
+DEFAULT_BUDGET_FRACTION = 0.75
+
+# Seuils, en fraction du budget
+LOW_WATERMARK = 0.5
+HIGH_WATERMARK = 0.85
+CRITICAL_WATERMARK = 0.95
+
+# Limites cgroup v2 puis v1 (valeur énorme ou 'max' = pas de limite)
+CGROUP_LIMIT_FILES = ('/sys/fs/cgroup/memory.max',
+                      '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+
+def physical_memory_bytes():
+    """Mémoire physique de la machine, None si inconnue."""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def memory_limit_bytes():
+    """Limite mémoire du conteneur (cgroup), sinon mémoire physique."""
+    physical = physical_memory_bytes()
+    for path in CGROUP_LIMIT_FILES:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and (physical is None or int(value) < physical):
+            return int(value)
+    return physical
+
+
+def resolve_budget(budget_mb=0, fraction=DEFAULT_BUDGET_FRACTION):
+    """Budget en octets: budget_mb si > 0, sinon fraction de la limite mémoire."""
+    if budget_mb > 0:
+        return int(budget_mb * 1024 * 1024)
+    limit = memory_limit_bytes()
+    return int(limit * fraction) if limit else None
+
+
+class MemoryGovernor:
+    """Taille de batch adaptée au RSS, flush anticipé et délestage sous pression."""
+
+    def __init__(self, budget_bytes, initial_size, min_size=None, max_size=None,
+                 check_interval=None):
+        """
+        Args:
+            budget_bytes: Budget mémoire du processus (octets)
+            initial_size: Taille de départ (batch ou chunk, en lignes)
+            min_size: Taille minimale (défaut initial_size / 16)
+            max_size: Taille maximale (défaut 4 x initial_size)
+            check_interval: Lignes entre deux contrôles du RSS pendant un
+                batch (défaut min_size / 2)
+        """
+        self.budget = budget_bytes
+        self.initial_size = initial_size
+        self.min_size = min_size or max(initial_size // 16, 1000)
+        self.max_size = max_size or initial_size * 4
+        self.check_interval = check_interval or max(self.min_size // 2, 500)
+        self.size = initial_size
+
+        self.low = LOW_WATERMARK * budget_bytes
+        self.high = HIGH_WATERMARK * budget_bytes
+        self.critical = CRITICAL_WATERMARK * budget_bytes
+
+        self.relievers = []
+        self.smallest = self.largest = initial_size
+        self.peak_rss = 0
+        self.updates = 0
+        self.grows = 0
+        self.shrinks = 0
+        self.early_flushes = 0
+        self.relief_steps = {}
+
+    def add_reliever(self, name, callback):
+        """Délestage appelé sous pression critique, dans l'ordre d'enregistrement."""
+        self.relievers.append((name, callback))
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def _resize(self, size):
+        self.size = max(self.min_size, min(self.max_size, int(size)))
+        self.smallest = min(self.smallest, self.size)
+        self.largest = max(self.largest, self.size)
+
+    def should_flush(self):
+        """Contrôle en cours de batch: True s'il faut écrire le batch maintenant."""
+        rss = self._sample()
+        if rss <= self.high:
+            return False
+        self.early_flushes += 1
+        self._resize(self.size // 2)
+        return True
+
+    def update(self):
+        """
+        Après l'écriture d'un batch (ou le traitement d'un chunk): ajuste la
+        taille suivante et déleste si la pression reste critique.
+
+        Returns:
+            Taille du prochain batch
+        """
+        self.updates += 1
+        rss = self._sample()
+        if rss > self.high:
+            self.shrinks += 1
+            self._resize(self.size // 2)
+        elif rss < self.low and self.size < self.max_size:
+            self.grows += 1
+            self._resize(self.size * 1.25)
+
+        if rss > self.critical and self.size == self.min_size:
+            self._relieve()
+        return self.size
+
+    def _relieve(self):
+        gc.collect()
+        for name, callback in self.relievers:
+            if current_rss_bytes() <= self.critical:
+                break
+            callback()
+            self.relief_steps[name] = self.relief_steps.get(name, 0) + 1
+            gc.collect()
+
+    def summary(self):
+        """Résumé sérialisable en JSON (tailles choisies, événements, pic de RSS)."""
+        return {
+            'budget_mb': self.budget / 2**20,
+            'initial_size': self.initial_size,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'final_size': self.size,
+            'smallest_size': self.smallest,
+            'largest_size': self.largest,
+            'updates': self.updates,
+            'grows': self.grows,
+            'shrinks': self.shrinks,
+            'early_flushes': self.early_flushes,
+            'relief_steps': self.relief_steps,
+            'peak_rss_mb': self.peak_rss / 2**20
+        }
+
+
+def create_governor(initial_size, budget_mb=0, enabled=True, **kwargs):
+    """MemoryGovernor des scripts, None si désactivé ou budget inconnu."""
+    if not enabled:
+        return None
+    budget = resolve_budget(budget_mb)
+    if budget is None:
+        return None
+    return MemoryGovernor(budget, initial_size, **kwargs)
@@ -0,0 +1,226 @@
+"""
+Instrumentation légère du pipeline (parse, vectorize, analyze).
+
+Timers cumulés en nanosecondes et compteurs par étape, histogramme des
+latences de flush des batchs et RSS courant. Export au format texte
+Prometheus (fichier <job>.prom, pour le textfile collector de
+node_exporter, réécrit atomiquement à chaque flush) et résumé JSON
+(lignes/s, taux de lignes non parsées et de nouveaux templates),
+enregistré dans les métadonnées du CacheManager.
+
+Désactivé, un PipelineMetrics n'enregistre rien: les appels restent en
+place dans les scripts, et la boucle de parsing n'est pas instrumentée.
+"""
+import os
+import time
+import resource
+from collections import defaultdict
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'logpipeline'
+
+# Bornes (s) de l'histogramme des latences de flush
+FLUSH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes():
+    """RSS courant (/proc), sinon pic de RSS (getrusage)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Ko sous Linux, octets sous macOS
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes (format Prometheus)."""
+
+    def __init__(self, buckets=FLUSH_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(borne, nombre d'observations <= borne)], +Inf inclus."""
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((float('inf'), self.count))
+        return result
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{str(value)}"' for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+class PipelineMetrics:
+    """Timers, compteurs, jauges et histogrammes d'un job du pipeline."""
+
+    def __init__(self, job, textfile_dir=None, enabled=True):
+        """
+        Args:
+            job: Nom du job (label job, nom du fichier .prom)
+            textfile_dir: Dossier du fichier <job>.prom (None = pas d'export)
+            enabled: False pour tout ignorer (coût nul hors appels)
+        """
+        self.job = job
+        self.enabled = enabled
+        self.textfile = (os.path.join(textfile_dir, f"{job}.prom")
+                         if textfile_dir and enabled else None)
+        self.timers = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.histograms = {}
+        self.started_ns = time.perf_counter_ns()
+
+        if self.textfile:
+            os.makedirs(textfile_dir, exist_ok=True)
+
+    def add_time(self, stage, elapsed_ns):
+        if self.enabled:
+            self.timers[stage] += elapsed_ns
+
+    @contextmanager
+    def time(self, stage):
+        """Chronomètre un bloc: with metrics.time('write'): ..."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.timers[stage] += time.perf_counter_ns() - start
+
+    def timed_iter(self, stage, iterable):
+        """Itère en cumulant dans stage le temps passé à produire chaque élément."""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        clock = time.perf_counter_ns
+        timers = self.timers
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                timers[stage] += clock() - start
+                return
+            timers[stage] += clock() - start
+            yield item
+
+    def inc(self, name, value=1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=FLUSH_BUCKETS):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def elapsed(self):
+        return (time.perf_counter_ns() - self.started_ns) / 1e9
+
+    def summary(self):
+        """Résumé sérialisable en JSON (secondes par étape, débits, taux)."""
+        elapsed = self.elapsed()
+        lines = self.counters.get('lines', 0)
+        summary = {
+            'job': self.job,
+            'elapsed_sec': elapsed,
+            'stages_sec': {stage: ns / 1e9 for stage, ns in sorted(self.timers.items())},
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'rss_bytes': current_rss_bytes(),
+            'histograms': {name: {'count': h.count, 'sum': h.sum,
+                                  'buckets': {_format_value(b): c for b, c in h.cumulative()}}
+                           for name, h in self.histograms.items()}
+        }
+        if lines:
+            summary['lines_per_sec'] = lines / elapsed if elapsed else 0.0
+            summary['unparsed_rate'] = self.counters.get('unparsed_lines', 0) / lines
+            summary['new_template_rate'] = self.counters.get('new_templates', 0) / lines
+        return summary
+
+    def to_prometheus(self):
+        """Exposition au format texte Prometheus."""
+        job = {'job': self.job}
+        out = []
+
+        def metric(name, kind, help_text, samples):
+            out.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            out.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                out.append(f"{METRIC_PREFIX}_{name}{suffix}{_format_labels(labels)} "
+                           f"{_format_value(value)}")
+
+        metric('stage_seconds_total', 'counter', "Temps cumulé par étape",
+               [('', dict(job, stage=stage), ns / 1e9)
+                for stage, ns in sorted(self.timers.items())])
+        for name, value in sorted(self.counters.items()):
+            metric(f"{name}_total", 'counter', f"Compteur {name}", [('', job, value)])
+
+        summary = self.summary()
+        gauges = dict(self.gauges, elapsed_seconds=summary['elapsed_sec'],
+                      rss_bytes=summary['rss_bytes'])
+        for key in ('lines_per_sec', 'unparsed_rate', 'new_template_rate'):
+            if key in summary:
+                gauges[key] = summary[key]
+        for name, value in sorted(gauges.items()):
+            metric(name, 'gauge', f"Jauge {name}", [('', job, value)])
+
+        for name, histogram in sorted(self.histograms.items()):
+            samples = [('_bucket', dict(job, le=_format_value(bound)), count)
+                       for bound, count in histogram.cumulative()]
+            samples += [('_sum', job, histogram.sum), ('_count', job, histogram.count)]
+            metric(name, 'histogram', f"Histogramme {name}", samples)
+
+        return '\n'.join(out) + '\n'
+
+    def export(self):
+        """Réécrit le fichier .prom (remplacement atomique pour le collector)."""
+        if not self.textfile:
+            return
+        tmp_path = self.textfile + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, self.textfile)
+
+    def publish(self, cache_manager=None):
+        """Fin de job: export .prom et résumé JSON dans les métadonnées du cache."""
+        if not self.enabled:
+            return
+        self.export()
+        if cache_manager is not None:
+            cache_manager.save_metrics(self.job, self.summary())
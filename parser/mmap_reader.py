@@ -0,0 +1,147 @@
+"""
+Lecture des logs par mmap, au niveau des octets.
+
+Les fins de ligne sont repérées par numpy sur des blocs du fichier mappé
+(sans copie) et servies par batchs d'offsets (début, fin). Chaque bloc est
+décodé en une fois, puis la regex du processeur est appliquée ligne par
+ligne sur les offsets du bloc (fullmatch(texte, début, fin)): pas de découpage
+ni de strip() par ligne, les champs sont des tranches du bloc.
+
+Les lignes que la regex ne traite pas à l'identique du chemin texte
+(vides, espaces ou caractère non-ASCII en bord de ligne, pas de match)
+sont signalées pour repasser par parse_line.
+"""
+import re
+import mmap
+import numpy as np
+
+
+# Taille d'un bloc scanné pour les fins de ligne (un batch par bloc)
+BLOCK_SIZE = 8 * 1024 * 1024
+
+# Fin de ligne comme la lecture texte: '\n' (le '\r' d'un '\r\n' reste en fin
+# de contenu, retiré par strip()) ou '\r' isolé, toujours un seul octet
+LINE_END_BYTES = re.compile(rb'\r(?!\n)|\n')
+LINE_END_TEXT = re.compile(r'\r(?!\n)|\n')
+
+
+def compile_line_pattern(pattern):
+    """
+    Version sans ancres d'une regex de ligne '^...$', appliquée par
+    fullmatch(texte, début, fin) sur les offsets du bloc.
+    """
+    source = pattern.pattern
+    if source.startswith('^'):
+        source = source[1:]
+    if source.endswith('$') and not source.endswith('\\$'):
+        source = source[:-1]
+    return re.compile(source, pattern.flags)
+
+
+def open_mmap(f):
+    """mmap en lecture seule d'un fichier ouvert en binaire (None si vide)."""
+    if f.seek(0, 2) == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_line_batches(mm, start=0, end=None, block_size=BLOCK_SIZE):
+    """
+    Découpe [start, end) en lignes, un batch par bloc de block_size octets.
+
+    Yields:
+        (starts, ends): tableaux numpy des offsets de chaque ligne, fin
+        exclue et fin de ligne ('\\n' ou '\\r' isolé) non comprise. La
+        dernière ligne peut ne pas avoir de fin de ligne.
+    """
+    end = len(mm) if end is None else end
+    data = np.frombuffer(mm, dtype=np.uint8)
+    position = start
+
+    try:
+        while position < end:
+            block_end = min(position + block_size, end)
+            ends = np.flatnonzero(data[position:block_end] == 0x0A) + position
+            returns = np.flatnonzero(data[position:block_end] == 0x0D) + position
+            if len(returns):
+                # '\r' isolé: l'octet suivant (dans le fichier) n'est pas '\n'
+                following = data[np.minimum(returns + 1, len(data) - 1)]
+                ends = np.union1d(ends, returns[following != 0x0A])
+
+            if block_end == end:
+                if not len(ends) or ends[-1] + 1 < end:
+                    ends = np.append(ends, end)
+            elif not len(ends):
+                # Ligne plus longue qu'un bloc
+                line_end = LINE_END_BYTES.search(mm, block_end, end)
+                ends = np.array([line_end.start() if line_end is not None else end])
+
+            starts = np.empty_like(ends)
+            starts[0] = position
+            starts[1:] = ends[:-1] + 1
+
+            yield starts, ends
+            position = int(ends[-1]) + 1
+    finally:
+        # Libérer la vue numpy avant la fermeture du mmap
+        del data
+
+
+def decode_batch(mm, starts, ends):
+    """
+    Décode le bloc d'un batch en une fois.
+
+    Returns:
+        (texte, débuts, fins): offsets des lignes dans le texte décodé
+        (identiques aux offsets octets, décalés, si le bloc est ASCII)
+    """
+    block_start = int(starts[0])
+    with memoryview(mm)[block_start:int(ends[-1])] as block:
+        text = str(block, 'utf-8', 'ignore')
+
+    if text.isascii():
+        return text, (starts - block_start).tolist(), (ends - block_start).tolist()
+
+    # Caractères multi-octets: offsets recalculés sur le texte
+    line_starts, line_ends = [], []
+    position = 0
+    lines = LINE_END_TEXT.split(text)
+    if len(lines) > len(starts):
+        # '\r' final suivi du '\n' hors du bloc: fin de contenu, pas de ligne
+        lines.pop()
+        lines[-1] += '\r'
+    for line in lines:
+        line_starts.append(position)
+        position += len(line)
+        line_ends.append(position)
+        position += 1
+
+    return text, line_starts, line_ends
+
+
+def extract_batch(text, starts, ends, pattern):
+    """
+    Applique la regex (compile_line_pattern) à chaque ligne d'un batch.
+
+    Returns:
+        Liste alignée sur le batch: tuple des groupes, ou None si la ligne
+        doit passer par le chemin texte
+    """
+    match = pattern.fullmatch
+    results = []
+
+    for start, end in zip(starts, ends):
+        if start == end:
+            results.append(None)
+            continue
+
+        # Bord de ligne que strip() pourrait retirer
+        first, last = text[start], text[end - 1]
+        if first <= ' ' or last <= ' ' or first > '\x7f' or last > '\x7f':
+            results.append(None)
+            continue
+
+        matched = match(text, start, end)
+        results.append(matched.groups() if matched is not None else None)
+
+    return results
@@ -3,6 +3,8 @@ import sys
 sys.path.insert(0, '/app/parser')
 
 from log_processor import LogProcessor
+from structured_io import iter_structured_chunks
+from aggregation_sink import print_parsing_stats
 
 
 class OpenStackLogProcessor(LogProcessor):
@@ -19,48 +21,34 @@ class OpenStackLogProcessor(LogProcessor):
         r'(.*)$'                                   # Content
     )
     
+    # Filename est très répétitif: encodé en dictionnaire en parquet/arrow
+    DICTIONARY_COLUMNS = LogProcessor.DICTIONARY_COLUMNS + ('Filename',)
+    
     # Pattern pour extraire InstanceId
     INSTANCE_ID_PATTERN = re.compile(r'\[instance:\s+([\w\-]+)\]')
     
     def get_log_pattern(self):
         return self.LOG_PATTERN
     
-    def extract_fields(self, line, match):
-        """Extrait les champs d'une ligne parsée."""
-        filename, timestamp, pid, level, component, request_id, content = match.groups()
+    def fields_from_groups(self, groups):
+        """Champs à partir des groupes de LOG_PATTERN."""
+        filename, timestamp, pid, level, component, request_id, content = groups
         
         # Extraire InstanceId si présent
         instance_match = self.INSTANCE_ID_PATTERN.search(content)
         instance_id = instance_match.group(1) if instance_match else None
         
-        return {
-            'Filename': filename,
-            'Timestamp': timestamp,
-            'Pid': pid,
-            'Level': level,
-            'Component': component,
-            'RequestId': request_id if request_id else '',
-            'Content': content,
-            'InstanceId': instance_id
-        }
+        # Fichier, niveau et composant répétés: une seule chaîne par valeur
+        return (sys.intern(filename), timestamp, pid, sys.intern(level), sys.intern(component),
+                request_id if request_id else '', content, instance_id)
     
-    def create_unparsed_entry(self, line, line_id):
-        """Crée une entrée pour ligne non parsée."""
+    def unparsed_fields(self, line):
+        """Champs d'une ligne non parsée."""
         # Tenter d'extraire InstanceId même si ligne mal formée
         instance_match = self.INSTANCE_ID_PATTERN.search(line)
         instance_id = instance_match.group(1) if instance_match else None
         
-        return {
-            'LineId': line_id,
-            'Filename': '',
-            'Timestamp': '',
-            'Pid': '',
-            'Level': '',
-            'Component': '',
-            'RequestId': '',
-            'Content': line,
-            'InstanceId': instance_id
-        }
+        return ('', '', '', '', '', '', line, instance_id)
     
     def get_column_order(self):
         return [
@@ -68,21 +56,28 @@ class OpenStackLogProcessor(LogProcessor):
             'RequestId', 'Content', 'InstanceId', 'EventId', 'EventTemplate'
         ]
     
-    def get_statistics_with_instances(self, total_lines, df_templates, structured_path):
+    def get_statistics_with_instances(self, total_lines, df_templates, structured_path,
+                                      stats_collector=None):
+        """
+        Statistiques OpenStack avec InstanceIDs. Si stats_collector est
+        fourni, le fichier structuré n'est pas relu.
+        """
         
         # Stats de base
         self.get_statistics(total_lines, df_templates)
         
+        if stats_collector is not None:
+            print()
+            print_parsing_stats(stats_collector.get_summary())
+            return
+        
         instance_count = 0
         unique_instances = set()
         
-        import csv
-        with open(structured_path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['InstanceId']:
-                    instance_count += 1
-                    unique_instances.add(row['InstanceId'])
+        for chunk in iter_structured_chunks(structured_path, columns=['InstanceId']):
+            instance_ids = chunk['InstanceId'].dropna()
+            instance_count += len(instance_ids)
+            unique_instances.update(instance_ids)
         
         print(f"  - Lignes avec InstanceID: {instance_count:,}")
         print(f"  - InstanceIDs uniques: {len(unique_instances):,}")
\ No newline at end of file
@@ -4,14 +4,23 @@ Parser 3 fichiers: normal1, normal2, abnormal
 """
 import os
 import sys
+import glob
 import traceback
 import shutil
+import tempfile
 import datetime
 
 sys.path.insert(0, '/app/parser')
 
 from cache_manager import CacheManager
+from metrics import PipelineMetrics
+from memory_governor import create_governor
+from structured_io import structured_file_name
+from aggregation_sink import SessionCountSink, ParsingStatsCollector, print_parsing_stats
+from log_processor import find_complete_end
+from compressed_input import find_log_source, is_compressed
 from openstack.openstack_processor import OpenStackLogProcessor
+from profiling import parse_profile_args, run_profiled
 
 # Configuration
 INPUT_DIR = '/data/openstack/raw/'
@@ -25,87 +34,291 @@ LOG_FILES = [
     'openstack_abnormal.log'
 ]
 
+# Nombre de processus pour l'extraction regex (1 = séquentiel)
+NUM_WORKERS = int(os.environ.get('PARSER_WORKERS', '1'))
+
+# Mode "apprendre puis apparier": taille du préfixe d'apprentissage Drain3
+# (0 = désactivé, toutes les lignes passent par add_log_message)
+LEARN_LINES = int(os.environ.get('PARSER_LEARN_LINES', '0'))
+
+# Lecteur de lignes: text (ligne à ligne) ou mmap (batchs d'offsets sur le mmap)
+READER = os.environ.get('PARSER_READER', 'text')
+
+# Taille du cache contenu masqué -> template devant Drain3 (0 = désactivé)
+TEMPLATE_CACHE_SIZE = int(os.environ.get('PARSER_TEMPLATE_CACHE', '0'))
+
+# Format des logs structurés: csv, parquet ou arrow
+STRUCTURED_FORMAT = os.environ.get('STRUCTURED_FORMAT', 'csv')
+
+# Mode fusionné: matrice d'occurrences construite pendant le parsing
+FUSED_MATRIX = os.environ.get('PARSER_FUSED_MATRIX', '0') == '1'
+# Écriture des logs structurés (désactivable si seule la matrice est utile)
+WRITE_STRUCTURED = os.environ.get('PARSER_WRITE_STRUCTURED', '1') == '1'
+
+# Écriture des logs structurés en arrière-plan avec ce nombre de batchs en
+# vol (>= 2, double buffering), pendant que le parsing continue (0 = synchrone)
+WRITE_BUFFERS = int(os.environ.get('PARSER_WRITE_BUFFERS', '0'))
+# thread, ou process (DataFrame et sérialisation CSV hors GIL, coût du pickle)
+WRITE_MODE = os.environ.get('PARSER_WRITE_MODE', 'thread')
+
+# Mode incrémental: fichiers en append-only, seule la fin est parsée
+# (état Drain3 et compteurs sauvegardés dans STATE_DIR, pas d'archivage)
+INCREMENTAL = os.environ.get('PARSER_INCREMENTAL', '0') == '1'
+
+COUNTS_STATE_NAME = 'OpenStack_session_counts'
+
+# Métriques: temps par étape et compteurs, fichier Prometheus parse_openstack.prom
+# dans METRICS_DIR et résumé JSON dans les métadonnées du cache
+PIPELINE_METRICS = os.environ.get('PIPELINE_METRICS', '0') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '/data/openstack/metrics/')
+
+# Gouverneur mémoire (1 pour activer): taille des batchs adaptée au RSS, flush
+# anticipé et délestage sous pression (budget en Mo, 0 = 75% de la limite du
+# conteneur)
+MEMORY_GOVERNOR = os.environ.get('MEMORY_GOVERNOR', '0') == '1'
+MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', '0'))
+
+# Profils (--profile): piles repliées et rapports des fonctions chaudes
+PROFILE_DIR = '/data/openstack/analysis/profiles/'
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(STATE_DIR, exist_ok=True)
 os.makedirs(ARCHIVE_DIR, exist_ok=True)
 
-def parse_single_file(file_name, processor, cache_manager):
-    """Parse un fichier de log."""
+def stats_state_path(file_name):
+    """Compteurs de parsing d'un fichier (mode incrémental)."""
+    return os.path.join(STATE_DIR, file_name.replace('.log', '_parsing_stats.json'))
+
+def parse_single_file(file_name, processor, cache_manager, instance_sink=None,
+                      incremental=None, metrics=None, governor=None):
+    """
+    Parse un fichier de log.
+    
+    Args:
+        incremental: Résultat de check_incremental (mode, raison, entrée)
+            en mode incrémental, None sinon
+        metrics: PipelineMetrics du job (cumulé sur les fichiers)
+        governor: MemoryGovernor du job (taille des batchs conservée entre fichiers)
+    """
     
     print(f"\n{'='*80}")
     print(f" FICHIER: {file_name}")
     print(f"{'='*80}")
     
-    needs_parsing, reason = cache_manager.check_cache(
-        file_name, INPUT_DIR, OUTPUT_DIR
-    )
+    if incremental is None:
+        mode, cache_entry = 'full', None
+        needs_parsing, reason = cache_manager.check_cache(
+            file_name, INPUT_DIR, OUTPUT_DIR
+        )
+    else:
+        mode, reason, cache_entry = incremental
+        needs_parsing = mode != 'skip'
     
     if not needs_parsing:
+        print(f"\n {reason}")
         metadata = cache_manager.load_metadata()
         if file_name in metadata:
             info = metadata[file_name]
             print(f"\n Statistiques:")
             print(f"  - Lignes: {info['num_lines']:,}")
             print(f"  - Templates: {info['num_templates']}")
+            if 'parsing_stats' in info:
+                print_parsing_stats(info['parsing_stats'])
         return None
     
-    file_path = os.path.join(INPUT_DIR, file_name)
+    # Fichier brut, .gz/.zst ou membre d'une archive (OpenStack.tar.gz)
+    file_path, member = find_log_source(INPUT_DIR, file_name)
     
-    if not os.path.exists(file_path):
-        print(f" ERREUR: {file_path} introuvable")
+    if file_path is None:
+        print(f" ERREUR: {file_name} introuvable dans {INPUT_DIR}")
         return None
     
-    # Taille
+    # Taille (de l'archive pour une source compressée)
     size_mb = os.path.getsize(file_path) / 1024 / 1024
     print(f" Taille: {size_mb:.2f} MB")
+    if is_compressed(file_path):
+        print(f" Source compressée: {os.path.basename(file_path)}"
+              f"{' -> ' + member if member else ''}")
     
     # Output
-    output_name = file_name.replace('.log', '_structured.csv')
+    output_name = structured_file_name(file_name.replace('.log', '_structured'),
+                                       STRUCTURED_FORMAT)
     output_path = os.path.join(OUTPUT_DIR, output_name)
     
+    stats_collector = ParsingStatsCollector('InstanceId')
+    sinks = [stats_collector]
+    if instance_sink is not None:
+        from openstack.vectorize_openstack import PARSED_FILES
+        instance_sink.set_label(dict(PARSED_FILES).get(file_name.replace('.log', '_structured')))
+        sinks.append(instance_sink)
+    
+    # Mode incrémental: plage à parser et reprise des compteurs du fichier
+    start_offset, start_line_id, end_offset = 0, 0, None
+    if incremental is not None:
+        end_offset = find_complete_end(file_path)
+    if mode == 'delta':
+        start_offset = cache_entry['byte_offset']
+        start_line_id = cache_entry['raw_lines']
+        if end_offset <= start_offset:
+            print(f" Pas de nouvelle ligne complète, skip")
+            return None
+        stats_collector.load_state(stats_state_path(file_name))
+        print(f" Reprise: {start_line_id:,} lignes déjà parsées")
+    
+    # Hash du préfixe continué sur la plage parsée (pas de relecture)
+    prefix_hasher = (cache_manager.prefix_hasher(file_path, start_offset)
+                     if incremental is not None else None)
     total_lines = processor.parse_and_save_streaming(
         file_path=file_path,
-        output_path=output_path,
+        output_path=output_path if WRITE_STRUCTURED else None,
         batch_size=50000,
-        progress_interval=20000
+        progress_interval=20000,
+        num_workers=NUM_WORKERS,
+        learn_lines=LEARN_LINES,
+        output_format=STRUCTURED_FORMAT,
+        sinks=sinks,
+        start_offset=start_offset,
+        end_offset=end_offset,
+        start_line_id=start_line_id,
+        append=mode == 'delta',
+        member=member,
+        reader=READER,
+        metrics=metrics,
+        governor=governor,
+        write_buffers=WRITE_BUFFERS,
+        write_mode=WRITE_MODE,
+        prefix_hasher=prefix_hasher
     )
     
-    print(f"\n {output_name}")
+    if WRITE_STRUCTURED:
+        print(f"\n {output_name}")
+    
+    print(f"\n Statistiques:")
+    print_parsing_stats(stats_collector.get_summary())
     
     # Cache
-    stats = {'num_lines': total_lines, 'num_templates': len(processor.template_miner.drain.clusters)}
-    cache_manager.update_cache(file_name, file_path, stats)
+    stats = {
+        'num_lines': stats_collector.num_lines,
+        'num_templates': len(processor.template_miner.drain.clusters),
+        'parsing_stats': stats_collector.get_summary()
+    }
+    if processor.writer_stats is not None:
+        stats['writer_stats'] = processor.writer_stats
     
-    # Archiver
-    archive_name = f"{file_name}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-    archive_path = os.path.join(ARCHIVE_DIR, archive_name)
-    try:
-        shutil.move(file_path, archive_path)
-        print(f" Fichier archivé: {archive_name}")
-    except Exception:
-        print(f"Echec archivage:\n{traceback.format_exc()}")
+    if incremental is not None:
+        # État pour le prochain parsing incrémental (le fichier reste dans /raw/)
+        processor.save_template_state(cache_manager.template_state_file)
+        stats_collector.save_state(stats_state_path(file_name))
+        if instance_sink is not None:
+            event_ids = processor.create_templates_dataframe()['EventId'].tolist()
+            instance_sink.save_state(STATE_DIR, COUNTS_STATE_NAME, event_ids)
+        stats['byte_offset'] = processor.end_offset
+        stats['raw_lines'] = processor.lines_read
+        stats['prefix_hash'] = processor.prefix_hash
+        cache_manager.update_cache(file_name, file_path, stats)
+        print(f" Position sauvegardée: octet {processor.end_offset:,}, "
+              f"ligne {processor.lines_read:,}")
+    else:
+        # Hash calculé pendant la lecture: pas de seconde passe sur le fichier
+        if processor.file_hash is not None:
+            cache_manager.remember_file_hash(file_path, processor.file_hash, member=member)
+        cache_manager.update_cache(file_name, file_path, stats, member=member)
+        
+        # Archiver (une archive multi-fichiers reste dans /raw/ pour les
+        # autres fichiers, son empreinte évite le reparsing)
+        if member is None:
+            archive_name = (f"{os.path.basename(file_path)}_"
+                            f"{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
+            archive_path = os.path.join(ARCHIVE_DIR, archive_name)
+            try:
+                shutil.move(file_path, archive_path)
+                print(f" Fichier archivé: {archive_name}")
+            except Exception:
+                print(f"Echec archivage:\n{traceback.format_exc()}")
     
     print(f" Cache mis à jour")
     
     return total_lines
 
-def main():
-    """Fonction principale."""
+def main(collect_sessions=False):
+    """
+    Fonction principale.
+    
+    Args:
+        collect_sessions: Compter les événements par InstanceId pendant le
+            parsing pour la vectorisation en mémoire (pipeline.py), hors
+            mode incrémental
+    
+    Returns:
+        Artefacts pour les étapes suivantes ({'templates', 'session_events',
+        'session_labels', 'matrix'}), None si aucun fichier n'est parsé
+    """
     
     try:
         print("="*80)
         print("="*80)
         
         # Initialiser
-        processor = OpenStackLogProcessor(config_file='drain.ini')
+        processor = OpenStackLogProcessor(config_file='drain.ini',
+                                          template_cache_size=TEMPLATE_CACHE_SIZE)
         cache_manager = CacheManager(STATE_DIR)
+        metrics = PipelineMetrics('parse_openstack', METRICS_DIR, enabled=PIPELINE_METRICS)
+        governor = create_governor(50000, MEMORY_BUDGET_MB, enabled=MEMORY_GOVERNOR)
+        if governor is not None:
+            governor.add_reliever('template_cache', processor.release_memory)
+        
+        # Mode incrémental: reprise seulement si aucun fichier n'exige un
+        # parsing complet (les templates Drain3 sont partagés entre fichiers)
+        incremental_checks = dict.fromkeys(LOG_FILES)
+        resumed = False
+        incremental = INCREMENTAL
+        if incremental and WRITE_STRUCTURED and STRUCTURED_FORMAT != 'csv':
+            print(f"\n ⚠️ Mode incrémental non supporté en {STRUCTURED_FORMAT}, "
+                  f"parsing complet")
+            incremental = False
+        if incremental and any(is_compressed(find_log_source(INPUT_DIR, file_name)[0] or '')
+                               for file_name in LOG_FILES):
+            print(f"\n ⚠️ Mode incrémental non supporté pour une source compressée, "
+                  f"parsing complet")
+            incremental = False
+        
+        # Comptage par InstanceId pendant le parsing (mode fusionné, ou comptages
+        # passés en mémoire à la vectorisation par l'orchestrateur)
+        instance_sink = (SessionCountSink('InstanceId')
+                         if FUSED_MATRIX or (collect_sessions and not incremental) else None)
+        
+        if incremental:
+            incremental_checks = {
+                file_name: cache_manager.check_incremental(file_name, INPUT_DIR)
+                for file_name in LOG_FILES
+            }
+            counts_path = os.path.join(STATE_DIR, COUNTS_STATE_NAME + '.npz')
+            resumed = (
+                all(check[0] != 'full' for check in incremental_checks.values()) and
+                all(os.path.exists(stats_state_path(file_name))
+                    for file_name, check in incremental_checks.items() if check[0] == 'delta') and
+                (instance_sink is None or os.path.exists(counts_path))
+            )
+            
+            if resumed:
+                processor.load_template_state(cache_manager.template_state_file)
+                if instance_sink is not None:
+                    instance_sink.load_state(STATE_DIR, COUNTS_STATE_NAME)
+                print(f"\n Reprise incrémentale: "
+                      f"{len(processor.template_miner.drain.clusters)} templates")
+            else:
+                incremental_checks = {
+                    file_name: ('full', " Parsing complet (mode incrémental)", None)
+                    for file_name in LOG_FILES
+                }
         
         total_all = 0
         parsed_files = []
         
         # Parser chaque fichier
         for file_name in LOG_FILES:
-            lines = parse_single_file(file_name, processor, cache_manager)
+            lines = parse_single_file(file_name, processor, cache_manager, instance_sink,
+                                      incremental_checks[file_name], metrics, governor)
             if lines:
                 total_all += lines
                 parsed_files.append(file_name)
@@ -115,9 +328,12 @@ def main():
         
         if parsed_files: 
             print(f"\n{'='*80}")
-            df_templates = processor.create_templates_dataframe()
-            df_templates.to_csv(templates_path, index=False)
+            with metrics.time('templates'):
+                df_templates = processor.create_templates_dataframe()
+                df_templates.to_csv(templates_path, index=False)
             print(f"OpenStack_templates.csv")
+            # État Drain3 pour la détection en continu (detect_openstack.py)
+            processor.save_template_state(cache_manager.template_state_file)
             
             print(f"\n{'='*80}")
             print("PARSING OPENSTACK TERMINÉ")
@@ -128,9 +344,51 @@ def main():
             print(f"\nTotal lignes: {total_all:,}")
             print(f"Templates uniques: {len(df_templates)}")
             print("="*80)
-        else:
-            print(f"\n Tous les fichiers déjà parsés (cache)")
-            print("="*80)
+            
+            # Comptages complets si tous les fichiers sont parsés (en reprise
+            # incrémentale, le sink contient déjà les fichiers inchangés)
+            session_events = instance_labels = df_matrix = None
+            if instance_sink is not None and (resumed or len(parsed_files) == len(LOG_FILES)):
+                from openstack.vectorize_openstack import etiqueter_instance
+                
+                session_events, instance_labels = instance_sink.session_events, {}
+                for instance_id, label in instance_sink.session_labels.items():
+                    etiqueter_instance(instance_id, label, instance_labels)
+            
+            # Matrice d'occurrences sans relire les fichiers structurés
+            if FUSED_MATRIX:
+                if session_events is not None:
+                    from openstack.vectorize_openstack import construire_et_sauvegarder_matrice
+                    
+                    with metrics.time('matrix'):
+                        _, df_matrix = construire_et_sauvegarder_matrice(
+                            session_events, instance_labels, df_templates['EventId'].tolist())
+                else:
+                    print(f"\n Mode fusionné: certains fichiers viennent du cache, "
+                          f"lancer vectorize_openstack.py pour la matrice")
+            
+            if governor is not None:
+                cache_manager.save_job_info('memory_governor', 'parse_openstack',
+                                            governor.summary())
+                print(f"Batchs: {governor.smallest:,} à {governor.largest:,} lignes, "
+                      f"{governor.early_flushes} flushs anticipés, "
+                      f"pic RSS {governor.peak_rss / 2**20:,.0f} Mo")
+            
+            if metrics.enabled:
+                metrics.publish(cache_manager)
+                print(f"Métriques: {metrics.textfile}")
+            
+            # Artefacts passés en mémoire aux étapes suivantes (pipeline.py)
+            return {
+                'templates': df_templates,
+                'session_events': session_events,
+                'session_labels': instance_labels,
+                'matrix': df_matrix
+            }
+        
+        print(f"\n Tous les fichiers déjà parsés (cache)")
+        print("="*80)
+        return None
         
     except Exception as e:
         print(f"\n Erreur:")
@@ -138,5 +396,50 @@ def main():
         raise
 
 
+def profiler_parsing(profiler, max_lines):
+    """
+    Parse un préfixe de chaque fichier sous profilage (processeur partagé
+    comme dans main): sorties dans un dossier temporaire, cache et
+    archivage inchangés. Un fichier déjà archivé est lu depuis l'archive.
+    """
+    processor = OpenStackLogProcessor(config_file='drain.ini',
+                                      template_cache_size=TEMPLATE_CACHE_SIZE)
+    
+    with tempfile.TemporaryDirectory(prefix='profile_') as tmp_dir:
+        for file_name in LOG_FILES:
+            file_path, member = find_log_source(INPUT_DIR, file_name)
+            if file_path is None:
+                archives = sorted(glob.glob(os.path.join(ARCHIVE_DIR, f"{file_name}_*")))
+                file_path = archives[-1] if archives else None
+            if file_path is None:
+                print(f" {file_name} introuvable dans {INPUT_DIR} ni {ARCHIVE_DIR}")
+                continue
+            print(f" Fichier: {file_path}{' -> ' + member if member else ''}")
+            
+            output_path = os.path.join(tmp_dir, structured_file_name(
+                file_name.replace('.log', '_structured'), STRUCTURED_FORMAT))
+            processor.parse_and_save_streaming(
+                file_path=file_path,
+                output_path=output_path if WRITE_STRUCTURED else None,
+                batch_size=50000,
+                progress_interval=20000,
+                num_workers=NUM_WORKERS,
+                learn_lines=LEARN_LINES,
+                output_format=STRUCTURED_FORMAT,
+                sinks=[ParsingStatsCollector('InstanceId')],
+                member=member,
+                reader=READER,
+                max_lines=max_lines,
+                profiler=profiler
+            )
+        
+        with profiler.stage('templates'):
+            processor.create_templates_dataframe()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    options = parse_profile_args()
+    if options.profile:
+        run_profiled('parse_openstack', profiler_parsing, options, PROFILE_DIR)
+    else:
+        main()
\ No newline at end of file
@@ -1,21 +1,82 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 from collections import Counter, defaultdict
 
+sys.path.insert(0, '/app/parser')
+
+from structured_io import iter_structured_chunks, resolve_structured_path
+from sparse_matrix import (build_csr_matrix, save_sparse_matrix, print_sparse_statistics,
+                           sparse_matrix_paths)
+from session_counts import SessionEventCounter, SessionTracker
+from time_windows import TimeWindowCounter, timestamp_seconds
+from artifact_cache import ArtifactCache
+from cache_manager import CacheManager
+from metrics import PipelineMetrics
+from memory_governor import create_governor
+from profiling import parse_profile_args, run_profiled
+
 
 # Configuration
 PARSED_DIR = '/data/openstack/parsed/'
 OUTPUT_DIR = '/data/openstack/vectorized/'
 RAW_DIR = '/data/openstack/raw/'
+STATE_DIR = '/data/openstack/state/'
+PARSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Format de la matrice: dense (CSV), sparse (CSR .npz) ou both
+MATRIX_FORMAT = os.environ.get('MATRIX_FORMAT', 'dense')
+
+# Agrégation par chunk: numpy (factorize + bincount) ou groupby (historique)
+VECTORIZE_ENGINE = os.environ.get('VECTORIZE_ENGINE', 'numpy')
+
+# Sessions sans événement depuis ce nombre de lignes déversées sur disque
+# (mémoire bornée par les sessions ouvertes, matrice identique), 0 = jamais
+# (défaut): tout reste en mémoire
+SESSION_MAX_GAP = int(os.environ.get('SESSION_MAX_GAP', '0'))
+
+# Fenêtres de la matrice: session (InstanceId), time (fenêtres de temps sur
+# Timestamp, toutes les lignes) ou both
+VECTORIZE_WINDOW = os.environ.get('VECTORIZE_WINDOW', 'session')
+
+# Fenêtres de temps (secondes): durée, avance entre deux fenêtres (0 = durée,
+# fenêtres fixes) et retard toléré des lignes désordonnées
+WINDOW_SECONDS = int(os.environ.get('WINDOW_SECONDS', '60'))
+WINDOW_STEP_SECONDS = int(os.environ.get('WINDOW_STEP_SECONDS', '0'))
+WINDOW_LATENESS_SECONDS = int(os.environ.get('WINDOW_LATENESS_SECONDS', '60'))
+
+# Cache d'artefacts (1 pour activer): matrice réutilisée si entrées, code et config inchangés
+ARTIFACT_CACHE = os.environ.get('ARTIFACT_CACHE', '0') == '1'
+
+# Gouverneur mémoire (1 pour activer): taille des chunks adaptée au RSS et
+# déversement des sessions sous pression (budget en Mo, 0 = 75% de la limite
+# du conteneur)
+MEMORY_GOVERNOR = os.environ.get('MEMORY_GOVERNOR', '0') == '1'
+MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', '0'))
+
+# Métriques: temps par étape, fichier Prometheus vectorize_openstack.prom dans METRICS_DIR
+PIPELINE_METRICS = os.environ.get('PIPELINE_METRICS', '0') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '/data/openstack/metrics/')
+
+# Profils (--profile): piles repliées et rapports des fonctions chaudes
+PROFILE_DIR = '/data/openstack/analysis/profiles/'
+
+# Code dont dépend la matrice (labels ANOMALY_INSTANCES inclus)
+CODE_FILES = ['openstack/vectorize_openstack.py', 'structured_io.py', 'sparse_matrix.py',
+              'session_counts.py', 'time_windows.py']
+
+TIME_WINDOW_FILE = 'OpenStack_time_window_matrix.csv'
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(STATE_DIR, exist_ok=True)
 
 
+# Noms sans extension: csv, parquet ou arrow (le plus récent)
 PARSED_FILES = [
-    ('openstack_normal1_structured.csv', 'Normal'),
-    ('openstack_normal2_structured.csv', 'Normal'),
-    ('openstack_abnormal_structured.csv', 'Anomaly')
+    ('openstack_normal1_structured', 'Normal'),
+    ('openstack_normal2_structured', 'Normal'),
+    ('openstack_abnormal_structured', 'Anomaly')
 ]
 
 # VM IDs avec anomalies (depuis anomaly_labels.txt)
@@ -41,20 +102,53 @@ def charger_templates():
     return df_templates
 
 
-def vectoriser_par_instance_streaming(all_event_ids):
+def etiqueter_instance(instance_id, default_label, instance_labels):
+    """Label d'une instance: liste d'anomalies connue, sinon premier fichier vu."""
+    if instance_id in ANOMALY_INSTANCES:
+        instance_labels[instance_id] = 'Anomaly'
+    elif instance_id not in instance_labels:
+        instance_labels[instance_id] = default_label
+
+
+def compter_chunk_groupby(chunk_with_instances, default_label, instance_events, instance_labels):
+    """Agrégation historique: un groupby + value_counts par InstanceId."""
+    for instance_id, group in chunk_with_instances.groupby('InstanceId'):
+        event_counts = group['EventId'].value_counts()
+        instance_events[instance_id].update(event_counts.to_dict())
+        etiqueter_instance(instance_id, default_label, instance_labels)
+
+
+# Lignes lues par chunk (taille initiale avec le gouverneur mémoire)
+CHUNK_SIZE = 100000
+
+
+def vectoriser_par_instance_streaming(all_event_ids, engine=None, metrics=None,
+                                      max_lines=None, profiler=None, governor=None):
     print(f"\nVectorisation par InstanceId")
     
-    instance_events = defaultdict(Counter)
+    engine = engine or VECTORIZE_ENGINE
+    
+    # Comptages: tableau numpy extensible, ou dictionnaire de Counters
+    if engine == 'numpy':
+        event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
+        if SESSION_MAX_GAP > 0:
+            instance_events = SessionTracker(event_ids_sorted, max_gap=SESSION_MAX_GAP)
+        else:
+            instance_events = SessionEventCounter(event_ids_sorted)
+    else:
+        instance_events = defaultdict(Counter)
+    if governor is not None and isinstance(instance_events, SessionTracker):
+        governor.add_reliever('evict_sessions', instance_events.release_memory)
     
     instance_labels = {}
     
-    chunk_size = 100000
     total_lines = 0
     files_processed = 0
     
     # Traiter chaque fichier
-    for filename, default_label in PARSED_FILES:
-        filepath = os.path.join(PARSED_DIR, filename)
+    for base_name, default_label in PARSED_FILES:
+        filepath = resolve_structured_path(PARSED_DIR, base_name)
+        filename = os.path.basename(filepath)
         
         if not os.path.exists(filepath):
             print(f"{filename} introuvable")
@@ -63,40 +157,150 @@ def vectoriser_par_instance_streaming(all_event_ids):
         print(f"\n  Traitement: {filename}")
         file_lines = 0
         
-        for chunk in pd.read_csv(filepath, chunksize=chunk_size):
+        chunks = iter_structured_chunks(filepath, columns=['InstanceId', 'EventId'],
+                                        chunksize=CHUNK_SIZE, governor=governor)
+        if metrics is not None:
+            chunks = metrics.timed_iter('read', chunks)
+        if profiler is not None:
+            chunks = profiler.wrap_iter('read', chunks)
+        
+        for chunk in chunks:
             chunk_with_instances = chunk[chunk['InstanceId'].notna()]
             
-            for instance_id, group in chunk_with_instances.groupby('InstanceId'):
-                event_counts = group['EventId'].value_counts()
-                instance_events[instance_id].update(event_counts.to_dict())
-                
-                if instance_id in ANOMALY_INSTANCES:
-                    instance_labels[instance_id] = 'Anomaly'
-                elif instance_id not in instance_labels:
-                    if default_label == 'Anomaly':
-                        instance_labels[instance_id] = 'Anomaly'
-                    else:
-                        instance_labels[instance_id] = default_label
+            if engine == 'numpy':
+                instance_ids = chunk_with_instances['InstanceId'].to_numpy()
+                if isinstance(instance_events, SessionTracker):
+                    # Position: numéro de ligne, fichiers mis bout à bout
+                    positions = (total_lines + 1 +
+                                 np.flatnonzero(chunk['InstanceId'].notna().to_numpy()))
+                    instance_events.add(instance_ids, chunk_with_instances['EventId'].to_numpy(),
+                                        positions)
+                else:
+                    instance_events.add(instance_ids, chunk_with_instances['EventId'].to_numpy())
+                for instance_id in pd.unique(instance_ids):
+                    etiqueter_instance(instance_id, default_label, instance_labels)
+            else:
+                compter_chunk_groupby(chunk_with_instances, default_label,
+                                      instance_events, instance_labels)
             
             file_lines += len(chunk)
             total_lines += len(chunk)
+            if governor is not None:
+                governor.update()
             
-            if file_lines % 500000 == 0:
+            if file_lines // 500000 > (file_lines - len(chunk)) // 500000:
                 print(f"    {file_lines:,} lignes...", flush=True)
+            if max_lines is not None and file_lines >= max_lines:
+                break
         
         print(f"{file_lines:,} lignes traitées")
         files_processed += 1
     
     print(f"\n{total_lines:,} lignes totales")
+    if metrics is not None:
+        metrics.inc('lines', total_lines)
     print(f"{len(instance_events):,} InstanceIDs uniques trouvés")
+    if isinstance(instance_events, SessionTracker):
+        print(f"{instance_events.peak_open:,} InstanceIDs ouverts au plus, "
+              f"{instance_events.num_spilled:,} déversés")
     print(f"{files_processed} fichiers traités")
     
     return instance_events, instance_labels
 
 
+def vectoriser_par_fenetre_temporelle(all_event_ids, output_path=None, metrics=None,
+                                      max_lines=None, profiler=None, governor=None):
+    """
+    Comptages par fenêtre de temps (Timestamp) de toutes les lignes, avec ou
+    sans InstanceId. Chaque fichier est un flux distinct (ses fenêtres
+    portent son nom et son label); les fenêtres complètes sont écrites en
+    flux dans output_path (None: calculées sans sauvegarde, profilage).
+    
+    Returns:
+        {fichier: résumé du TimeWindowCounter (fenêtres, lignes en retard...)}
+    """
+    print(f"\nVectorisation par fenêtre de temps")
+    
+    event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
+    
+    # Fichier temporaire remplacé à la fin: pas de matrice partielle
+    tmp_path = output_path + '.tmp' if output_path is not None else None
+    output = open(tmp_path, 'w') if tmp_path is not None else None
+    summaries = {}
+    
+    def ecrire(df_windows, base_name, default_label):
+        if output is None:
+            return
+        df_windows.insert(0, 'Source', base_name)
+        df_windows.insert(1, 'Label', default_label)
+        df_windows.to_csv(output, header=output.tell() == 0, index=False)
+    
+    try:
+        for base_name, default_label in PARSED_FILES:
+            filepath = resolve_structured_path(PARSED_DIR, base_name)
+            filename = os.path.basename(filepath)
+            
+            if not os.path.exists(filepath):
+                print(f"{filename} introuvable")
+                continue
+            
+            windows = TimeWindowCounter(event_ids_sorted, WINDOW_SECONDS, WINDOW_STEP_SECONDS,
+                                        WINDOW_LATENESS_SECONDS)
+            print(f"\n  Traitement: {filename} ({windows.window} s, pas de {windows.step} s, "
+                  f"retard toléré {windows.lateness} s)")
+            file_lines = 0
+            
+            chunks = iter_structured_chunks(filepath, columns=['Timestamp', 'EventId'],
+                                            chunksize=CHUNK_SIZE, governor=governor)
+            if metrics is not None:
+                chunks = metrics.timed_iter('read', chunks)
+            if profiler is not None:
+                chunks = profiler.wrap_iter('read', chunks)
+            
+            for chunk in chunks:
+                windows.add(timestamp_seconds(chunk['Timestamp']), chunk['EventId'].to_numpy())
+                ecrire(windows.drain(), base_name, default_label)
+                
+                file_lines += len(chunk)
+                if governor is not None:
+                    governor.update()
+                if max_lines is not None and file_lines >= max_lines:
+                    break
+            
+            windows.flush()
+            ecrire(windows.drain(), base_name, default_label)
+            
+            summary = windows.summary()
+            summaries[base_name] = summary
+            print(f"{summary['windows']:,} fenêtres non vides, {summary['late_events']:,} "
+                  f"lignes en retard ignorées, {summary['untimed_events']:,} sans timestamp")
+    finally:
+        if output is not None:
+            output.close()
+    if tmp_path is not None and not summaries:
+        os.remove(tmp_path)
+    elif tmp_path is not None:
+        os.replace(tmp_path, output_path)
+        print(f"\n Matrice par fenêtre de temps sauvegardée:")
+        print(f"   {output_path}")
+    
+    if metrics is not None:
+        metrics.set_gauge('time_windows', sum(s['windows'] for s in summaries.values()))
+        metrics.set_gauge('late_events', sum(s['late_events'] for s in summaries.values()))
+    
+    return summaries
+
+
 def creer_matrice(instance_events, instance_labels, all_event_ids):   
     event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
     
+    # Compteur vectorisé: matrice obtenue directement
+    if isinstance(instance_events, SessionEventCounter):
+        df_matrix = instance_events.to_dataframe(event_ids_sorted, 'InstanceId')
+        df_matrix.insert(1, 'Label', [instance_labels.get(i, 'Unknown')
+                                      for i in df_matrix['InstanceId']])
+        return df_matrix
+    
     rows = []
     
     for instance_id in sorted(instance_events.keys()):
@@ -155,21 +359,148 @@ def statistiques_matrice(df_matrix):
     print(f"\n{'='*80}")
 
 
-def main():
+def fichiers_entree():
+    """Entrées de la vectorisation (clé du cache d'artefacts)."""
+    return [
+        resolve_structured_path(PARSED_DIR, base_name) for base_name, _ in PARSED_FILES
+    ] + [
+        os.path.join(PARSED_DIR, 'OpenStack_templates.csv'),
+        os.path.join(PARSER_DIR, 'drain.ini')
+    ] + [os.path.join(PARSER_DIR, name) for name in CODE_FILES]
+
+
+def fichiers_sortie():
+    """Fichiers écrits par la vectorisation (selon MATRIX_FORMAT et VECTORIZE_WINDOW)."""
+    outputs = []
+    if VECTORIZE_WINDOW != 'time':
+        if MATRIX_FORMAT in ('sparse', 'both'):
+            outputs.extend(sparse_matrix_paths(OUTPUT_DIR, 'OpenStack_event_occurrence_matrix'))
+        if MATRIX_FORMAT != 'sparse':
+            outputs.append(os.path.join(OUTPUT_DIR, 'OpenStack_event_occurrence_matrix.csv'))
+    if VECTORIZE_WINDOW != 'session':
+        outputs.append(os.path.join(OUTPUT_DIR, TIME_WINDOW_FILE))
+    return outputs
+
+
+def config_cache():
+    """Configuration dont dépendent les sorties (clé du cache d'artefacts)."""
+    config = {'matrix_format': MATRIX_FORMAT}
+    if VECTORIZE_WINDOW != 'session':
+        config.update(window=VECTORIZE_WINDOW, window_seconds=WINDOW_SECONDS,
+                      window_step_seconds=WINDOW_STEP_SECONDS,
+                      window_lateness_seconds=WINDOW_LATENESS_SECONDS)
+    return config
+
+
+def main(df_templates=None, instance_events=None, instance_labels=None):
+    """
+    Fonction principale.
+    
+    Args:
+        df_templates: Templates passés en mémoire par l'orchestrateur
+            (pipeline.py), sinon lus dans PARSED_DIR
+        instance_events, instance_labels: Comptages et labels par InstanceId
+            du parsing (pipeline.py): les fichiers structurés ne sont pas relus
+    
+    Returns:
+        {'matrix': DataFrame dense ou None}, None si la matrice est restaurée
+        depuis le cache ou sans données
+    """
+
+    # Matrice déjà calculée pour ces entrées: restauration sans recalcul
+    if ARTIFACT_CACHE:
+        artifact_cache = ArtifactCache(STATE_DIR)
+        cache_key = artifact_cache.compute_key('vectorize_openstack', fichiers_entree(),
+                                               config_cache())
+        if artifact_cache.restore(cache_key) is not None:
+            print(f"\nEntrées inchangées, matrice restaurée depuis le cache ({cache_key})")
+            return None
 
-    df_templates = charger_templates()
     if df_templates is None:
-        return
+        df_templates = charger_templates()
+        if df_templates is None:
+            return None
     
     # Liste EventIds
     all_event_ids = df_templates['EventId'].tolist()
+    metrics = PipelineMetrics('vectorize_openstack', METRICS_DIR, enabled=PIPELINE_METRICS)
+    governor = create_governor(CHUNK_SIZE, MEMORY_BUDGET_MB, enabled=MEMORY_GOVERNOR)
     
-    # Vectoriser par InstanceId (streaming)
-    instance_events, instance_labels = vectoriser_par_instance_streaming(all_event_ids)
+    df_matrix = None
+    if VECTORIZE_WINDOW != 'time':
+        # Vectoriser par InstanceId (streaming), lecture des chunks incluse
+        if instance_events is None:
+            with metrics.time('vectorize'):
+                instance_events, instance_labels = vectoriser_par_instance_streaming(
+                    all_event_ids, metrics=metrics, governor=governor)
+        else:
+            print(f"\nComptages du parsing en mémoire: {len(instance_events):,} InstanceIDs")
+        
+        if not instance_events:
+            print("Aucune instance trouvée")
+            return None
+        metrics.set_gauge('sessions', len(instance_events))
+        
+        with metrics.time('matrix'):
+            _, df_matrix = construire_et_sauvegarder_matrice(instance_events, instance_labels,
+                                                             all_event_ids)
     
-    if not instance_events:
-        print("Aucune instance trouvée")
-        return
+    if VECTORIZE_WINDOW != 'session':
+        with metrics.time('time_windows'):
+            summaries = vectoriser_par_fenetre_temporelle(
+                all_event_ids, os.path.join(OUTPUT_DIR, TIME_WINDOW_FILE), metrics=metrics,
+                governor=governor)
+        if not summaries:
+            print("Aucun fichier structuré trouvé")
+            return None
+        CacheManager(STATE_DIR).save_job_info('time_windows', 'vectorize_openstack', summaries)
+    
+    if governor is not None and governor.updates:
+        CacheManager(STATE_DIR).save_job_info('memory_governor', 'vectorize_openstack',
+                                              governor.summary())
+    
+    if ARTIFACT_CACHE:
+        artifact_cache.store(cache_key, fichiers_sortie())
+    
+    metrics.publish(CacheManager(STATE_DIR))
+    return {'matrix': df_matrix}
+
+
+def sauvegarder_matrice_creuse(instance_events, instance_labels, all_event_ids):
+    """Matrice CSR construite depuis les Counters, sans passer par le dense."""
+    
+    event_ids_sorted = sorted(all_event_ids, key=lambda x: int(x[1:]))
+    matrix, instance_ids = build_csr_matrix(instance_events, event_ids_sorted)
+    
+    df_rows = pd.DataFrame({
+        'InstanceId': instance_ids,
+        'Label': [instance_labels.get(i, 'Unknown') for i in instance_ids]
+    })
+    
+    print_sparse_statistics(matrix, event_ids_sorted, 'InstanceID')
+    
+    output_path = save_sparse_matrix(OUTPUT_DIR, 'OpenStack_event_occurrence_matrix',
+                                     matrix, df_rows, event_ids_sorted)
+    
+    print(f"\n Matrice CSR sauvegardée:")
+    print(f"   {output_path} (+ _rows.csv, _columns.csv)")
+    
+    return output_path
+
+
+def construire_et_sauvegarder_matrice(instance_events, instance_labels, all_event_ids):
+    """
+    Matrice + statistiques, puis sauvegarde (selon MATRIX_FORMAT).
+    
+    Returns:
+        (chemin de la matrice, DataFrame dense ou None en sparse)
+    """
+    
+    if MATRIX_FORMAT in ('sparse', 'both'):
+        output_path = sauvegarder_matrice_creuse(instance_events, instance_labels,
+                                                 all_event_ids)
+        if MATRIX_FORMAT == 'sparse':
+            return output_path, None
     
     # Créer matrice
     df_matrix = creer_matrice(instance_events, instance_labels, all_event_ids)
@@ -184,9 +515,41 @@ def main():
     print(f"\n Matrice sauvegardée:")
     print(f"   {output_path}")
     print("="*80)
+    
+    return output_path, df_matrix
+
+
+def profiler_vectorisation(profiler, max_lines):
+    """
+    Vectorisation d'un préfixe de chaque fichier sous profilage, matrice
+    construite sans sauvegarde.
+    """
+    df_templates = charger_templates()
+    if df_templates is None:
+        return
+    all_event_ids = df_templates['EventId'].tolist()
+    
+    if VECTORIZE_WINDOW != 'time':
+        with profiler.stage('groupby'):
+            instance_events, instance_labels = vectoriser_par_instance_streaming(
+                all_event_ids, max_lines=max_lines, profiler=profiler)
+        with profiler.stage('matrix'):
+            if MATRIX_FORMAT == 'sparse':
+                build_csr_matrix(instance_events,
+                                 sorted(all_event_ids, key=lambda x: int(x[1:])))
+            else:
+                creer_matrice(instance_events, instance_labels, all_event_ids)
+    if VECTORIZE_WINDOW != 'session':
+        with profiler.stage('time_windows'):
+            vectoriser_par_fenetre_temporelle(all_event_ids, max_lines=max_lines,
+                                              profiler=profiler)
 
 
 if __name__ == "__main__":
-    main()
+    options = parse_profile_args()
+    if options.profile:
+        run_profiled('vectorize_openstack', profiler_vectorisation, options, PROFILE_DIR)
+    else:
+        main()
     
   
\ No newline at end of file
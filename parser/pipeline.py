@@ -0,0 +1,241 @@
+"""
+Orchestrateur du pipeline en un seul processus: parse -> vectorize -> analyze.
+
+Les étapes forment un DAG (Stage: nom, fonction, dépendances). Chaque étape
+reçoit les artefacts de ses dépendances en mémoire: templates et comptages
+par session du parsing pour la vectorisation (ni relecture des templates
+ni du fichier structuré), matrice dense pour l'analyse (pas de relecture du
+CSV). pandas et les scripts ne sont importés qu'une fois.
+
+Une étape dont les entrées sont inchangées est sautée par les mécanismes
+des scripts: empreinte du log pour le parsing (parsing_metadata.json),
+cache d'artefacts pour vectorize et analyze (ARTIFACT_CACHE=1). Sans
+artefact en mémoire (étape précédente sautée), l'étape lit les fichiers
+comme le script seul.
+
+Les étapes sans dépendance entre elles (jeux hdfs et openstack demandés
+ensemble) s'exécutent en parallèle, dans un pool de PIPELINE_WORKERS
+threads. Statut, début et durée de chaque étape sont écrits dans le
+manifeste <STATE_DIR>/pipeline_manifest.json du jeu.
+
+Usage: python -m parser.pipeline hdfs [openstack]   (depuis la racine)
+       python pipeline.py hdfs                       (depuis /app/parser)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Étapes indépendantes exécutées en même temps (threads)
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', '2'))
+
+MANIFEST_NAME = 'pipeline_manifest.json'
+DATASETS = ('hdfs', 'openstack')
+
+
+class Stage:
+    """Étape du DAG: func(entrées) avec entrées = {dépendance: artefact}."""
+
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+def _describe(artifact):
+    """Résumé d'un artefact pour le manifeste (type et taille)."""
+    shape = getattr(artifact, 'shape', None)
+    if shape is not None:
+        return f"{type(artifact).__name__} {'x'.join(str(n) for n in shape)}"
+    if hasattr(artifact, '__len__') and not isinstance(artifact, str):
+        return f"{type(artifact).__name__} ({len(artifact):,})"
+    return str(artifact)
+
+
+def _run_stage(stage, inputs, origin):
+    """Exécute une étape. Returns: (entrée du manifeste, artefact)."""
+    start = time.perf_counter()
+    entry = {'started': round(start - origin, 3)}
+    artifact = None
+    try:
+        artifact = stage.func(inputs)
+        # None: entrées inchangées (cache) ou rien à faire
+        entry['status'] = 'skipped' if artifact is None else 'done'
+        if isinstance(artifact, dict):
+            entry['artifacts'] = {key: _describe(value) for key, value in artifact.items()
+                                  if value is not None}
+        elif artifact is not None:
+            entry['artifacts'] = _describe(artifact)
+    except Exception as e:
+        print(f"\n Étape {stage.name} en échec:\n{traceback.format_exc()}")
+        entry['status'] = 'failed'
+        entry['error'] = f"{type(e).__name__}: {e}"
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry, artifact
+
+
+def run_dag(stages, max_workers=PIPELINE_WORKERS):
+    """
+    Exécute les étapes dès que leurs dépendances sont terminées; une étape
+    dont une dépendance a échoué est annulée.
+
+    Args:
+        stages: Étapes, chacune après ses dépendances
+
+    Returns:
+        {nom: entrée du manifeste (status, started, seconds...)}
+    """
+    declared = set()
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in declared]
+        if missing:
+            raise ValueError(f"Étape {stage.name}: dépendances inconnues ou déclarées "
+                             f"après elle: {missing}")
+        declared.add(stage.name)
+
+    origin = time.perf_counter()
+    pending = list(stages)
+    running = {}
+    entries, artifacts = {}, {}
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+        while pending or running:
+            for stage in list(pending):
+                if not all(dep in entries for dep in stage.deps):
+                    continue
+                pending.remove(stage)
+                failed = [dep for dep in stage.deps
+                          if entries[dep]['status'] in ('failed', 'cancelled')]
+                if failed:
+                    entries[stage.name] = {'status': 'cancelled', 'seconds': 0.0,
+                                           'error': f"dépendance en échec: {failed}"}
+                    continue
+                inputs = {dep: artifacts.get(dep) for dep in stage.deps}
+                running[pool.submit(_run_stage, stage, inputs, origin)] = stage.name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                entries[name], artifacts[name] = future.result()
+    return entries
+
+
+# -- Étapes par jeu ------------------------------------------------------------
+
+def stages_hdfs():
+    """parse -> vectorize -> analyze (matrice dense seulement)."""
+    from hdfs import parse_hdfs, vectorize_hdfs, analyze_hdfs
+
+    def parse(inputs):
+        return parse_hdfs.main(collect_sessions=True)
+
+    def vectorize(inputs):
+        parsed = inputs['hdfs.parse'] or {}
+        # Mode fusionné: matrice déjà construite pendant le parsing (fenêtres
+        # de temps: lecture du fichier structuré par vectorize_hdfs)
+        if parse_hdfs.FUSED_MATRIX and parsed and vectorize_hdfs.VECTORIZE_WINDOW == 'session':
+            return {'matrix': parsed['matrix']}
+        return vectorize_hdfs.main(parsed.get('templates'), parsed.get('session_events'))
+
+    def analyze(inputs):
+        if vectorize_hdfs.VECTORIZE_WINDOW == 'time':
+            print("\n Fenêtres de temps seulement (VECTORIZE_WINDOW=time), analyse sautée")
+            return None
+        if not os.path.exists(analyze_hdfs.DATA_FILE):
+            print(f"\n Matrice dense absente ({analyze_hdfs.DATA_FILE}), analyse sautée")
+            return None
+        vectorized = inputs['hdfs.vectorize'] or {}
+        return analyze_hdfs.main(vectorized.get('matrix'))
+
+    return parse_hdfs.STATE_DIR, [
+        Stage('hdfs.parse', parse),
+        Stage('hdfs.vectorize', vectorize, ['hdfs.parse']),
+        Stage('hdfs.analyze', analyze, ['hdfs.vectorize']),
+    ]
+
+
+def stages_openstack():
+    """
+    parse -> vectorize. Les trois fichiers sont parsés dans une seule étape:
+    ils partagent le processeur Drain3 (EventIds communs).
+    """
+    from openstack import parse_openstack, vectorize_openstack
+
+    def parse(inputs):
+        return parse_openstack.main(collect_sessions=True)
+
+    def vectorize(inputs):
+        parsed = inputs['openstack.parse'] or {}
+        if (parse_openstack.FUSED_MATRIX and parsed.get('matrix') is not None
+                and vectorize_openstack.VECTORIZE_WINDOW == 'session'):
+            return {'matrix': parsed['matrix']}
+        return vectorize_openstack.main(parsed.get('templates'), parsed.get('session_events'),
+                                        parsed.get('session_labels'))
+
+    return parse_openstack.STATE_DIR, [
+        Stage('openstack.parse', parse),
+        Stage('openstack.vectorize', vectorize, ['openstack.parse']),
+    ]
+
+
+STAGE_BUILDERS = {'hdfs': stages_hdfs, 'openstack': stages_openstack}
+
+
+def write_manifest(state_dir, dataset, entries, run_info):
+    """Manifeste du run pour un jeu: étapes (statut, début, durée) et total."""
+    stages = {name.split('.', 1)[1]: entry for name, entry in entries.items()
+              if name.startswith(dataset + '.')}
+    manifest = dict(run_info, dataset=dataset, stages=stages)
+    path = os.path.join(state_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline parse -> vectorize -> analyze")
+    parser.add_argument('datasets', nargs='+', choices=DATASETS)
+    parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS,
+                        help="étapes indépendantes exécutées en même temps")
+    options = parser.parse_args(argv)
+
+    datasets = list(dict.fromkeys(options.datasets))
+    state_dirs, stages = {}, []
+    for dataset in datasets:
+        state_dirs[dataset], dataset_stages = STAGE_BUILDERS[dataset]()
+        stages.extend(dataset_stages)
+
+    started = datetime.datetime.now()
+    start = time.perf_counter()
+    entries = run_dag(stages, options.workers)
+    run_info = {
+        'started_at': started.isoformat(timespec='seconds'),
+        'total_seconds': round(time.perf_counter() - start, 3),
+        'workers': options.workers,
+        'datasets': datasets
+    }
+
+    print(f"\n{'='*80}")
+    print(f"PIPELINE ({run_info['total_seconds']:.1f} s, {options.workers} workers)")
+    for stage in stages:
+        entry = entries[stage.name]
+        print(f"  {stage.name:<22}{entry['status']:<10}{entry['seconds']:>9.2f} s")
+    for dataset in datasets:
+        path = write_manifest(state_dirs[dataset], dataset, entries, run_info)
+        print(f"   ✓ {path}")
+    print("="*80)
+
+    if any(entry['status'] in ('failed', 'cancelled') for entry in entries.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Profilage des scripts du pipeline (--profile), par étape.
+
+Deux modes:
+  - sample: la pile du thread principal est échantillonnée toutes les
+    interval_ms de temps CPU (SIGPROF, setitimer), coût faible. Sans
+    setitimer (Windows, hors thread principal), un thread échantillonne
+    sys._current_frames (biaisé vers les appels qui relâchent le GIL).
+    Sortie: piles repliées <job>.collapsed ("etape;module:fonction;...
+    nombre", format de flamegraph.pl, speedscope, inferno) et <job>_top.txt
+    (fonctions les plus chaudes, temps propre et inclusif).
+  - cprofile: un cProfile par étape, activé seulement pendant l'étape (coût
+    élevé, mais appels et temps exacts). Sortie: <job>_<etape>.pstats
+    (snakeviz, flameprof) et <job>_top.txt.
+
+Les étapes sont délimitées par le script (with profiler.stage('drain'): ...),
+le temps hors étape est attribué à 'main'.
+
+Usage: python parse_hdfs.py --profile [sample|cprofile] [--profile-lines N]
+"""
+import io
+import os
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import argparse
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+def parse_profile_args(argv=None):
+    """Options --profile des scripts (options.profile est None sans --profile)."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', nargs='?', const='sample', default=None,
+                        choices=PROFILE_MODES,
+                        help="profiler le script (défaut: sample)")
+    parser.add_argument('--profile-lines', type=int, default=100000,
+                        help="préfixe de l'entrée profilé, en lignes (0 = tout)")
+    parser.add_argument('--profile-interval', type=float, default=5.0,
+                        help="période d'échantillonnage (ms)")
+    parser.add_argument('--profile-top', type=int, default=30,
+                        help="nombre de fonctions du rapport")
+    return parser.parse_args(argv)
+
+
+def _frame_label(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+class StageProfiler:
+    """Profileur par étape (échantillonnage ou cProfile)."""
+
+    def __init__(self, job, mode='sample', interval_ms=5.0):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Mode de profilage inconnu: {mode}")
+        self.job = job
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.stages = ['main']
+        # sample: piles repliées -> nombre d'échantillons
+        self.samples = Counter()
+        self.num_samples = 0
+        # cprofile: un profil par étape
+        self.profiles = {}
+        self.stage_seconds = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._target = None
+        self._previous_handler = None
+        self._started = None
+
+    # -- Démarrage / arrêt --------------------------------------------------
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._stage_start = self._started
+        if self.mode == 'sample':
+            if (hasattr(signal, 'setitimer') and
+                    threading.current_thread() is threading.main_thread()):
+                self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+                signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            else:
+                self._target = threading.get_ident()
+                self._thread = threading.Thread(target=self._sample_loop,
+                                                name='profiler', daemon=True)
+                self._thread.start()
+        else:
+            self._profile('main').enable()
+        return self
+
+    def stop(self):
+        self._account_stage()
+        if self.mode == 'sample':
+            if self._thread is None:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                signal.signal(signal.SIGPROF, self._previous_handler)
+            else:
+                self._stop.set()
+                self._thread.join()
+        else:
+            self._profile(self.stages[-1]).disable()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    # -- Étapes ---------------------------------------------------------------
+
+    def _profile(self, stage):
+        profile = self.profiles.get(stage)
+        if profile is None:
+            profile = self.profiles[stage] = cProfile.Profile()
+        return profile
+
+    def _account_stage(self):
+        now = time.perf_counter()
+        self.stage_seconds[self.stages[-1]] += now - self._stage_start
+        self._stage_start = now
+
+    def _enter(self, stage):
+        self._account_stage()
+        if self.mode == 'cprofile':
+            # Un seul profil actif: celui de l'étape la plus interne
+            self._profile(self.stages[-1]).disable()
+            self.stages.append(stage)
+            self._profile(stage).enable()
+        else:
+            self.stages.append(stage)
+
+    def _exit(self):
+        self._account_stage()
+        if self.mode == 'cprofile':
+            self._profile(self.stages.pop()).disable()
+            self._profile(self.stages[-1]).enable()
+        else:
+            self.stages.pop()
+
+    @contextmanager
+    def stage(self, name):
+        """Attribue le bloc à l'étape name: with profiler.stage('save_batch'): ..."""
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def wrap(self, name, func):
+        """func dont chaque appel est attribué à l'étape name."""
+        def wrapped(*args, **kwargs):
+            self._enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._exit()
+        return wrapped
+
+    def wrap_iter(self, name, iterable):
+        """Itère en attribuant à name la production de chaque élément."""
+        iterator = iter(iterable)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            yield item
+
+    # -- Échantillonnage ------------------------------------------------------
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(self.stages[-1])
+        self.samples[';'.join(reversed(stack))] += 1
+        self.num_samples += 1
+
+    def _on_signal(self, signum, frame):
+        self._record(frame)
+
+    def _sample_loop(self):
+        current_frames = sys._current_frames
+        while not self._stop.wait(self.interval):
+            frame = current_frames().get(self._target)
+            if frame is not None:
+                self._record(frame)
+
+    # -- Rapports ---------------------------------------------------------------
+
+    def _top_sampled(self, top):
+        """Fonctions les plus chaudes en échantillons (propre, inclusif)."""
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(';')[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+        total = max(self.num_samples, 1)
+        clock = 'CPU' if self._thread is None else 'mur'
+        lines = [f"{self.num_samples:,} échantillons (période {self.interval * 1000:g} ms "
+                 f"de temps {clock})",
+                 "", f"{'propre':>8} {'inclusif':>9}  fonction"]
+        for label, count in own.most_common(top):
+            lines.append(f"{count / total:>8.1%} {inclusive[label] / total:>9.1%}  {label}")
+        lines += ["", f"{'inclusif':>8}  fonction"]
+        for label, count in inclusive.most_common(top):
+            lines.append(f"{count / total:>8.1%}  {label}")
+        return lines
+
+    def _top_cprofile(self, top):
+        lines = []
+        for stage, profile in sorted(self.profiles.items()):
+            output = io.StringIO()
+            stats = pstats.Stats(profile, stream=output)
+            if not stats.stats:
+                continue
+            stats.strip_dirs().sort_stats('tottime').print_stats(top)
+            lines += [f"=== {stage} ===", output.getvalue().strip(), ""]
+        return lines
+
+    def write_reports(self, output_dir, top=30):
+        """
+        Écrit les fichiers du profil dans output_dir.
+
+        Returns:
+            Liste des chemins écrits
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        total = sum(self.stage_seconds.values()) or 1.0
+        report = [f"Profil {self.job} ({self.mode})", "", "Temps par étape:"]
+        for stage, seconds in self.stage_seconds.most_common():
+            report.append(f"  {stage:<16}{seconds:>10.3f} s {seconds / total:>7.1%}")
+        report.append("")
+
+        if self.mode == 'sample':
+            collapsed_path = os.path.join(output_dir, f"{self.job}.collapsed")
+            with open(collapsed_path, 'w') as f:
+                for stack, count in sorted(self.samples.items()):
+                    f.write(f"{stack} {count}\n")
+            paths.append(collapsed_path)
+            report += self._top_sampled(top)
+        else:
+            for stage, profile in sorted(self.profiles.items()):
+                stats_path = os.path.join(output_dir, f"{self.job}_{stage}.pstats")
+                profile.dump_stats(stats_path)
+                paths.append(stats_path)
+            report += self._top_cprofile(top)
+
+        top_path = os.path.join(output_dir, f"{self.job}_top.txt")
+        with open(top_path, 'w') as f:
+            f.write('\n'.join(report) + '\n')
+        paths.append(top_path)
+        return paths
+
+
+def run_profiled(job, func, options, output_dir):
+    """
+    Exécute func(profiler, max_lines) sous un StageProfiler et écrit les
+    rapports dans output_dir.
+    """
+    profiler = StageProfiler(job, options.profile, options.profile_interval)
+    max_lines = options.profile_lines or None
+    print(f" Profilage {job} ({options.profile}"
+          f"{f', {max_lines:,} lignes' if max_lines else ''})")
+    with profiler:
+        func(profiler, max_lines)
+    for path in profiler.write_reports(output_dir, options.profile_top):
+        print(f"   ✓ {path}")
+    return profiler
@@ -0,0 +1,100 @@
+"""
+Batch de lignes parsées, stocké en tuples de champs par ligne.
+
+La boucle de parsing n'alloue plus de dictionnaire par ligne: les champs
+extraits par le processeur (fields_from_groups) forment un tuple, dans
+l'ordre de field_columns (get_column_order() sans LineId, EventId et
+EventTemplate), et LineId/EventId/EventTemplate sont ajoutés à des listes.
+Les writers et les sinks lisent les colonnes (column()), sans conversion
+dict -> DataFrame ni réinférence des colonnes. Une colonne de champ est
+extraite des tuples une fois par batch, puis partagée par ses lecteurs.
+"""
+from operator import itemgetter
+
+import pandas as pd
+
+# Colonnes hors des champs extraits (remplies par la boucle de parsing)
+LINE_ID_COLUMN = 'LineId'
+TEMPLATE_COLUMNS = ('EventId', 'EventTemplate')
+
+
+def field_columns_of(columns):
+    """Colonnes des champs extraits, dans l'ordre de columns."""
+    return [column for column in columns
+            if column != LINE_ID_COLUMN and column not in TEMPLATE_COLUMNS]
+
+
+class RowBatch:
+    """Lignes d'un batch: LineId, tuples de champs, EventId et EventTemplate."""
+
+    __slots__ = ('columns', 'field_columns', 'line_ids', 'rows', 'event_ids',
+                 'templates', '_index', '_columns', '_columns_rows')
+
+    def __init__(self, columns, field_columns=None):
+        """
+        Args:
+            columns: Ordre des colonnes du fichier structuré (get_column_order())
+            field_columns: Ordre des champs des tuples (défaut: déduit de columns)
+        """
+        self.columns = columns
+        self.field_columns = (field_columns if field_columns is not None
+                              else field_columns_of(columns))
+        self._index = {column: i for i, column in enumerate(self.field_columns)}
+        self.line_ids = []
+        self.rows = []
+        self.event_ids = []
+        self.templates = []
+        # Colonnes de champs déjà extraites, valables pour _columns_rows lignes
+        self._columns = {}
+        self._columns_rows = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def appenders(self):
+        """Méthodes append des quatre listes, liées pour la boucle de parsing."""
+        return (self.line_ids.append, self.rows.append,
+                self.event_ids.append, self.templates.append)
+
+    def append(self, line_id, fields, event_id, template):
+        self.line_ids.append(line_id)
+        self.rows.append(fields)
+        self.event_ids.append(event_id)
+        self.templates.append(template)
+
+    def column(self, name):
+        """
+        Valeurs d'une colonne (liste; une valeur None par ligne si la colonne
+        n'existe pas). La liste est partagée entre les appels: ne pas la
+        modifier.
+        """
+        if name == LINE_ID_COLUMN:
+            return self.line_ids
+        if name == 'EventId':
+            return self.event_ids
+        if name == 'EventTemplate':
+            return self.templates
+        # Lignes ajoutées depuis l'extraction (appenders): colonnes périmées
+        if self._columns_rows != len(self.rows):
+            self._columns.clear()
+            self._columns_rows = len(self.rows)
+        values = self._columns.get(name)
+        if values is None:
+            index = self._index.get(name)
+            if index is None:
+                values = [None] * len(self.rows)
+            else:
+                values = list(map(itemgetter(index), self.rows))
+            self._columns[name] = values
+        return values
+
+    def to_dataframe(self, columns=None):
+        """DataFrame du batch, colonnes dans l'ordre columns (défaut self.columns)."""
+        df = pd.DataFrame(self.rows, columns=self.field_columns)
+        df.insert(0, LINE_ID_COLUMN, self.line_ids)
+        df['EventId'] = self.event_ids
+        df['EventTemplate'] = self.templates
+        columns = self.columns if columns is None else columns
+        if list(df.columns) != list(columns):
+            df = df[columns]
+        return df
@@ -0,0 +1,385 @@
+"""
+Moteur d'agrégation vectorisé: comptage des EventId par session.
+
+Remplace la boucle groupby + value_counts + Counter.update (des centaines
+de milliers de petits appels pandas par chunk) par:
+1. factorisation des sessions et des événements du chunk en codes entiers
+2. np.bincount sur les paires (session, événement) du chunk
+3. ajout du bloc obtenu dans un tableau 2-D global extensible
+
+SessionTracker borne la mémoire au nombre de sessions ouvertes: une
+session sans événement depuis max_gap lignes (ou secondes) est retirée du
+tableau et déversée sur disque (comptages non nuls au format CSR, fichiers
+temporaires), sa ligne est réutilisée. À la fin, seules les lignes des
+valeurs déversées sont renumérotées (sessions triées, une session qui
+réapparaît après déversement est sommée): la matrice obtenue ne dépend pas
+de max_gap.
+"""
+import bisect
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class SessionEventCounter(Mapping):
+    """
+    Comptages sessions × événements dans un tableau uint32 extensible.
+
+    Se comporte comme un dict session -> {EventId: count} (comptages non
+    nuls), ce qui le rend utilisable là où un defaultdict(Counter) l'était.
+    """
+
+    def __init__(self, event_ids=(), initial_sessions=1024, dtype=np.uint32):
+        self.session_ids = []
+        self.session_index = {}
+        self.event_ids = list(event_ids)
+        self.event_index = {event_id: i for i, event_id in enumerate(self.event_ids)}
+        self.counts = np.zeros((initial_sessions, max(len(self.event_ids), 1)), dtype=dtype)
+
+    def add(self, sessions, events):
+        """
+        Ajoute un chunk de paires (session, événement).
+
+        Args:
+            sessions: Tableau des identifiants de session (sans valeurs nulles)
+            events: Tableau des EventId, même longueur
+        """
+        if len(sessions) == 0:
+            return
+
+        session_codes, session_uniques = pd.factorize(sessions)
+        event_codes, event_uniques = pd.factorize(events)
+
+        rows = self._get_indices(self.session_index, self.session_ids, session_uniques)
+        cols = self._get_indices(self.event_index, self.event_ids, event_uniques)
+        self._ensure_capacity(len(self.session_ids), len(self.event_ids))
+        self._add_codes(rows, cols, session_codes, event_codes)
+
+    def _add_codes(self, rows, cols, session_codes, event_codes):
+        """Ajoute les paires (codes du chunk) aux lignes/colonnes globales."""
+        # Comptage local au chunk: une cellule par paire (session, événement)
+        num_events = len(cols)
+        local_counts = np.bincount(
+            session_codes * num_events + event_codes,
+            minlength=len(rows) * num_events
+        ).reshape(len(rows), num_events)
+
+        # rows et cols sont sans doublons: l'ajout indexé est exact
+        self.counts[np.ix_(rows, cols)] += local_counts.astype(self.counts.dtype)
+
+    @staticmethod
+    def _get_indices(index, keys, uniques):
+        """Indices globaux des valeurs uniques du chunk (ajoutées si nouvelles)."""
+        indices = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            position = index.get(key)
+            if position is None:
+                position = len(keys)
+                index[key] = position
+                keys.append(key)
+            indices[i] = position
+        return indices
+
+    def _ensure_capacity(self, num_rows, num_cols):
+        capacity_rows, capacity_cols = self.counts.shape
+        if num_rows <= capacity_rows and num_cols <= capacity_cols:
+            return
+
+        new_rows = capacity_rows
+        while new_rows < num_rows:
+            new_rows *= 2
+        new_cols = max(capacity_cols, num_cols)
+
+        counts = np.zeros((new_rows, new_cols), dtype=self.counts.dtype)
+        counts[:capacity_rows, :capacity_cols] = self.counts
+        self.counts = counts
+
+    def merge(self, other):
+        """Ajoute les comptages d'un autre compteur (ex: autre fichier/worker)."""
+        rows = self._get_indices(self.session_index, self.session_ids, other.session_ids)
+        cols = self._get_indices(self.event_index, self.event_ids, other.event_ids)
+        self._ensure_capacity(len(self.session_ids), len(self.event_ids))
+
+        block = other.counts[:len(other.session_ids), :len(other.event_ids)]
+        self.counts[np.ix_(rows, cols)] += block
+
+    def _ordered_block(self, event_ids):
+        """Sessions triées × event_ids (colonnes absentes à zéro)."""
+        num_sessions = len(self.session_ids)
+        order = sorted(range(num_sessions), key=self.session_ids.__getitem__)
+
+        block = np.zeros((num_sessions, len(event_ids)), dtype=self.counts.dtype)
+        for j, event_id in enumerate(event_ids):
+            col = self.event_index.get(event_id)
+            if col is not None:
+                block[:, j] = self.counts[order, col]
+
+        return block, [self.session_ids[i] for i in order]
+
+    def to_csr(self, event_ids):
+        """
+        Returns:
+            (matrice CSR sessions triées × event_ids, sessions triées)
+        """
+        block, session_ids = self._ordered_block(event_ids)
+        return sparse.csr_matrix(block.astype(np.int32)), session_ids
+
+    def to_dataframe(self, event_ids, key_column):
+        """Matrice dense: key_column puis une colonne par EventId."""
+        block, session_ids = self._ordered_block(event_ids)
+        df = pd.DataFrame(block.astype(np.int64), columns=list(event_ids))
+        df.insert(0, key_column, session_ids)
+        return df
+
+    def __getitem__(self, session_id):
+        row = self.counts[self.session_index[session_id]]
+        return {
+            self.event_ids[col]: int(row[col])
+            for col in np.flatnonzero(row[:len(self.event_ids)])
+        }
+
+    def __iter__(self):
+        return iter(self.session_ids)
+
+    def __len__(self):
+        return len(self.session_ids)
+
+
+class SessionTracker(SessionEventCounter):
+    """
+    SessionEventCounter à mémoire bornée par les sessions ouvertes.
+
+    Les positions (numéros de ligne, ou timestamps en secondes) datent la
+    dernière activité de chaque session; après chaque chunk, les sessions
+    inactives depuis plus de max_gap sont déversées sur disque.
+    """
+
+    def __init__(self, event_ids=(), max_gap=1000000, initial_sessions=1024,
+                 dtype=np.uint32, spill_dir=None):
+        super().__init__(event_ids, initial_sessions, dtype)
+        self.max_gap = max_gap
+        self.last_seen = np.zeros(initial_sessions, dtype=np.int64)
+        self.active = np.zeros(initial_sessions, dtype=bool)
+        self.free_rows = []
+        self.position = 0
+        self.pairs = 0
+
+        # Sessions déversées, dans des fichiers temporaires de spill_dir:
+        # valeurs et colonnes non nulles, nombre de valeurs par session,
+        # identifiants (une ligne par session)
+        self.spill_dir = spill_dir
+        self._spill_files = None
+        self.spilled_rows = 0
+        self.num_spilled = 0
+        self.peak_open = 0
+        self._merged = None
+
+    def add(self, sessions, events, positions=None):
+        """
+        Ajoute un chunk de paires (session, événement), puis déverse les
+        sessions inactives.
+
+        Args:
+            sessions: Tableau des identifiants de session (sans valeurs nulles)
+            events: Tableau des EventId, même longueur
+            positions: Position de chaque paire (numéro de ligne ou secondes,
+                croissante), défaut: rang de la paire depuis le début
+        """
+        if len(sessions) == 0:
+            return
+        if positions is None:
+            positions = np.arange(self.pairs + 1, self.pairs + len(sessions) + 1)
+        self.pairs += len(sessions)
+        self._merged = None
+
+        session_codes, session_uniques = pd.factorize(sessions)
+        event_codes, event_uniques = pd.factorize(events)
+
+        rows = self._session_rows(session_uniques)
+        cols = self._get_indices(self.event_index, self.event_ids, event_uniques)
+        self._ensure_capacity(len(self.session_ids), len(self.event_ids))
+        self._add_codes(rows, cols, session_codes, event_codes)
+
+        # Dernière activité de chaque session du chunk
+        last = np.full(len(rows), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(last, session_codes, np.asarray(positions, dtype=np.int64))
+        self.last_seen[rows] = np.maximum(self.last_seen[rows], last)
+        self.active[rows] = True
+        self.position = max(self.position, int(last.max()))
+
+        self.peak_open = max(self.peak_open, len(self.session_index))
+        self.evict_idle()
+
+    def _session_rows(self, uniques):
+        """Lignes des sessions du chunk: existantes, libérées, ou ajoutées."""
+        rows = np.empty(len(uniques), dtype=np.int64)
+        for i, session_id in enumerate(uniques):
+            row = self.session_index.get(session_id)
+            if row is None:
+                if self.free_rows:
+                    row = self.free_rows.pop()
+                    self.session_ids[row] = session_id
+                else:
+                    row = len(self.session_ids)
+                    self.session_ids.append(session_id)
+                self.session_index[session_id] = row
+            rows[i] = row
+        return rows
+
+    def _ensure_capacity(self, num_rows, num_cols):
+        capacity_rows = self.counts.shape[0]
+        super()._ensure_capacity(num_rows, num_cols)
+        new_rows = self.counts.shape[0]
+        if new_rows > capacity_rows:
+            self.last_seen = np.concatenate(
+                [self.last_seen, np.zeros(new_rows - capacity_rows, dtype=np.int64)])
+            self.active = np.concatenate(
+                [self.active, np.zeros(new_rows - capacity_rows, dtype=bool)])
+
+    def release_memory(self):
+        """Sous pression mémoire: max_gap divisé par deux, sessions inactives déversées."""
+        self.max_gap = max(self.max_gap // 2, 1)
+        return self.evict_idle()
+
+    def evict_idle(self, max_gap=None):
+        """Déverse les sessions inactives depuis plus de max_gap (0 = toutes)."""
+        max_gap = self.max_gap if max_gap is None else max_gap
+        num_rows = len(self.session_ids)
+        idle = self.active[:num_rows]
+        if max_gap:
+            idle = idle & (self.last_seen[:num_rows] < self.position - max_gap)
+        idle_rows = np.flatnonzero(idle)
+        if len(idle_rows) == 0:
+            return 0
+
+        data, indices, row_nnz = self._nonzero(idle_rows)
+        session_ids = [self.session_ids[row] for row in idle_rows]
+        self._spill(data, indices, row_nnz, session_ids)
+        self.num_spilled += len(idle_rows)
+
+        # Lignes remises à zéro et réutilisables
+        self.counts[idle_rows] = 0
+        self.last_seen[idle_rows] = 0
+        self.active[idle_rows] = False
+        for row, session_id in zip(idle_rows.tolist(), session_ids):
+            del self.session_index[session_id]
+            self.session_ids[row] = None
+        self.free_rows.extend(idle_rows.tolist())
+        return len(idle_rows)
+
+    def merge(self, other):
+        """Ajoute les comptages d'un autre compteur, comme sessions terminées."""
+        self._merged = None
+        matrix, session_ids = other.to_csr(other.event_ids)
+        cols = self._get_indices(self.event_index, self.event_ids, other.event_ids)
+        self._ensure_capacity(len(self.session_ids), len(self.event_ids))
+
+        self._spill(matrix.data, cols[matrix.indices], np.diff(matrix.indptr), session_ids)
+
+    def _nonzero(self, rows):
+        """Comptages non nuls des lignes rows: (valeurs, colonnes, nombre par ligne)."""
+        block = self.counts[rows, :len(self.event_ids)]
+        block_rows, cols = np.nonzero(block)
+        return block[block_rows, cols], cols, np.bincount(block_rows, minlength=len(rows))
+
+    def _spill(self, data, indices, row_nnz, session_ids):
+        """Ajoute des sessions terminées aux fichiers de déversement."""
+        if self._spill_files is None:
+            self._spill_files = [tempfile.TemporaryFile(prefix='sessions_', dir=self.spill_dir)
+                                 for _ in range(4)]
+        data_file, indices_file, nnz_file, ids_file = self._spill_files
+        data_file.write(np.asarray(data, dtype=self.counts.dtype).tobytes())
+        indices_file.write(np.asarray(indices, dtype=np.int32).tobytes())
+        nnz_file.write(np.asarray(row_nnz, dtype=np.int32).tobytes())
+        ids_file.write(''.join(f"{session_id}\n" for session_id in session_ids).encode())
+        self.spilled_rows += len(session_ids)
+
+    def _read_spilled(self):
+        """Sessions déversées: (valeurs, colonnes, nombre par ligne, identifiants)."""
+        if self._spill_files is None:
+            empty = np.empty(0, dtype=np.int32)
+            return np.empty(0, dtype=self.counts.dtype), empty, empty, []
+
+        contents = []
+        for spill_file in self._spill_files:
+            spill_file.seek(0)
+            contents.append(spill_file.read())
+            # Les déversements suivants continuent en fin de fichier
+            spill_file.seek(0, 2)
+        data, indices, row_nnz, session_ids = contents
+        return (np.frombuffer(data, dtype=self.counts.dtype), np.frombuffer(indices, dtype=np.int32),
+                np.frombuffer(row_nnz, dtype=np.int32), session_ids.decode().split('\n')[:-1])
+
+    @property
+    def spilled_bytes(self):
+        """Taille des fichiers de déversement (octets)."""
+        if self._spill_files is None:
+            return 0
+        return sum(spill_file.tell() for spill_file in self._spill_files)
+
+    def _merge_all(self):
+        """
+        Sessions déversées et ouvertes en une CSR (colonnes internes), une
+        ligne par session triée: les lignes d'une même session sont sommées.
+        """
+        if self._merged is not None:
+            return self._merged
+
+        data, indices, row_nnz, session_ids = self._read_spilled()
+        open_rows = np.flatnonzero(self.active[:len(self.session_ids)])
+        open_data, open_indices, open_nnz = self._nonzero(open_rows)
+        session_ids.extend(self.session_ids[row] for row in open_rows)
+
+        keys = np.empty(len(session_ids), dtype=object)
+        keys[:] = session_ids
+        uniques, inverse = np.unique(keys, return_inverse=True)
+
+        # Seules les lignes des valeurs sont renumérotées (session triée); les
+        # valeurs d'une même session et colonne sont sommées par la CSR
+        value_rows = np.repeat(inverse, np.concatenate([row_nnz, open_nnz]))
+        matrix = sparse.csr_matrix(
+            (np.concatenate([data, open_data]),
+             (value_rows, np.concatenate([indices, open_indices.astype(np.int32)]))),
+            shape=(len(uniques), len(self.event_ids))
+        )
+        self._merged = (matrix, uniques.tolist())
+        return self._merged
+
+    def _select(self, event_ids):
+        """Sessions triées × event_ids (colonnes absentes à zéro), en CSR."""
+        matrix, session_ids = self._merge_all()
+        selection = sparse.lil_matrix((len(self.event_ids), len(event_ids)), dtype=np.int64)
+        for j, event_id in enumerate(event_ids):
+            col = self.event_index.get(event_id)
+            if col is not None:
+                selection[col, j] = 1
+        return (matrix @ selection.tocsr()).tocsr(), session_ids
+
+    def to_csr(self, event_ids):
+        matrix, session_ids = self._select(event_ids)
+        matrix.sort_indices()
+        return matrix.astype(np.int32), session_ids
+
+    def to_dataframe(self, event_ids, key_column):
+        matrix, session_ids = self._select(event_ids)
+        df = pd.DataFrame(matrix.toarray(), columns=list(event_ids))
+        df.insert(0, key_column, session_ids)
+        return df
+
+    def __getitem__(self, session_id):
+        matrix, session_ids = self._merge_all()
+        row = bisect.bisect_left(session_ids, session_id)
+        if row == len(session_ids) or session_ids[row] != session_id:
+            raise KeyError(session_id)
+        values = matrix.getrow(row)
+        return {self.event_ids[col]: int(count)
+                for col, count in zip(values.indices, values.data) if count}
+
+    def __iter__(self):
+        return iter(self._merge_all()[1])
+
+    def __len__(self):
+        return len(self._merge_all()[1])
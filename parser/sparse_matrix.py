@@ -0,0 +1,116 @@
+"""
+Matrice d'occurrences creuse (CSR) construite directement depuis les
+comptages par session.
+
+La matrice HDFS (~575k BlockIDs × 47 événements) est presque vide: on la
+stocke en scipy.sparse CSR (.npz) avec deux fichiers annexes:
+- <nom>_rows.csv: clé de chaque ligne (BlockId/InstanceId, Label)
+- <nom>_columns.csv: EventId de chaque colonne
+"""
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def sparse_matrix_paths(output_dir, base_name):
+    """Chemins (matrice, lignes, colonnes) pour un nom de matrice."""
+    prefix = os.path.join(output_dir, base_name)
+    return prefix + '.npz', prefix + '_rows.csv', prefix + '_columns.csv'
+
+
+def build_csr_matrix(session_events, event_ids):
+    """
+    Construit la matrice CSR sessions × événements sans passer par une
+    représentation dense.
+
+    Args:
+        session_events: dict session -> Counter(EventId -> count)
+        event_ids: EventIds des colonnes, dans l'ordre
+
+    Returns:
+        (matrice CSR, liste triée des sessions)
+    """
+    # Compteur vectorisé (SessionEventCounter): conversion directe
+    if hasattr(session_events, 'to_csr'):
+        return session_events.to_csr(event_ids)
+    
+    column_index = {event_id: i for i, event_id in enumerate(event_ids)}
+    session_ids = sorted(session_events)
+
+    indptr = np.zeros(len(session_ids) + 1, dtype=np.int64)
+    indices = []
+    data = []
+
+    for row, session_id in enumerate(session_ids):
+        for event_id, count in session_events[session_id].items():
+            column = column_index.get(event_id)
+            if column is not None:
+                indices.append(column)
+                data.append(count)
+        indptr[row + 1] = len(indices)
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.int32), np.asarray(indices, dtype=np.int32), indptr),
+        shape=(len(session_ids), len(event_ids))
+    )
+    matrix.sort_indices()
+
+    return matrix, session_ids
+
+
+def save_sparse_matrix(output_dir, base_name, matrix, df_rows, event_ids):
+    """Sauvegarde la matrice CSR et ses fichiers de clés."""
+    matrix_path, rows_path, columns_path = sparse_matrix_paths(output_dir, base_name)
+
+    sparse.save_npz(matrix_path, matrix)
+    df_rows.to_csv(rows_path, index=False)
+    pd.DataFrame({'EventId': list(event_ids)}).to_csv(columns_path, index=False)
+
+    return matrix_path
+
+
+def load_sparse_matrix(output_dir, base_name):
+    """
+    Returns:
+        (matrice CSR, DataFrame des lignes, liste des EventIds)
+    """
+    matrix_path, rows_path, columns_path = sparse_matrix_paths(output_dir, base_name)
+
+    matrix = sparse.load_npz(matrix_path).tocsr()
+    df_rows = pd.read_csv(rows_path)
+    event_ids = pd.read_csv(columns_path)['EventId'].tolist()
+
+    return matrix, df_rows, event_ids
+
+
+def print_sparse_statistics(matrix, event_ids, session_label):
+    """Statistiques équivalentes à statistiques_matrice, sans densifier."""
+    print(f"\n STATISTIQUES DE LA MATRICE (CSR):")
+    print(f"   {'='*70}")
+
+    num_rows, num_cols = matrix.shape
+    print(f"   Dimensions: {num_rows:,} {session_label}s × {num_cols} événements")
+
+    total_cells = num_rows * num_cols
+    density = matrix.nnz / total_cells * 100 if total_cells else 0.0
+    print(f"   Densité: {density:.2f}% (cellules non-nulles)")
+
+    if num_rows == 0:
+        return
+
+    total_events = np.asarray(matrix.sum(axis=1)).ravel()
+    print(f"\n   Événements par {session_label}:")
+    print(f"      Moyenne: {total_events.mean():.2f}")
+    print(f"      Min:     {total_events.min()}")
+    print(f"      Max:     {total_events.max()}")
+    print(f"      Médiane: {np.median(total_events):.0f}")
+
+    event_totals = pd.Series(np.asarray(matrix.sum(axis=0)).ravel(), index=event_ids)
+    event_totals = event_totals.sort_values(ascending=False)
+    grand_total = event_totals.sum()
+
+    print(f"\n   🔝 Top 10 des événements les plus fréquents:")
+    for i, (event_id, count) in enumerate(event_totals.head(10).items(), 1):
+        pct = count / grand_total * 100 if grand_total else 0.0
+        print(f"      {i:>2}. {event_id}: {int(count):>8,} ({pct:>5.2f}%)")
@@ -0,0 +1,399 @@
+"""
+Détection d'anomalies en continu sur des logs suivis (tail -F).
+
+Les lignes ajoutées aux fichiers suivis passent par le processeur
+(extraction des champs + masquage), puis sont appariées à l'état Drain3
+sauvegardé par le parsing, figé: match sans apprentissage, un template
+inconnu ne crée pas de colonne. Les comptages d'EventId sont tenus en
+mémoire par session (BlockId, InstanceId) et scorés par le modèle entraîné
+dans les notebooks (mêmes colonnes E1..En que la matrice d'occurrences):
+- toutes les score_interval secondes, score provisoire des sessions
+  modifiées, en un seul appel au modèle;
+- après session_timeout secondes sans ligne, score final et fermeture.
+
+Les résultats sont servis en JSON sur un port HTTP local (/sessions,
+/alerts, /stats) et chaque session au-dessus du seuil produit une alerte
+dans un fichier JSONL.
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from fingerprint import READ_SIZE
+from log_processor import split_text_lines
+
+
+class FileTailer:
+    """
+    Suivi d'un fichier en append: poll() renvoie les lignes complètes
+    ajoutées depuis l'appel précédent (une ligne sans '\\n' attend la suite).
+    Rotation (nouvel inode) ou troncature: la fin de l'ancien fichier est
+    lue, puis le nouveau est suivi depuis le début.
+    """
+
+    def __init__(self, path, from_start=False):
+        """
+        Args:
+            path: Fichier suivi (peut ne pas encore exister)
+            from_start: Lire le contenu déjà présent au démarrage
+        """
+        self.path = path
+        self.from_start = from_start
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        self.pending = b''
+
+    def _open(self, at_end):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(f.fileno())
+        self.file, self.inode = f, stat.st_ino
+        self.offset = stat.st_size if at_end else 0
+        self.pending = b''
+        f.seek(self.offset)
+        return True
+
+    def _read(self, max_bytes):
+        data = self.file.read(max_bytes)
+        if not data:
+            return []
+        self.offset += len(data)
+        data = self.pending + data
+        cut = data.rfind(b'\n')
+        if cut == -1:
+            self.pending = data
+            return []
+        self.pending = data[cut + 1:]
+        return split_text_lines(data[:cut + 1].decode('utf-8', errors='ignore'))
+
+    def poll(self, max_bytes=READ_SIZE):
+        """Lignes complètes ajoutées (au plus ~max_bytes octets par appel)."""
+        if self.file is None:
+            opened = self._open(at_end=not self.from_start)
+            # Un fichier créé ou recréé ensuite est lu depuis le début
+            self.from_start = True
+            if not opened:
+                return []
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+
+        if stat is not None and (stat.st_ino != self.inode or stat.st_size < self.offset):
+            lines = self._read(max_bytes) if stat.st_ino != self.inode else []
+            if lines:
+                return lines
+            self.file.close()
+            self.file = None
+            if not self._open(at_end=False):
+                return []
+
+        return self._read(max_bytes)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def model_feature_names(model, template_miner):
+    """
+    Colonnes attendues par le modèle: feature_names_in_ (modèle entraîné
+    sur un DataFrame), sinon les EventId de l'état Drain3 dans l'ordre de
+    create_templates_dataframe.
+    """
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None:
+        return [str(name) for name in names]
+    return [f"E{cluster.cluster_id}" for cluster in template_miner.drain.clusters]
+
+
+class _Session:
+    """Comptages d'une session ouverte."""
+
+    __slots__ = ('counts', 'first_seen', 'last_seen', 'lines', 'unknown', 'dirty',
+                 'score', 'alerted')
+
+    def __init__(self, num_features, now):
+        self.counts = np.zeros(num_features, dtype=np.int64)
+        self.first_seen = now
+        self.last_seen = now
+        self.lines = 0
+        self.unknown = 0
+        self.dirty = False
+        self.score = None
+        self.alerted = False
+
+
+class StreamingDetector:
+    """Comptage par session et scoring en continu avec un miner Drain3 figé."""
+
+    def __init__(self, processor, session_column, model, feature_names=None,
+                 threshold=0.5, session_timeout=60.0, score_interval=1.0,
+                 alert_path=None, max_results=10000):
+        """
+        Args:
+            processor: LogProcessor dont le miner a été chargé
+                (load_template_state), utilisé en lecture seule
+            session_column: Champ identifiant la session (BlockId, InstanceId)
+            model: Modèle scikit-learn (predict_proba, sinon predict)
+            feature_names: Colonnes du modèle (défaut: model_feature_names)
+            threshold: Probabilité d'anomalie à partir de laquelle alerter
+            session_timeout: Inactivité (s) après laquelle une session est close
+            score_interval: Période (s) du scoring des sessions actives
+            alert_path: Fichier JSONL des alertes (None = pas de fichier)
+            max_results: Nombre de sessions scorées conservées pour /sessions
+        """
+        self.processor = processor
+        self.template_miner = processor.template_miner
+        self.session_column = session_column
+        self.session_index = processor.field_columns.index(session_column)
+        self.model = model
+        self.feature_names = feature_names or model_feature_names(model, self.template_miner)
+        self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        self.threshold = threshold
+        self.session_timeout = session_timeout
+        self.score_interval = score_interval
+        self.alert_path = alert_path
+        self.max_results = max_results
+
+        self.sessions = {}
+        self.results = OrderedDict()
+        self.alerts = deque(maxlen=1000)
+        self.latencies = deque(maxlen=10000)
+        self.lock = threading.Lock()
+
+        self.num_lines = 0
+        self.num_unknown = 0
+        self.num_closed = 0
+        self.num_alerts = 0
+        self.started = time.time()
+        self.last_score = time.monotonic()
+
+        if alert_path:
+            os.makedirs(os.path.dirname(alert_path) or '.', exist_ok=True)
+
+    def _event_column(self, fields):
+        """Colonne du modèle de la ligne (None si template inconnu)."""
+        content = fields[self.processor.content_index]
+        masked_content = self.processor.mask_content(content)
+        if masked_content is not None:
+            cluster = self.template_miner.drain.match(masked_content, 'never')
+        else:
+            cluster = self.template_miner.match(content)
+        if cluster is None:
+            return None
+        return self.feature_index.get(f"E{cluster.cluster_id}")
+
+    def process_lines(self, lines, received=None):
+        """
+        Parse, apparie et compte un burst de lignes.
+
+        Args:
+            lines: Lignes brutes (sans '\\n')
+            received: perf_counter() de la lecture, pour la latence
+        """
+        received = time.perf_counter() if received is None else received
+        now = time.time()
+        num_features = len(self.feature_names)
+        session_index = self.session_index
+
+        with self.lock:
+            for line in lines:
+                fields = self.processor.parse_line(line)
+                if fields is None:
+                    continue
+                self.num_lines += 1
+
+                session_id = fields[session_index]
+                if not session_id:
+                    continue
+
+                session = self.sessions.get(session_id)
+                if session is None:
+                    session = self.sessions[session_id] = _Session(num_features, now)
+                session.last_seen = now
+                session.lines += 1
+                session.dirty = True
+
+                column = self._event_column(fields)
+                if column is None:
+                    session.unknown += 1
+                    self.num_unknown += 1
+                else:
+                    session.counts[column] += 1
+
+        self.latencies.append(time.perf_counter() - received)
+
+    def _score(self, session_ids, final):
+        """Score un ensemble de sessions en un appel au modèle."""
+        if not session_ids:
+            return
+        sessions = [self.sessions[session_id] for session_id in session_ids]
+        features = np.vstack([session.counts for session in sessions])
+        if hasattr(self.model, 'feature_names_in_'):
+            features = pd.DataFrame(features, columns=self.feature_names)
+
+        if hasattr(self.model, 'predict_proba'):
+            scores = self.model.predict_proba(features)[:, 1]
+        else:
+            scores = np.asarray(self.model.predict(features), dtype=float)
+
+        for session_id, session, score in zip(session_ids, sessions, scores):
+            session.score = float(score)
+            session.dirty = False
+            result = self._result(session_id, session, final)
+
+            self.results[session_id] = result
+            self.results.move_to_end(session_id)
+            if len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+
+            if result['anomaly'] and not session.alerted:
+                session.alerted = True
+                self._alert(result)
+
+    def _result(self, session_id, session, final):
+        return {
+            self.session_column: session_id,
+            'score': session.score,
+            'anomaly': session.score >= self.threshold,
+            'final': final,
+            'lines': session.lines,
+            'unknown_events': session.unknown,
+            'first_seen': session.first_seen,
+            'last_seen': session.last_seen
+        }
+
+    def _alert(self, result):
+        alert = dict(result, time=time.time())
+        self.alerts.append(alert)
+        self.num_alerts += 1
+        if self.alert_path:
+            with open(self.alert_path, 'a') as f:
+                f.write(json.dumps(alert) + '\n')
+
+    def tick(self, force=False):
+        """
+        Scoring périodique des sessions modifiées et fermeture des sessions
+        inactives (score final). force: scorer et fermer tout (arrêt).
+        """
+        now = time.time()
+        with self.lock:
+            if force or time.monotonic() - self.last_score >= self.score_interval:
+                self.last_score = time.monotonic()
+
+                expired = [session_id for session_id, session in self.sessions.items()
+                           if force or now - session.last_seen >= self.session_timeout]
+                self._score(expired, final=True)
+                for session_id in expired:
+                    del self.sessions[session_id]
+                self.num_closed += len(expired)
+
+                self._score([session_id for session_id, session in self.sessions.items()
+                             if session.dirty], final=False)
+
+    def run(self, tailers, poll_interval=0.05, stop_event=None):
+        """
+        Boucle du service: lecture des fichiers suivis, comptage, scoring.
+        S'arrête quand stop_event est positionné (sessions ouvertes scorées).
+        """
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                idle = True
+                for tailer in tailers:
+                    lines = tailer.poll()
+                    if lines:
+                        idle = False
+                        self.process_lines(lines)
+                self.tick()
+                if idle:
+                    stop_event.wait(poll_interval)
+        finally:
+            self.tick(force=True)
+            for tailer in tailers:
+                tailer.close()
+
+    def get_stats(self):
+        """Compteurs et latences (ms) du traitement des bursts."""
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            elapsed = time.time() - self.started
+            stats = {
+                'lines': self.num_lines,
+                'lines_per_sec': self.num_lines / elapsed if elapsed else 0.0,
+                'unknown_events': self.num_unknown,
+                'open_sessions': len(self.sessions),
+                'closed_sessions': self.num_closed,
+                'alerts': self.num_alerts,
+                'uptime_sec': elapsed
+            }
+        if len(latencies):
+            stats['burst_latency_ms'] = {
+                'p50': float(np.percentile(latencies, 50)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max())
+            }
+        return stats
+
+    def get_sessions(self, limit=100):
+        """Sessions ouvertes (dernier score) et dernières sessions scorées."""
+        with self.lock:
+            open_sessions = [self._result(session_id, session, False)
+                             for session_id, session in self.sessions.items()
+                             if session.score is not None]
+            scored = list(self.results.values())[-limit:]
+        open_sessions.sort(key=lambda result: result['score'], reverse=True)
+        return {'open': open_sessions[:limit], 'scored': scored}
+
+    def get_alerts(self):
+        """Dernières alertes (au plus 1000)."""
+        with self.lock:
+            return list(self.alerts)
+
+
+def serve_http(detector, host='127.0.0.1', port=8000):
+    """
+    Sert les résultats en JSON dans un thread: /sessions, /alerts, /stats.
+
+    Returns:
+        Serveur (server.shutdown() pour l'arrêter)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0].rstrip('/')
+            if path == '/stats':
+                body = detector.get_stats()
+            elif path == '/sessions':
+                body = detector.get_sessions()
+            elif path == '/alerts':
+                body = detector.get_alerts()
+            else:
+                self.send_error(404)
+                return
+
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
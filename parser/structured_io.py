@@ -0,0 +1,485 @@
+"""
+Écriture et lecture des logs structurés par batch.
+
+Formats supportés:
+- csv: format historique (append pandas)
+- parquet: un row group par batch
+- arrow: fichier Arrow IPC, un record batch par batch
+
+En parquet/arrow, les colonnes répétitives (EventId, EventTemplate, Level,
+Component...) sont encodées en dictionnaire et LineId/Pid sont des entiers.
+pyarrow n'est requis que pour ces deux formats.
+"""
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from contextlib import nullcontext
+
+import pandas as pd
+
+
+STRUCTURED_FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow'
+}
+
+
+def _timed(metrics, stage):
+    """Chronomètre du PipelineMetrics, ou contexte vide."""
+    return metrics.time(stage) if metrics is not None else nullcontext()
+
+
+def structured_file_name(base_name, output_format='csv'):
+    """Nom du fichier structuré pour un format (ex: HDFS_structured.parquet)."""
+    if output_format not in STRUCTURED_FORMATS:
+        raise ValueError(f"Format inconnu: {output_format} "
+                         f"(attendu: {', '.join(STRUCTURED_FORMATS)})")
+    return base_name + STRUCTURED_FORMATS[output_format]
+
+
+def resolve_structured_path(parsed_dir, base_name):
+    """
+    Retourne le fichier structuré le plus récent parmi les formats
+    supportés, ou le chemin CSV par défaut si aucun n'existe.
+    """
+    candidates = [
+        os.path.join(parsed_dir, base_name + ext)
+        for ext in STRUCTURED_FORMATS.values()
+    ]
+    existing = [path for path in candidates if os.path.exists(path)]
+
+    if not existing:
+        return candidates[0]
+
+    return max(existing, key=os.path.getmtime)
+
+
+class CsvBatchWriter:
+    """Écriture CSV en append, un batch à la fois."""
+
+    def __init__(self, output_path, columns, append=False, metrics=None):
+        """
+        Args:
+            append: Compléter un fichier existant (pas de header ni de
+                troncature), pour le parsing incrémental
+            metrics: PipelineMetrics (temps 'dataframe' et 'serialize')
+        """
+        self.output_path = output_path
+        self.columns = columns
+        self.is_first = not (append and os.path.exists(output_path))
+        self.metrics = metrics
+
+    def write(self, batch):
+        """
+        Args:
+            batch: RowBatch
+        """
+        with _timed(self.metrics, 'dataframe'):
+            df = batch.to_dataframe(self.columns)
+
+        # Append au CSV (header seulement si premier batch)
+        with _timed(self.metrics, 'serialize'):
+            df.to_csv(self.output_path, mode='a' if not self.is_first else 'w',
+                      header=self.is_first, index=False)
+        self.is_first = False
+
+    def close(self):
+        if self.is_first:
+            # Fichier vide: écrire au moins le header
+            pd.DataFrame(columns=self.columns).to_csv(self.output_path, index=False)
+            self.is_first = False
+
+
+class ArrowBatchWriter:
+    """
+    Écriture colonne (Parquet ou Arrow IPC) avec schéma typé.
+
+    Les dictionnaires sont globaux au fichier et ne font que grandir: chaque
+    batch réutilise les indices existants et n'ajoute que les nouvelles
+    valeurs (delta), ce qu'exige le format de fichier Arrow IPC.
+    """
+
+    def __init__(self, output_path, columns, integer_columns=(), dictionary_columns=(),
+                 output_format='parquet', metrics=None):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(f"pyarrow est requis pour le format {output_format} "
+                              f"(pip install pyarrow)")
+
+        self.pa = pa
+        self.output_path = output_path
+        self.columns = columns
+        self.output_format = output_format
+        self.integer_columns = [c for c in columns if c in integer_columns]
+        self.dictionary_columns = [c for c in columns if c in dictionary_columns]
+
+        fields = []
+        for column in columns:
+            if column in self.integer_columns:
+                fields.append(pa.field(column, pa.int64()))
+            elif column in self.dictionary_columns:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(column, pa.string()))
+        self.schema = pa.schema(fields)
+
+        self._dictionaries = {column: {} for column in self.dictionary_columns}
+        self._writer = None
+        self.metrics = metrics
+
+    def _open(self):
+        if self.output_format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.output_path, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            options = ipc.IpcWriteOptions(compression='zstd', emit_dictionary_deltas=True)
+            self._writer = ipc.new_file(self.output_path, self.schema, options=options)
+
+    def _dictionary_array(self, column, values):
+        """Encode une colonne avec le dictionnaire global du fichier."""
+        pa = self.pa
+        mapping = self._dictionaries[column]
+        indices = []
+
+        for value in values:
+            if value is None or value != value:
+                indices.append(None)
+                continue
+            index = mapping.get(value)
+            if index is None:
+                index = len(mapping)
+                mapping[value] = index
+            indices.append(index)
+
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()),
+            pa.array(list(mapping), type=pa.string())
+        )
+
+    def write(self, batch):
+        """
+        Args:
+            batch: RowBatch (colonnes converties sans passer par un DataFrame)
+        """
+        pa = self.pa
+        if self._writer is None:
+            self._open()
+
+        with _timed(self.metrics, 'dataframe'):
+            arrays = []
+
+            for column in self.columns:
+                values = batch.column(column)
+                if column in self.integer_columns:
+                    values = pd.to_numeric(pd.Series(values), errors='coerce').astype('Int64')
+                    arrays.append(pa.array(values, type=pa.int64()))
+                elif column in self.dictionary_columns:
+                    arrays.append(self._dictionary_array(column, values))
+                else:
+                    arrays.append(pa.array(values, type=pa.string(), from_pandas=True))
+
+        with _timed(self.metrics, 'serialize'):
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self._writer is None:
+            self._open()
+        self._writer.close()
+        self._writer = None
+
+
+def create_batch_writer(output_path, columns, output_format='csv',
+                        integer_columns=(), dictionary_columns=(), append=False,
+                        metrics=None):
+    """Crée le writer adapté au format de sortie."""
+    if output_format == 'csv':
+        return CsvBatchWriter(output_path, columns, append=append, metrics=metrics)
+    if output_format in ('parquet', 'arrow'):
+        if append:
+            raise ValueError(f"Ajout impossible en format {output_format} (csv uniquement)")
+        return ArrowBatchWriter(output_path, columns, integer_columns,
+                                dictionary_columns, output_format=output_format,
+                                metrics=metrics)
+    raise ValueError(f"Format inconnu: {output_format} "
+                     f"(attendu: {', '.join(STRUCTURED_FORMATS)})")
+
+
+# Modes d'écriture en arrière-plan (process: hors GIL, fork requis)
+BACKGROUND_MODES = ('thread', 'process')
+
+
+class BackgroundWriter:
+    """
+    Écriture des batchs dans un thread ou un processus dédié, pendant que le
+    parsing continue: le parseur dépose chaque batch dans une file bornée
+    (buffers - 1 batchs en attente, un en cours d'écriture) et n'attend que
+    si l'écriture a pris du retard.
+
+    En mode thread, DataFrame et to_csv gardent le GIL: le recouvrement est
+    faible. En mode process, les sorties sont copiées dans un processus
+    (fork) qui construit et sérialise les batchs; le parseur ne paie que le
+    pickle du batch (thread de la file multiprocessing).
+
+    Une erreur d'écriture est relevée dans le parseur au write ou au close
+    suivant. close() écrit les batchs restants, ferme les sorties et
+    synchronise les fichiers écrits sur disque (fsync).
+    """
+
+    def __init__(self, outputs, buffers=2, mode='thread'):
+        """
+        Args:
+            outputs: Sorties des batchs (write/close), appelées dans l'ordre
+            buffers: Nombre de batchs en vol (>= 2: double buffering)
+            mode: 'thread' ou 'process' (thread si fork indisponible)
+        """
+        if mode not in BACKGROUND_MODES:
+            raise ValueError(f"Mode d'écriture inconnu: {mode} "
+                             f"(attendu: {', '.join(BACKGROUND_MODES)})")
+        if mode == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            mode = 'thread'
+        self.mode = mode
+        self.outputs = list(outputs)
+        self.error = None
+        self.result = None
+        # Temps du parseur bloqué sur la file
+        self.wait_seconds = 0.0
+        self.num_batches = 0
+
+        maxsize = max(buffers - 1, 1)
+        if mode == 'thread':
+            self.batches = queue.Queue(maxsize=maxsize)
+            self.errors = None
+            self.worker = threading.Thread(target=self._run_thread, name='batch-writer',
+                                           daemon=True)
+        else:
+            context = multiprocessing.get_context('fork')
+            self.batches = context.Queue(maxsize=maxsize)
+            self.errors = context.SimpleQueue()
+            self.worker = context.Process(target=_run_writer_process, name='batch-writer',
+                                          args=(self.outputs, self.batches, self.errors),
+                                          daemon=True)
+        self.worker.start()
+
+    def _run_thread(self):
+        self.result = _write_batches(self.outputs, self.batches, self._set_error)
+
+    def _set_error(self, error):
+        self.error = error
+
+    def _poll_error(self):
+        if self.error is None and self.errors is not None and not self.errors.empty():
+            message = self.errors.get()
+            if isinstance(message, BaseException):
+                self.error = message
+            else:
+                self.result = message
+        return self.error
+
+    def _put(self, item):
+        start = time.perf_counter()
+        while True:
+            try:
+                self.batches.put(item, timeout=1.0)
+                break
+            except queue.Full:
+                if not self.worker.is_alive():
+                    raise RuntimeError(f"Écriture en arrière-plan arrêtée "
+                                       f"(code {getattr(self.worker, 'exitcode', None)})")
+        self.wait_seconds += time.perf_counter() - start
+
+    def _raise_error(self):
+        if self._poll_error() is not None:
+            if self.worker.is_alive():
+                # Arrêter le worker (il vide la file sans écrire)
+                self.batches.put(None)
+                self.worker.join()
+            raise self.error
+
+    def write(self, batch):
+        """Dépose un batch (le parseur ne doit plus le modifier)."""
+        self._raise_error()
+        self._put(batch)
+        self.num_batches += 1
+
+    def close(self):
+        """Batchs restants, fermeture et fsync des sorties (dans le worker)."""
+        self._put(None)
+        start = time.perf_counter()
+        if self.errors is not None:
+            # Erreurs éventuelles puis résultat final du processus
+            while self.result is None and self._poll_error() is None:
+                if not self.worker.is_alive() and self.errors.empty():
+                    self.error = RuntimeError(f"Écriture en arrière-plan arrêtée "
+                                              f"(code {self.worker.exitcode})")
+                    break
+                time.sleep(0.01)
+        self.worker.join()
+        self.wait_seconds += time.perf_counter() - start
+        self._raise_error()
+
+    def get_stats(self):
+        """Temps d'attente du parseur et d'écriture du worker."""
+        return {
+            'mode': self.mode,
+            'batches': self.num_batches,
+            'wait_seconds': self.wait_seconds,
+            'write_seconds': self.result if self.result is not None else 0.0
+        }
+
+
+def _write_batches(outputs, batches, on_error):
+    """
+    Boucle du worker d'écriture: écrit les batchs jusqu'à None, puis ferme
+    et synchronise les sorties. Après une erreur (signalée par on_error),
+    la file est vidée sans écrire.
+
+    Returns:
+        Temps d'écriture (s)
+    """
+    write_seconds = 0.0
+    failed = False
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        if failed:
+            continue
+        start = time.perf_counter()
+        try:
+            for output in outputs:
+                output.write(batch)
+        except Exception as e:
+            failed = True
+            on_error(e)
+        write_seconds += time.perf_counter() - start
+
+    if not failed:
+        start = time.perf_counter()
+        try:
+            for output in outputs:
+                output.close()
+                path = getattr(output, 'output_path', None)
+                if path is not None and os.path.exists(path):
+                    _fsync(path)
+        except Exception as e:
+            on_error(e)
+        write_seconds += time.perf_counter() - start
+    return write_seconds
+
+
+def _run_writer_process(outputs, batches, errors):
+    def report(error):
+        try:
+            errors.put(error)
+        except Exception:
+            # Exception non sérialisable
+            errors.put(RuntimeError(f"{type(error).__name__}: {error}"))
+
+    errors.put(_write_batches(outputs, batches, report))
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def iter_structured_chunks(path, columns=None, chunksize=500000, governor=None):
+    """
+    Lit un fichier structuré par chunks de DataFrame, en ne chargeant que
+    les colonnes demandées. Le format est déduit de l'extension.
+    
+    Avec un MemoryGovernor, chaque chunk fait governor.size lignes (taille
+    ajustée par l'appelant avec governor.update() entre deux chunks).
+    """
+    if governor is not None:
+        yield from _iter_governed_chunks(path, columns, governor)
+    
+    elif path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for record_batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield _to_pandas(record_batch)
+
+    elif path.endswith('.arrow'):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                record_batch = reader.get_batch(i)
+                if columns is not None:
+                    record_batch = record_batch.select(columns)
+                # Les record batches suivent les batchs du parsing: on les
+                # redécoupe pour respecter chunksize
+                for offset in range(0, record_batch.num_rows, chunksize):
+                    yield _to_pandas(record_batch.slice(offset, chunksize))
+
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+def _iter_governed_chunks(path, columns, governor):
+    """Chunks de taille variable (governor.size), pour iter_structured_chunks."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        yield from _rechunk(parquet_file.iter_batches(batch_size=governor.min_size,
+                                                      columns=columns), governor)
+    
+    elif path.endswith('.arrow'):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            record_batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            if columns is not None:
+                record_batches = (record_batch.select(columns)
+                                  for record_batch in record_batches)
+            yield from _rechunk(record_batches, governor)
+    
+    else:
+        with pd.read_csv(path, usecols=columns, chunksize=governor.size) as reader:
+            while True:
+                try:
+                    yield reader.get_chunk(governor.size)
+                except StopIteration:
+                    return
+
+
+def _rechunk(record_batches, governor):
+    """Regroupe/redécoupe des record batches en DataFrames de governor.size lignes."""
+    import pyarrow as pa
+    pending, num_rows = [], 0
+    for record_batch in record_batches:
+        offset = 0
+        while offset < record_batch.num_rows:
+            take = min(governor.size - num_rows, record_batch.num_rows - offset)
+            pending.append(record_batch.slice(offset, take))
+            num_rows += take
+            offset += take
+            if num_rows >= governor.size:
+                yield _to_pandas(pa.Table.from_batches(pending))
+                pending, num_rows = [], 0
+    if pending:
+        yield _to_pandas(pa.Table.from_batches(pending))
+
+
+def _to_pandas(record_batch):
+    """
+    Convertit un record batch: entiers nullables (Int64), dictionnaires
+    redevenus chaînes.
+    """
+    import pyarrow as pa
+    df = record_batch.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df
@@ -0,0 +1,117 @@
+"""
+Cache de mémoïsation devant Drain3: contenu masqué -> cluster.
+
+Une fois les masques de drain.ini appliqués (<BLOCK>, <IP>, <NUM>), des
+millions de lignes se réduisent à quelques milliers de séquences de tokens
+distinctes. Sur un hit, on évite le parcours de l'arbre Drain et le calcul
+de similarité.
+"""
+from collections import OrderedDict
+
+
+class TemplateCache:
+    """
+    Cache LRU borné: séquence de tokens masqués -> (cluster, template).
+
+    Invalidation:
+    - cluster créé ou template d'un cluster généralisé -> entrées de même
+      nombre de tokens supprimées (le nouveau cluster ou le template
+      généralisé peut devenir le meilleur appariement d'autres séquences)
+    - cluster évincé par Drain3 (max_clusters) -> traité comme un miss
+
+    Avec ces règles, le résultat est identique à un appel direct de
+    TemplateMiner.add_log_message.
+    """
+
+    def __init__(self, template_miner, maxsize=100000):
+        self.template_miner = template_miner
+        self.drain = template_miner.drain
+        self.masker = template_miner.masker
+        self.maxsize = maxsize
+
+        self._entries = OrderedDict()
+        self._keys_by_length = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_log_message(self, content, masked_content=None):
+        """
+        Équivalent de TemplateMiner.add_log_message via le cache.
+
+        Args:
+            content: Contenu brut
+            masked_content: Contenu déjà masqué (sinon masqué ici)
+
+        Returns:
+            (cluster_id, template)
+        """
+        if masked_content is None:
+            masked_content = self.masker.mask(content)
+        key = tuple(self.drain.get_content_as_tokens(masked_content))
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            cluster, template = entry
+            if self.drain.id_to_cluster.get(cluster.cluster_id) is cluster:
+                self._entries.move_to_end(key)
+                cluster.size += 1
+                # Toucher le cluster dans le LRU de Drain3, comme add_log_message
+                self.drain.id_to_cluster[cluster.cluster_id]
+                self.hits += 1
+                return cluster.cluster_id, template
+            self._remove(key)
+
+        self.misses += 1
+        cluster, change_type = self.drain.add_log_message(masked_content)
+
+        if change_type in ('cluster_created', 'cluster_template_changed'):
+            self._invalidate(self._keys_by_length.get(len(key)))
+
+        template = cluster.get_template()
+        self._store(key, cluster, template)
+
+        return cluster.cluster_id, template
+
+    def _store(self, key, cluster, template):
+        self._entries[key] = (cluster, template)
+        self._keys_by_length.setdefault(len(key), set()).add(key)
+
+        if len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        self._entries.pop(key)
+        self._keys_by_length[len(key)].discard(key)
+
+    def _invalidate(self, keys):
+        if not keys:
+            return
+        for key in list(keys):
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        """Vide le cache (mémoire rendue sous pression, résultats inchangés)."""
+        self._entries.clear()
+        self._keys_by_length.clear()
+
+    def get_stats(self):
+        """Compteurs du cache."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,241 @@
+"""
+Comptage des EventId par fenêtre de temps, pour les logs sans identifiant
+de session (ou en complément des sessions BlockId/InstanceId).
+
+Le temps est découpé en pas de step secondes; une fenêtre couvre window
+secondes, soit k = window / step pas consécutifs (k = 1: fenêtres fixes,
+k > 1: fenêtres glissantes qui avancent d'un pas). Chaque événement est
+compté une seule fois, dans son pas; la somme de la fenêtre est tenue à
+jour en ajoutant le pas qui entre et en retirant celui qui sort d'un
+anneau de k lignes de comptages: O(événements + pas × EventIds) au lieu
+de recompter k pas par fenêtre.
+
+Entrée en flux, tolérante au désordre: un pas n'entre dans l'anneau que
+lorsque le filigrane (plus grand timestamp vu - lateness) l'a dépassé.
+Les pas en attente restent dans un tampon borné par lateness / step (plus
+l'étendue d'un chunk, le filigrane avançant en fin de chunk); un
+événement arrivé après le passage du filigrane sur son pas est compté
+dans late_events et ignoré. Le filigrane est évalué événement par
+événement: le résultat ne dépend pas de la taille des chunks.
+
+Seules les fenêtres non vides sont émises (les trous sont sautés).
+"""
+import numpy as np
+import pandas as pd
+
+# Origine des timestamps en secondes
+EPOCH = pd.Timestamp(0)
+
+
+def timestamp_seconds(values, format='%Y-%m-%d %H:%M:%S.%f'):
+    """Secondes (float, NaN si absent ou invalide) de timestamps texte (OpenStack)."""
+    timestamps = pd.to_datetime(pd.Series(values), format=format, errors='coerce')
+    return ((timestamps - EPOCH) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+
+def hdfs_seconds(dates, times):
+    """
+    Secondes (float, NaN si absent) des colonnes Date (yymmdd) et Time
+    (HHMMSS) de HDFS, lues en texte (parquet, arrow) ou en nombres (csv,
+    zéros de tête perdus).
+    """
+    dates = pd.to_numeric(pd.Series(dates), errors='coerce').to_numpy(dtype=np.float64)
+    times = pd.to_numeric(pd.Series(times), errors='coerce').to_numpy(dtype=np.float64)
+    timestamps = pd.to_datetime(pd.DataFrame({
+        'year': 2000 + dates // 10000,
+        'month': dates // 100 % 100,
+        'day': dates % 100,
+        'hour': times // 10000,
+        'minute': times // 100 % 100,
+        'second': times % 100
+    }), errors='coerce')
+    return ((timestamps - EPOCH) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+
+class TimeWindowCounter:
+    """
+    Comptages fenêtres de temps × événements, agrégés incrémentalement.
+
+    Utilisation: add() par chunk, drain() pour récupérer les fenêtres
+    complètes (écriture en flux), flush() en fin d'entrée.
+    """
+
+    def __init__(self, event_ids, window=60, step=None, lateness=0, dtype=np.int64):
+        """
+        Args:
+            event_ids: Colonnes de la matrice (EventIds inconnus ignorés)
+            window: Durée d'une fenêtre (secondes)
+            step: Avance entre deux fenêtres (secondes, diviseur de window),
+                défaut window (fenêtres fixes)
+            lateness: Retard toléré d'un événement sur le plus récent vu (secondes)
+        """
+        step = window if not step else step
+        if window <= 0 or step <= 0 or lateness < 0:
+            raise ValueError(f"Fenêtre invalide: window={window}, step={step}, "
+                             f"lateness={lateness}")
+        if window % step:
+            raise ValueError(f"window ({window} s) doit être un multiple de step ({step} s)")
+
+        self.event_ids = list(event_ids)
+        self.window = window
+        self.step = step
+        self.lateness = lateness
+        self.steps = int(window // step)
+
+        num_events = len(self.event_ids)
+        # Anneau des k derniers pas et somme courante de la fenêtre
+        self.ring = np.zeros((self.steps, num_events), dtype=dtype)
+        self.ring_totals = np.zeros(self.steps, dtype=np.int64)
+        self.window_counts = np.zeros(num_events, dtype=dtype)
+        self.window_total = 0
+
+        # Pas en attente du filigrane: {pas: comptages}
+        self.pending = {}
+        self.next_step = None
+        self.max_seconds = -np.inf
+        self.max_step = None
+
+        # Fenêtres complètes pas encore drainées
+        self._starts = []
+        self._rows = []
+
+        self.events = 0
+        self.late_events = 0
+        self.untimed_events = 0
+        self.unknown_events = 0
+        self.windows = 0
+        self.peak_pending = 0
+
+    def add(self, seconds, events):
+        """
+        Ajoute un chunk d'événements, dans l'ordre d'arrivée.
+
+        Args:
+            seconds: Timestamp de chaque événement (secondes, NaN si absent)
+            events: EventId de chaque événement, même longueur
+        """
+        if len(seconds) == 0:
+            return
+        seconds = np.asarray(seconds, dtype=np.float64)
+        codes = pd.Categorical(events, categories=self.event_ids).codes.astype(np.int64)
+
+        timed = ~np.isnan(seconds)
+        self.untimed_events += int(np.count_nonzero(~timed))
+        known = timed & (codes >= 0)
+        self.unknown_events += int(np.count_nonzero(timed & (codes < 0)))
+        seconds, codes = seconds[known], codes[known]
+        if len(seconds) == 0:
+            return
+
+        # Filigrane vu par chaque événement à son arrivée (lui compris)
+        newest = np.maximum.accumulate(seconds)
+        np.maximum(newest, self.max_seconds, out=newest)
+        closed = np.floor((newest - self.lateness) / self.step)
+        steps = np.floor(seconds / self.step)
+        on_time = steps >= closed
+        self.late_events += int(len(steps) - np.count_nonzero(on_time))
+        self.max_seconds = newest[-1]
+
+        steps = steps[on_time].astype(np.int64)
+        codes = codes[on_time]
+        self.events += len(steps)
+        if len(steps):
+            # Comptage local au chunk: une ligne par pas présent
+            num_events = len(self.event_ids)
+            step_codes, step_uniques = pd.factorize(steps)
+            local_counts = np.bincount(
+                step_codes * num_events + codes,
+                minlength=len(step_uniques) * num_events
+            ).reshape(len(step_uniques), num_events).astype(self.ring.dtype)
+            for step, counts in zip(step_uniques.tolist(), local_counts):
+                pending = self.pending.get(step)
+                if pending is None:
+                    self.pending[step] = counts
+                else:
+                    pending += counts
+            max_step = int(step_uniques.max())
+            self.max_step = max_step if self.max_step is None else max(self.max_step, max_step)
+            self.peak_pending = max(self.peak_pending, len(self.pending))
+
+        self._advance(int(closed[-1]))
+
+    def flush(self):
+        """Fin d'entrée: tous les pas en attente sont fermés, dernières fenêtres émises."""
+        if self.max_step is not None:
+            self._advance(self.max_step + self.steps)
+
+    def _advance(self, until):
+        """Fait glisser la fenêtre sur les pas < until (fermés par le filigrane)."""
+        if self.next_step is None:
+            if not self.pending or min(self.pending) >= until:
+                return
+            self.next_step = min(self.pending)
+
+        k = self.steps
+        while self.next_step < until:
+            if self.window_total == 0:
+                # Anneau vide: saut direct au prochain pas non vide
+                next_pending = min(self.pending, default=until)
+                if next_pending > self.next_step:
+                    self.next_step = min(next_pending, until)
+                    continue
+
+            step = self.next_step
+            slot = step % k
+            # Le pas qui sort de la fenêtre (step - k) libère sa case
+            if self.ring_totals[slot]:
+                self.window_counts -= self.ring[slot]
+                self.window_total -= int(self.ring_totals[slot])
+                self.ring[slot] = 0
+                self.ring_totals[slot] = 0
+
+            counts = self.pending.pop(step, None)
+            if counts is not None:
+                total = int(counts.sum())
+                self.ring[slot] = counts
+                self.ring_totals[slot] = total
+                self.window_counts += counts
+                self.window_total += total
+
+            if self.window_total:
+                self._starts.append(step - k + 1)
+                self._rows.append(self.window_counts.copy())
+            self.next_step = step + 1
+
+    def __len__(self):
+        """Fenêtres complètes en attente de drain()."""
+        return len(self._rows)
+
+    def drain(self):
+        """
+        Fenêtres complètes depuis le dernier appel, dans l'ordre du temps.
+
+        Returns:
+            DataFrame WindowStart, WindowEnd puis une colonne par EventId
+        """
+        starts = np.asarray(self._starts, dtype=np.float64) * self.step
+        if self._rows:
+            counts = np.vstack(self._rows)
+        else:
+            counts = np.zeros((0, len(self.event_ids)), dtype=self.ring.dtype)
+        self._starts, self._rows = [], []
+        self.windows += len(counts)
+
+        df = pd.DataFrame(counts, columns=self.event_ids)
+        df.insert(0, 'WindowStart', pd.to_datetime(starts, unit='s'))
+        df.insert(1, 'WindowEnd', pd.to_datetime(starts + self.window, unit='s'))
+        return df
+
+    def summary(self):
+        """Statistiques du comptage (événements retenus, en retard, fenêtres...)."""
+        return {
+            'window_seconds': self.window,
+            'step_seconds': self.step,
+            'lateness_seconds': self.lateness,
+            'events': self.events,
+            'late_events': self.late_events,
+            'untimed_events': self.untimed_events,
+            'unknown_events': self.unknown_events,
+            'windows': self.windows + len(self._rows),
+            'peak_pending_steps': self.peak_pending
+        }